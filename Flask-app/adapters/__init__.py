@@ -1,11 +1,26 @@
-from .langgraph_adapter import LangGraphAdapter
-from .llamaindex_adapter import LlamaIndexAdapter
-from .dspy_adapter import DSPyAdapter
-from .autogen_adapter import AutoGenAdapter
+import importlib
+
+# Framework name -> "module:Class". The registry imports an adapter only when it
+# is first requested, so frameworks nobody uses are never loaded.
+ADAPTER_MODULES = {
+    'langgraph': 'adapters.langgraph_adapter:LangGraphAdapter',
+    'llamaindex': 'adapters.llamaindex_adapter:LlamaIndexAdapter',
+    'dspy': 'adapters.dspy_adapter:DSPyAdapter',
+    'autogen': 'adapters.autogen_adapter:AutoGenAdapter'
+}
+
+_CLASS_MODULES = {target.split(':')[1]: target.split(':')[0] for target in ADAPTER_MODULES.values()}
 
 __all__ = [
+    'ADAPTER_MODULES',
     'LangGraphAdapter',
     'LlamaIndexAdapter', 
     'DSPyAdapter',
     'AutoGenAdapter'
-]
\ No newline at end of file
+]
+
+def __getattr__(name):
+    """Keep `from adapters import LangGraphAdapter` working without importing every adapter"""
+    if name in _CLASS_MODULES:
+        return getattr(importlib.import_module(_CLASS_MODULES[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
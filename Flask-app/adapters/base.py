@@ -0,0 +1,109 @@
+from typing import Dict, Any, Iterator, Tuple
+from core.registry import FrameworkAdapter
+from core.rag_client import rag_client
+from core.resilience import resilience_policy
+from core.telemetry import trace_headers
+import itertools
+import time
+
+class RagApiAdapter(FrameworkAdapter):
+    """Base for adapters whose agents run inside the Rag-API service"""
+
+    def create_agent(self, config: Dict[str, Any]) -> Any:
+        """The agent itself is built by the Rag-API; keep the request configuration"""
+        return {
+            'framework': self.get_name(),
+            'model': config.get('model'),
+            'vector_store': config.get('vector_store'),
+            'config': config
+        }
+
+    def execute_query(self, agent: Any, query: str) -> Dict[str, Any]:
+        """Execute query through the shared Rag-API client"""
+        start_time = time.time()
+        resilience: Dict[str, Any] = {}
+        # Rag-API parents its spans to the caller's current span
+        headers = trace_headers()
+
+        try:
+            payload = self._payload(agent, query)
+            result = resilience_policy.call('/ask', self.get_name(), lambda: rag_client.ask(payload, headers), resilience)
+            return self._result(result, start_time, resilience)
+
+        except Exception as e:
+            return self._error(e, start_time, resilience)
+
+    def stream_query(self, agent: Any, query: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Relay the Rag-API's step/token events; the last event is ('result', <execute_query result>)"""
+        # Taken now, while the caller's span is current; the generator runs later
+        return self._stream_query(agent, query, trace_headers())
+
+    def _stream_query(self, agent: Any, query: str, headers: Dict[str, str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        start_time = time.time()
+        resilience: Dict[str, Any] = {}
+        events = None
+
+        def open_stream():
+            # Only opening the stream is retried: once an event has been relayed the query is running
+            stream = rag_client.stream(self._payload(agent, query), headers=headers)
+            first = next(stream, ('error', {'detail': 'Rag-API closed the stream without sending an event'}))
+            return stream, first
+
+        try:
+            events, first = resilience_policy.call('/ask/stream', self.get_name(), open_stream, resilience)
+            for event, data in itertools.chain([first], events):
+                if event == 'done':
+                    yield 'result', self._result(data, start_time, resilience)
+                    return
+                if event == 'error':
+                    raise RuntimeError(data.get('detail', 'Rag-API stream failed'))
+                yield event, data
+            raise RuntimeError('Rag-API stream ended before the answer was complete')
+
+        except Exception as e:
+            yield 'result', self._error(e, start_time, resilience)
+        finally:
+            if events is not None:
+                events.close()
+
+    def _payload(self, agent: Any, query: str) -> Dict[str, Any]:
+        return {
+            "framework": self.get_name(),
+            "llm_model": agent['model'],
+            "vector_store": agent['vector_store'],
+            "query": query,
+            # Per-stage timings for the trace waterfall
+            "debug": True
+        }
+
+    def _result(self, result: Dict[str, Any], start_time: float, resilience: Dict[str, Any]) -> Dict[str, Any]:
+        usage = result.get('usage') or {}
+        return {
+            'answer': result.get('answer', 'No answer found'),
+            'started_at': start_time,
+            'duration': time.time() - start_time,
+            # None when the provider reported no usage, so metrics fall back to an estimate
+            'tokens_used': usage.get('total_tokens'),
+            'input_tokens': usage.get('prompt_tokens'),
+            'output_tokens': usage.get('completion_tokens'),
+            'cached_tokens': usage.get('cached_tokens'),
+            'llm_calls': usage.get('llm_calls'),
+            'server_timings': result.get('timings', {}),
+            'server_stages': (result.get('debug') or {}).get('stages', []),
+            'fast_path_intent': result.get('fast_path_intent'),
+            'tools_used': [step.get('name', '') for step in result.get('steps') or [] if step.get('kind') == 'tool'],
+            'budget_exhausted': result.get('budget_exhausted'),
+            'resilience': resilience,
+            'status': 'success'
+        }
+
+    def _error(self, error: Exception, start_time: float, resilience: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'answer': f"Error: {str(error)}",
+            'started_at': start_time,
+            'duration': time.time() - start_time,
+            'tokens_used': 0,
+            'resilience': resilience,
+            'status': 'error',
+            'error': str(error)
+        }
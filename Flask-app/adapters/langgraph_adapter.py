@@ -1,10 +1,7 @@
-from typing import Dict, Any, List
-from core.registry import FrameworkAdapter
-from core.tracing import tracing_manager
-import time
-import requests
+from typing import List
+from .base import RagApiAdapter
 
-class LangGraphAdapter(FrameworkAdapter):
+class LangGraphAdapter(RagApiAdapter):
     """LangGraph framework adapter"""
     
     def get_name(self) -> str:
@@ -16,56 +13,3 @@ class LangGraphAdapter(FrameworkAdapter):
             "gpt-3.5-turbo", 'llama3-8b-8192', 'gemma2-9b-it',
             "llama-3.3-70b-versatile", "gemini-2.0-flash"
         ]
-    
-    def create_agent(self, config: Dict[str, Any]) -> Any:
-        """Create LangGraph agent (placeholder - actual implementation would create the agent)"""
-        return {
-            'framework': 'langgraph',
-            'model': config.get('model'),
-            'vector_store': config.get('vector_store'),
-            'config': config
-        }
-    
-    def execute_query(self, agent: Any, query: str) -> Dict[str, Any]:
-        """Execute query using LangGraph agent"""
-        start_time = time.time()
-        
-        try:
-            # Make API call to RAG service
-            payload = {
-                "framework": "langgraph",
-                "llm_model": agent['model'],
-                "vector_store": agent['vector_store'],
-                "query": query
-            }
-            
-            response = requests.post(
-                "http://localhost:8000/ask",
-                json=payload,
-                timeout=30
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            duration = time.time() - start_time
-            
-            return {
-                'answer': result.get('answer', 'No answer found'),
-                'duration': duration,
-                'tokens_used': self._estimate_tokens(query + result.get('answer', '')),
-                'status': 'success'
-            }
-            
-        except Exception as e:
-            duration = time.time() - start_time
-            return {
-                'answer': f"Error: {str(e)}",
-                'duration': duration,
-                'tokens_used': 0,
-                'status': 'error',
-                'error': str(e)
-            }
-    
-    def _estimate_tokens(self, text: str) -> int:
-        """Rough token estimation (4 characters per token)"""
-        return len(text) // 4
\ No newline at end of file
@@ -11,17 +11,112 @@ class Settings(BaseSettings):
     
     # API Settings
     RAG_API_URL: str = "http://localhost:8000"
+    RAG_API_URLS: List[str] = []            # Rag-API replicas to balance across; empty means just RAG_API_URL
+    RAG_API_LB_POLICY: str = "least_outstanding"  # or "ewma" (latency-weighted)
+    RAG_API_HEALTH_INTERVAL: float = 5.0    # Seconds between /health probes; 0 disables them
+    RAG_API_HEALTH_TIMEOUT: float = 2.0
+    RAG_API_EJECT_AFTER: int = 2            # Consecutive failures before a replica is ejected
+    RAG_API_READMIT_DELAY: float = 30.0     # Seconds an ejected replica stays out before it can be readmitted
+    RAG_API_BREAKER_FAILURE_THRESHOLD: int = 5   # Consecutive failures that open a framework's circuit
+    RAG_API_BREAKER_RESET_TIMEOUT: float = 30.0  # Seconds open before half-open probes are allowed
+    RAG_API_BREAKER_HALF_OPEN_CALLS: int = 1
+    RAG_API_MAX_ATTEMPTS: int = 3                # Including the first attempt
+    RAG_API_RETRY_BUDGET_RATIO: float = 0.2      # Retries earned per request
+    RAG_API_RETRY_MIN_PER_SECOND: float = 0.5    # Retries always allowed at low traffic
+    RAG_API_RETRY_BASE_DELAY: float = 0.1
+    RAG_API_RETRY_MAX_DELAY: float = 2.0
+    RAG_API_POOL_SIZE: int = 20             # Max keep-alive connections to the Rag-API
+    RAG_API_POOL_TIMEOUT: float = 10.0      # Seconds to wait for a free connection when the pool is saturated
+    RAG_API_CONNECT_TIMEOUT: float = 3.05
+    RAG_API_READ_TIMEOUT: float = 30.0
+    
+    # Admission control (core/admission.py)
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_GLOBAL_LIMIT: int = 32        # Queries running at once across all frameworks
+    ADMISSION_FRAMEWORK_LIMIT: int = 16     # Queries running at once per framework
+    ADMISSION_MAX_QUEUE: int = 32           # Queries allowed to wait for a slot; more get 429
+    ADMISSION_MAX_WAIT: float = 2.0         # Seconds a query waits for a slot before it gets 503
+    ADMISSION_ADAPTIVE: bool = False        # Adjust the limits with AIMD on observed latency
+    ADMISSION_TARGET_LATENCY: float = 10.0  # Completions slower than this shrink the limits
+    ADMISSION_MIN_LIMIT: int = 2
+    ADMISSION_DECREASE_FACTOR: float = 0.8
+    ADMISSION_BACKGROUND_MAX_WAIT: float = 120.0  # Seconds jobs and batch items keep retrying after being shed
+    
+    # Batch generation (/api/generate/batch)
+    BATCH_MAX_WORKERS: int = 8              # Concurrent Rag-API calls shared by all running batches
+    BATCH_MAX_ITEMS: int = 200
+    
+    # Comparison mode (/api/compare)
+    COMPARE_MAX_WORKERS: int = 8
+    COMPARE_MAX_CONFIGURATIONS: int = 12
+    
+    # Asynchronous jobs (/api/jobs)
+    JOB_BACKEND: str = "thread"             # "thread" (in-process, no broker) or "celery" (REDIS_URL as broker)
+    JOB_MAX_WORKERS: int = 4
+    JOB_MAX_QUEUED: int = 100               # Further submissions get 429 until the queue drains
+    JOB_RESULT_TTL: float = 3600.0          # Seconds a finished job and its result are kept
     
     # Database Settings
     DATABASE_URL: Optional[str] = None
+    METRICS_DB_PATH: str = "metrics.db"
+    METRICS_WRITE_BATCH_SIZE: int = 100     # Metric rows per write transaction
+    METRICS_WRITE_FLUSH_INTERVAL_MS: int = 500  # Longest a queued row waits before it is written
+    METRICS_WRITE_MAX_QUEUE: int = 10000    # Rows waiting to be written; more are dropped
     REDIS_URL: str = "redis://localhost:6379"
     
+    # Response cache (core/cache.py): in-process LRU in front of Redis
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_TTL: float = 3600.0          # Seconds an answer is served from Redis
+    RESPONSE_CACHE_L1_TTL: float = 300.0        # Seconds an answer stays in a replica's own LRU
+    RESPONSE_CACHE_L1_MAX_ENTRIES: int = 256
+    RESPONSE_CACHE_MAX_VALUE_BYTES: int = 65536 # Larger answers are not cached
+    RESPONSE_CACHE_REDIS_TIMEOUT: float = 0.25
+    RESPONSE_CACHE_REDIS_RETRY_AFTER: float = 30.0  # Seconds to skip Redis after an error
+    
     # Tracing and Monitoring
+    TRACE_BUFFER_CAPACITY: int = 10000      # Traces kept in memory; the oldest is evicted beyond this
+    TRACE_STORE: str = "sqlite"             # Durable trace store (core/trace_store.py), or "none" for memory only
+    TRACE_STORE_PATH: str = "traces.db"     # SQLite file; ":memory:" for a process-local store
+    TRACE_STORE_RETENTION_DAYS: float = 7.0  # Stored traces older than this are deleted; 0 keeps them forever
+    TRACE_PAGE_SIZE: int = 50               # Traces per page on /traces and /api/traces
+    TRACE_ANALYSIS_MAX_TRACES: int = 5000   # Most recent traces aggregated per window on /traces/analysis
+    TRACE_ANALYSIS_REGRESSION_PCT: float = 20.0  # p95 growth over the previous window flagged as a regression
     LANGTRACE_API_KEY: Optional[str] = None
+    LANGTRACE_API_URL: str = "https://api.langtrace.ai"
+    LANGTRACE_ENRICH_ENABLED: bool = True   # Backfill metric rows from Langtrace (needs LANGTRACE_API_KEY)
+    LANGTRACE_ENRICH_DELAY: float = 5.0     # Seconds after a request before its trace is fetched
+    LANGTRACE_ENRICH_CONCURRENCY: int = 4   # Concurrent Langtrace requests (and pooled connections)
+    LANGTRACE_ENRICH_RATE: float = 5.0      # Langtrace requests per second
+    LANGTRACE_ENRICH_MAX_ATTEMPTS: int = 4
+    LANGTRACE_ENRICH_TIMEOUT: float = 10.0
+    LANGTRACE_ENRICH_MAX_QUEUE: int = 1000  # Traces waiting to be fetched; more are not enriched
+    OTEL_ENABLED: bool = True               # Export OpenTelemetry spans (core/telemetry.py)
+    OTEL_SERVICE_NAME: str = "docker-agent-flask"
+    OTEL_EXPORTER_OTLP_ENDPOINT: str = "http://localhost:4318"  # OTLP/HTTP receiver of telemetry/otel-collector-config.yaml
+    OTEL_BSP_MAX_QUEUE_SIZE: int = 2048     # Finished spans waiting for export; more are dropped, never blocking a request
+    OTEL_BSP_MAX_EXPORT_BATCH_SIZE: int = 512
+    OTEL_BSP_SCHEDULE_DELAY_MS: int = 1000
+    
+    # Tail sampling (core/sampling.py): which finished traces are stored and exported.
+    # Only Flask-app spans are filtered. The decision is made after the Rag-API call has
+    # returned, so it cannot travel in the traceparent `sampled` flag, and Rag-API still
+    # exports its spans for traces dropped here. For whole traces, sample in the collector instead.
+    TRACE_SAMPLING_ENABLED: bool = True     # False keeps every trace
+    TRACE_SAMPLE_RATE: float = 0.1          # Share of ordinary traces kept; failed and slow ones always are
+    TRACE_SAMPLE_SLOW_SECONDS: float = 10.0
+    TRACE_SAMPLE_EXPENSIVE_TOKENS: int = 4000
+    TRACE_SAMPLE_EXPENSIVE_RATE: float = 0.5
+    TRACE_SAMPLING_MAX_BUFFERED_SPANS: int = 20000  # Spans held for incomplete traces before the oldest is dropped
     GRAFANA_CLOUD_URL: Optional[str] = None
     GRAFANA_CLOUD_API_KEY: Optional[str] = None
     PROMETHEUS_PORT: int = 8001
     
+    # Logging (core/logging_pipeline.py): records are rendered and written off the request thread
+    LOG_QUEUE_ENABLED: bool = True          # False renders and writes every record in the calling thread
+    LOG_QUEUE_MAX_SIZE: int = 10000         # Records waiting to be written; beyond this debug/info records are dropped
+    LOG_BATCH_SIZE: int = 256
+    LOG_FLUSH_INTERVAL_MS: int = 200
+    
     # LLM Provider Keys
     OPENAI_API_KEY: Optional[str] = None
     GROQ_API_KEY: Optional[str] = None
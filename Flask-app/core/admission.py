@@ -0,0 +1,294 @@
+import time
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Any, Iterator, Optional
+from prometheus_client import Counter, Gauge, Histogram
+import structlog
+from config.settings import settings
+
+logger = structlog.get_logger()
+
+# Prometheus Metrics
+ADMISSION_IN_FLIGHT = Gauge(
+    'docker_agent_admission_in_flight',
+    'Admitted queries currently running, globally and per framework',
+    ['scope']
+)
+
+ADMISSION_LIMIT = Gauge(
+    'docker_agent_admission_limit',
+    'Current concurrency limit, globally and per framework',
+    ['scope']
+)
+
+ADMISSION_QUEUED = Gauge(
+    'docker_agent_admission_queued',
+    'Queries waiting for a concurrency slot'
+)
+
+ADMISSION_QUEUE_SECONDS = Histogram(
+    'docker_agent_admission_queue_seconds',
+    'Time queries waited for a slot before being admitted or shed',
+    ['framework', 'outcome'],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5)
+)
+
+ADMISSION_SHED = Counter(
+    'docker_agent_admission_shed_total',
+    'Queries rejected by admission control',
+    ['framework', 'reason']     # queue_full (429), wait_timeout (503)
+)
+
+GLOBAL_SCOPE = 'global'
+
+
+class AdmissionRejected(Exception):
+    """Raised instead of running a query when the service is at capacity"""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimit:
+    """A concurrency ceiling, optionally adjusted by AIMD on observed latency.
+
+    Additive increase: +1/limit per fast completion while the limit is in
+    use. Multiplicative decrease: limit * decrease_factor when a completion
+    is slower than target_latency, at most once per cooldown.
+    """
+
+    def __init__(
+        self,
+        scope: str,
+        limit: int,
+        adaptive: bool = False,
+        min_limit: int = 1,
+        target_latency: float = 10.0,
+        decrease_factor: float = 0.8,
+        cooldown: float = 5.0
+    ):
+        self.scope = scope
+        self.max_limit = limit
+        self.limit = float(limit)
+        self.adaptive = adaptive
+        self.min_limit = min(min_limit, limit)
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        ADMISSION_LIMIT.labels(scope=scope).set(limit)
+
+    def has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def acquire(self):
+        self.in_flight += 1
+        ADMISSION_IN_FLIGHT.labels(scope=self.scope).set(self.in_flight)
+
+    def release(self, latency: Optional[float]):
+        was_saturated = self.in_flight >= int(self.limit)
+        self.in_flight -= 1
+        ADMISSION_IN_FLIGHT.labels(scope=self.scope).set(self.in_flight)
+        if not self.adaptive or latency is None:
+            return
+
+        now = time.monotonic()
+        if latency > self.target_latency:
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                self._last_decrease = now
+                logger.warning("Admission limit decreased", scope=self.scope, limit=int(self.limit), latency=latency)
+        elif was_saturated:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        ADMISSION_LIMIT.labels(scope=self.scope).set(int(self.limit))
+
+
+@dataclass
+class Ticket:
+    framework: str
+    admitted_at: float
+
+
+class AdmissionController:
+    """Global and per-framework concurrency ceilings with a short, bounded wait queue.
+
+    A query that finds no free slot waits up to `max_wait` seconds; if
+    `max_queue` queries are already waiting it is shed at once with 429,
+    and if no slot frees up in time it is shed with 503.
+    """
+
+    def __init__(
+        self,
+        global_limit: int = 32,
+        framework_limit: int = 16,
+        max_queue: int = 32,
+        max_wait: float = 2.0,
+        adaptive: bool = False,
+        min_limit: int = 2,
+        target_latency: float = 10.0,
+        decrease_factor: float = 0.8
+    ):
+        self.framework_limit = framework_limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._limit_options = {
+            'adaptive': adaptive,
+            'min_limit': min_limit,
+            'target_latency': target_latency,
+            'decrease_factor': decrease_factor
+        }
+        self.global_limit = ConcurrencyLimit(GLOBAL_SCOPE, global_limit, **self._limit_options)
+        self.framework_limits: Dict[str, ConcurrencyLimit] = {}
+        self.waiting = 0
+        self.avg_latency: Optional[float] = None
+        self._changed = threading.Condition()
+
+    @classmethod
+    def from_settings(cls) -> 'AdmissionController':
+        return cls(
+            global_limit=settings.ADMISSION_GLOBAL_LIMIT,
+            framework_limit=settings.ADMISSION_FRAMEWORK_LIMIT,
+            max_queue=settings.ADMISSION_MAX_QUEUE,
+            max_wait=settings.ADMISSION_MAX_WAIT,
+            adaptive=settings.ADMISSION_ADAPTIVE,
+            min_limit=settings.ADMISSION_MIN_LIMIT,
+            target_latency=settings.ADMISSION_TARGET_LATENCY,
+            decrease_factor=settings.ADMISSION_DECREASE_FACTOR
+        )
+
+    def _framework_limit(self, framework: str) -> ConcurrencyLimit:
+        # Caller holds self._changed
+        if framework not in self.framework_limits:
+            self.framework_limits[framework] = ConcurrencyLimit(framework, self.framework_limit, **self._limit_options)
+        return self.framework_limits[framework]
+
+    def acquire(self, framework: str) -> Ticket:
+        """Take a global and a framework slot, waiting briefly; raises AdmissionRejected"""
+        start = time.monotonic()
+        with self._changed:
+            limit = self._framework_limit(framework)
+            ready = lambda: self.global_limit.has_capacity() and limit.has_capacity()
+
+            if not ready():
+                if self.waiting >= self.max_queue:
+                    self._shed(framework, 'queue_full', 429, start)
+                self.waiting += 1
+                ADMISSION_QUEUED.set(self.waiting)
+                try:
+                    admitted = self._changed.wait_for(ready, timeout=self.max_wait)
+                finally:
+                    self.waiting -= 1
+                    ADMISSION_QUEUED.set(self.waiting)
+                if not admitted:
+                    self._shed(framework, 'wait_timeout', 503, start)
+
+            self.global_limit.acquire()
+            limit.acquire()
+        ADMISSION_QUEUE_SECONDS.labels(framework=framework, outcome='admitted').observe(time.monotonic() - start)
+        return Ticket(framework=framework, admitted_at=time.monotonic())
+
+    def release(self, ticket: Ticket, record_latency: bool = True):
+        latency = time.monotonic() - ticket.admitted_at if record_latency else None
+        with self._changed:
+            self.global_limit.release(latency)
+            self._framework_limit(ticket.framework).release(latency)
+            if latency is not None:
+                self.avg_latency = latency if self.avg_latency is None else 0.2 * latency + 0.8 * self.avg_latency
+            self._changed.notify_all()
+
+    @contextmanager
+    def admit(self, framework: str):
+        ticket = self.acquire(framework)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def _shed(self, framework: str, reason: str, status_code: int, start: float):
+        # Caller holds self._changed
+        ADMISSION_SHED.labels(framework=framework, reason=reason).inc()
+        ADMISSION_QUEUE_SECONDS.labels(framework=framework, outcome='shed').observe(time.monotonic() - start)
+        raise AdmissionRejected(
+            f"Server is at capacity for {framework or 'queries'} ({reason}); retry later",
+            status_code,
+            self._retry_after()
+        )
+
+    def _retry_after(self) -> int:
+        """Rough time for the current backlog to drain, clamped to 1..30s"""
+        if self.avg_latency is None:
+            return 1
+        backlog = (self.waiting + self.global_limit.in_flight) / max(1, int(self.global_limit.limit))
+        return int(min(30, max(1, round(backlog * self.avg_latency))))
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._changed:
+            return {
+                'waiting': self.waiting,
+                'max_queue': self.max_queue,
+                'limits': {
+                    limit.scope: {'limit': int(limit.limit), 'in_flight': limit.in_flight}
+                    for limit in [self.global_limit, *self.framework_limits.values()]
+                }
+            }
+
+
+class AdmittedStream:
+    """Holds an admission ticket for as long as a response stream is open.
+
+    The ticket is released when the stream is exhausted or closed, including
+    when the server closes it before the first item (a plain generator's
+    finally block would not run then).
+    """
+
+    def __init__(self, controller: Any, ticket: Ticket, events: Iterator):
+        self.controller = controller
+        self.ticket = ticket
+        self.events = events
+        self._released = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.events)
+        except StopIteration:
+            self._release(record_latency=True)
+            raise
+
+    def close(self):
+        try:
+            if hasattr(self.events, 'close'):
+                self.events.close()
+        finally:
+            self._release(record_latency=False)
+
+    def _release(self, record_latency: bool):
+        if not self._released:
+            self._released = True
+            self.controller.release(self.ticket, record_latency=record_latency)
+
+
+class _NoAdmission:
+    """Stand-in used when ADMISSION_ENABLED is off"""
+
+    def acquire(self, framework: str) -> Ticket:
+        return Ticket(framework=framework, admitted_at=time.monotonic())
+
+    def release(self, ticket: Ticket, record_latency: bool = True):
+        pass
+
+    @contextmanager
+    def admit(self, framework: str):
+        yield self.acquire(framework)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {'enabled': False}
+
+# Global admission controller instance
+admission_controller = AdmissionController.from_settings() if settings.ADMISSION_ENABLED else _NoAdmission()
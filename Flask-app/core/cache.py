@@ -0,0 +1,213 @@
+import json
+import time
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from prometheus_client import Counter, Gauge
+import structlog
+from config.settings import settings
+
+logger = structlog.get_logger()
+
+# Prometheus Metrics
+RESPONSE_CACHE_REQUESTS = Counter(
+    'docker_agent_response_cache_requests_total',
+    'Response cache lookups per tier',
+    ['tier', 'result']      # tier: l1, redis; result: hit, miss
+)
+
+RESPONSE_CACHE_STORES = Counter(
+    'docker_agent_response_cache_stores_total',
+    'Answers offered to the response cache',
+    ['outcome']             # stored, uncacheable, too_large
+)
+
+RESPONSE_CACHE_ERRORS = Counter(
+    'docker_agent_response_cache_redis_errors_total',
+    'Redis errors; the cache degrades to L1 only while Redis is failing'
+)
+
+RESPONSE_CACHE_L1_ENTRIES = Gauge(
+    'docker_agent_response_cache_l1_entries',
+    'Entries currently held in the in-process cache'
+)
+
+KEY_PREFIX = 'docker_agent:response:v1:'
+
+# Tool steps that run shell commands on the Docker host; their answers describe live state
+COMMAND_TOOL_MARKER = 'run_command'
+
+
+def normalize_query(query: str) -> str:
+    """Case, surrounding whitespace, inner runs of whitespace and trailing punctuation don't change the answer"""
+    return re.sub(r'\s+', ' ', query or '').strip().casefold().rstrip('?.! ')
+
+
+def cache_key(framework: str, model: str, vector_store: str, query: str) -> str:
+    parts = [
+        (framework or '').strip().lower(),
+        (model or '').strip().lower(),
+        (vector_store or '').strip().lower(),
+        normalize_query(query)
+    ]
+    return KEY_PREFIX + hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def is_cacheable(result: Dict[str, Any]) -> bool:
+    """Only complete agent answers that did not execute commands.
+
+    Fast-path answers run (or hand back) a Docker command and reflect the
+    host's current state; budget-exhausted answers are partial.
+    """
+    if result.get('status') != 'success':
+        return False
+    if result.get('fast_path_intent') or result.get('budget_exhausted'):
+        return False
+    return not any(COMMAND_TOOL_MARKER in name for name in result.get('tools_used') or [])
+
+
+class LRUCache:
+    """Thread-safe in-process LRU with per-entry expiry"""
+
+    def __init__(self, max_entries: int = 256, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                RESPONSE_CACHE_L1_ENTRIES.set(len(self._entries))
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (ttl if ttl is not None else self.ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            RESPONSE_CACHE_L1_ENTRIES.set(len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            RESPONSE_CACHE_L1_ENTRIES.set(0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ResponseCache:
+    """Two-tier answer cache: a per-process LRU in front of Redis shared by all Flask replicas.
+
+    `redis_client` is anything with redis-py's get and set(ex=), so an
+    in-memory stand-in can be passed in tests. Redis errors never fail a
+    request: the tier is skipped for `redis_retry_after` seconds instead.
+    """
+
+    def __init__(
+        self,
+        redis_client: Any = None,
+        ttl: float = 3600.0,
+        l1_max_entries: int = 256,
+        l1_ttl: float = 300.0,
+        max_value_bytes: int = 64 * 1024,
+        redis_retry_after: float = 30.0
+    ):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.l1 = LRUCache(l1_max_entries, min(l1_ttl, ttl))
+        self.max_value_bytes = max_value_bytes
+        self.redis_retry_after = redis_retry_after
+        self._redis_down_until = 0.0
+
+    @classmethod
+    def from_settings(cls) -> 'ResponseCache':
+        redis_client = None
+        if settings.REDIS_URL:
+            try:
+                import redis
+                redis_client = redis.Redis.from_url(
+                    settings.REDIS_URL,
+                    socket_timeout=settings.RESPONSE_CACHE_REDIS_TIMEOUT,
+                    socket_connect_timeout=settings.RESPONSE_CACHE_REDIS_TIMEOUT
+                )
+            except ImportError:
+                logger.warning("redis package not installed; response cache is in-process only")
+        return cls(
+            redis_client=redis_client,
+            ttl=settings.RESPONSE_CACHE_TTL,
+            l1_max_entries=settings.RESPONSE_CACHE_L1_MAX_ENTRIES,
+            l1_ttl=settings.RESPONSE_CACHE_L1_TTL,
+            max_value_bytes=settings.RESPONSE_CACHE_MAX_VALUE_BYTES,
+            redis_retry_after=settings.RESPONSE_CACHE_REDIS_RETRY_AFTER
+        )
+
+    def get(self, key: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Return (value, tier) where tier is 'l1' or 'redis', or (None, None) on a miss"""
+        value = self.l1.get(key)
+        RESPONSE_CACHE_REQUESTS.labels(tier='l1', result='hit' if value is not None else 'miss').inc()
+        if value is not None:
+            return value, 'l1'
+
+        if not self._redis_available():
+            return None, None
+        try:
+            raw = self.redis.get(key)
+        except Exception as e:
+            self._redis_failed(e)
+            return None, None
+
+        value = None
+        if raw is not None:
+            try:
+                value = json.loads(raw)
+            except ValueError:
+                # Corrupt or written by an incompatible version; recomputing overwrites it
+                logger.warning("Unreadable response cache entry", key=key)
+        if not isinstance(value, dict):
+            value = None
+        RESPONSE_CACHE_REQUESTS.labels(tier='redis', result='hit' if value is not None else 'miss').inc()
+        if value is None:
+            return None, None
+        # Promote so the next lookup on this replica stays in-process
+        self.l1.set(key, value)
+        return value, 'redis'
+
+    def set(self, key: str, value: Dict[str, Any]) -> bool:
+        payload = json.dumps(value, default=str)
+        if len(payload.encode('utf-8')) > self.max_value_bytes:
+            RESPONSE_CACHE_STORES.labels(outcome='too_large').inc()
+            return False
+
+        self.l1.set(key, value)
+        if self._redis_available():
+            try:
+                self.redis.set(key, payload, ex=max(1, int(self.ttl)))
+            except Exception as e:
+                self._redis_failed(e)
+        RESPONSE_CACHE_STORES.labels(outcome='stored').inc()
+        return True
+
+    def _redis_available(self) -> bool:
+        return self.redis is not None and time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, error: Exception):
+        RESPONSE_CACHE_ERRORS.inc()
+        self._redis_down_until = time.monotonic() + self.redis_retry_after
+        logger.warning("Response cache Redis error; using L1 only", error=str(error), retry_in=self.redis_retry_after)
+
+# Global response cache instance
+response_cache = ResponseCache.from_settings()
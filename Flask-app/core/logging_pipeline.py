@@ -0,0 +1,192 @@
+import atexit
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import structlog
+from prometheus_client import Counter, Gauge, Histogram
+from config.settings import settings
+
+# Prometheus Metrics
+LOG_RECORDS_QUEUED = Counter(
+    'docker_agent_log_records_queued_total',
+    'Log records handed to the background log writer'
+)
+
+LOG_RECORDS_DROPPED = Counter(
+    'docker_agent_log_records_dropped_total',
+    'Log records dropped because the log queue was full',
+    ['level']
+)
+
+LOG_QUEUE_DEPTH = Gauge(
+    'docker_agent_log_queue_depth',
+    'Log records waiting to be written'
+)
+
+LOG_FLUSH_DURATION = Histogram(
+    'docker_agent_log_flush_duration_seconds',
+    'Time to render and write one batch of log records',
+    buckets=[0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0]
+)
+
+LOG_BATCH_SIZE = Histogram(
+    'docker_agent_log_batch_size',
+    'Log records written per batch',
+    buckets=[1, 5, 10, 50, 100, 250, 500, 1000]
+)
+
+# Processors that must see the calling thread: level filtering, timestamps, stack and exception capture
+CALLER_PROCESSORS = [
+    structlog.stdlib.filter_by_level,
+    structlog.stdlib.add_logger_name,
+    structlog.stdlib.add_log_level,
+    structlog.processors.TimeStamper(fmt="iso"),
+    structlog.processors.StackInfoRenderer(),
+]
+
+# Processors that only turn the event dict into text, safe to run on the writer thread
+RENDER_PROCESSORS = [
+    structlog.stdlib.PositionalArgumentsFormatter(),
+    structlog.processors.format_exc_info,
+    structlog.processors.UnicodeDecoder(),
+    structlog.processors.JSONRenderer()
+]
+
+
+def capture_exc_info(logger: Any, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """Resolve exc_info=True to the exception being handled, which only the calling thread can see"""
+    if event_dict.get('exc_info') is True:
+        event_dict['exc_info'] = sys.exc_info()
+    return event_dict
+
+
+class LogPipeline:
+    """Bounded queue of structlog event dicts written by a background thread.
+
+    The final structlog processor, `enqueue`, puts the event on the queue
+    and stops processing, so a log call in a request only pays for level
+    filtering and a timestamp. The writer thread wakes every
+    `flush_interval` seconds (or once `batch_size` records are waiting),
+    renders the batch to JSON and hands it to the stdlib loggers.
+
+    When the queue is full, debug and info records are dropped; warnings
+    and errors evict the oldest queued record instead, so problems are
+    still reported under load. Pending records are written at exit.
+    Event values are rendered on the writer thread, after the call returns.
+    """
+
+    def __init__(self, max_size: int = 10000, batch_size: int = 256, flush_interval: float = 0.2):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Deque[Tuple[logging.Logger, Dict[str, Any]]] = deque()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._closed = False
+        atexit.register(self.close)
+
+    @classmethod
+    def from_settings(cls) -> 'LogPipeline':
+        return cls(
+            max_size=settings.LOG_QUEUE_MAX_SIZE,
+            batch_size=settings.LOG_BATCH_SIZE,
+            flush_interval=settings.LOG_FLUSH_INTERVAL_MS / 1000
+        )
+
+    def enqueue(self, logger: Any, method_name: str, event_dict: Dict[str, Any]):
+        """Last structlog processor: queue the event instead of rendering it"""
+        level = event_dict.get('level', method_name)
+        with self._condition:
+            self._ensure_writer()
+            if len(self._queue) >= self.max_size:
+                if logging.getLevelName(level.upper()) in (logging.DEBUG, logging.INFO):
+                    LOG_RECORDS_DROPPED.labels(level=level).inc()
+                    raise structlog.DropEvent
+                _, evicted = self._queue.popleft()
+                LOG_RECORDS_DROPPED.labels(level=evicted.get('level', 'unknown')).inc()
+            self._queue.append((logger, event_dict))
+            if len(self._queue) >= self.batch_size:
+                self._condition.notify()
+        LOG_RECORDS_QUEUED.inc()
+        raise structlog.DropEvent
+
+    def _ensure_writer(self):
+        # Caller holds self._condition; a forked worker inherits the queue but not the thread
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if len(self._queue) < self.batch_size and not self._closed:
+                    self._condition.wait(self.flush_interval)
+                batch = self._take_batch()
+                closed = self._closed
+            if batch:
+                self._write(batch)
+            elif closed:
+                return
+
+    def _take_batch(self) -> List[Tuple[logging.Logger, Dict[str, Any]]]:
+        # Caller holds self._condition
+        count = min(len(self._queue), self.batch_size)
+        batch = [self._queue.popleft() for _ in range(count)]
+        LOG_QUEUE_DEPTH.set(len(self._queue))
+        return batch
+
+    def _write(self, batch: List[Tuple[logging.Logger, Dict[str, Any]]]):
+        started = time.perf_counter()
+        for logger, event_dict in batch:
+            level = logging.getLevelName(event_dict.get('level', 'info').upper())
+            try:
+                rendered: Any = event_dict
+                for processor in RENDER_PROCESSORS:
+                    rendered = processor(logger, event_dict.get('level', 'info'), rendered)
+                logger.log(level if isinstance(level, int) else logging.INFO, rendered)
+            except Exception:
+                # A record that cannot be rendered must not stop the writer
+                logging.getLogger(__name__).exception("Failed to write log record")
+        LOG_FLUSH_DURATION.observe(time.perf_counter() - started)
+        LOG_BATCH_SIZE.observe(len(batch))
+
+    def flush(self, timeout: float = 5.0):
+        """Write everything queued so far from the calling thread"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._condition:
+                batch = self._take_batch()
+            if not batch:
+                return
+            self._write(batch)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self.flush()
+
+
+def configure_logging(pipeline: Optional[LogPipeline]):
+    """Configure structlog; with a pipeline, rendering and writing move to its writer thread"""
+    if pipeline is not None:
+        processors = CALLER_PROCESSORS + [capture_exc_info, pipeline.enqueue]
+    else:
+        processors = CALLER_PROCESSORS + RENDER_PROCESSORS
+    structlog.configure(
+        processors=processors,
+        context_class=dict,
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.stdlib.BoundLogger,
+        cache_logger_on_first_use=True,
+    )
+
+# Global log pipeline instance
+log_pipeline = LogPipeline.from_settings() if settings.LOG_QUEUE_ENABLED else None
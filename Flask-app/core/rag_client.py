@@ -0,0 +1,425 @@
+import json
+import time
+import random
+import threading
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from prometheus_client import Counter, Histogram, Gauge
+import structlog
+from config.settings import settings
+
+logger = structlog.get_logger()
+
+# Responses that say the replica itself is unhealthy. A plain 500 from /ask is the
+# framework failing, which the per-framework circuit breaker handles, not ejection.
+REPLICA_FAILURE_STATUSES = {502, 503, 504}
+
+# Prometheus Metrics
+RAG_API_REQUESTS = Counter(
+    'docker_agent_rag_api_requests_total',
+    'Requests sent to the Rag-API',
+    ['endpoint', 'replica', 'status']
+)
+
+RAG_API_DURATION = Histogram(
+    'docker_agent_rag_api_request_duration_seconds',
+    'Rag-API request duration in seconds, including time waiting for a pooled connection',
+    ['endpoint', 'replica']
+)
+
+RAG_REPLICA_IN_FLIGHT = Gauge(
+    'docker_agent_rag_replica_in_flight',
+    'Requests currently outstanding against each Rag-API replica',
+    ['replica']
+)
+
+RAG_REPLICA_LATENCY = Gauge(
+    'docker_agent_rag_replica_latency_ewma_seconds',
+    'Exponentially weighted moving average of each Rag-API replica\'s request latency',
+    ['replica']
+)
+
+RAG_REPLICA_HEALTHY = Gauge(
+    'docker_agent_rag_replica_healthy',
+    '1 when a Rag-API replica is eligible for traffic, 0 while it is ejected',
+    ['replica']
+)
+
+RAG_REPLICA_EJECTIONS = Counter(
+    'docker_agent_rag_replica_ejections_total',
+    'Times a Rag-API replica was taken out of rotation',
+    ['replica']
+)
+
+RAG_POOL_CONNECTIONS_CREATED = Counter(
+    'docker_agent_rag_pool_connections_created_total',
+    'New TCP connections opened to the Rag-API (requests minus this is the keep-alive reuse)'
+)
+
+RAG_POOL_IN_USE = Gauge(
+    'docker_agent_rag_pool_in_use',
+    'Pooled Rag-API connections currently checked out'
+)
+
+RAG_POOL_SIZE = Gauge(
+    'docker_agent_rag_pool_size',
+    'Maximum number of pooled connections per Rag-API replica'
+)
+
+RAG_POOL_WAIT = Histogram(
+    'docker_agent_rag_pool_wait_seconds',
+    'Time spent waiting for a free pooled Rag-API connection',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+)
+
+RAG_POOL_SATURATED = Counter(
+    'docker_agent_rag_pool_saturated_total',
+    'Checkouts that found every pooled Rag-API connection in use'
+)
+
+
+class _InstrumentedPoolMixin:
+    """Counts new connections and times connection checkout for a urllib3 pool"""
+
+    pool_timeout: Optional[float] = None
+
+    def _new_conn(self):
+        RAG_POOL_CONNECTIONS_CREATED.inc()
+        return super()._new_conn()
+
+    def _get_conn(self, timeout=None):
+        # The queue is pre-filled with placeholders, so an empty queue means every slot is taken
+        if self.pool is not None and self.pool.empty():
+            RAG_POOL_SATURATED.inc()
+
+        start = time.perf_counter()
+        conn = super()._get_conn(timeout=timeout if timeout is not None else self.pool_timeout)
+        RAG_POOL_WAIT.observe(time.perf_counter() - start)
+        RAG_POOL_IN_USE.inc()
+        return conn
+
+    def _put_conn(self, conn):
+        RAG_POOL_IN_USE.dec()
+        return super()._put_conn(conn)
+
+
+class _InstrumentedHTTPConnectionPool(_InstrumentedPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _InstrumentedHTTPSConnectionPool(_InstrumentedPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class _PooledAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools report to Prometheus and give up after pool_timeout when saturated"""
+
+    def __init__(self, pool_timeout: float, **kwargs):
+        self.pool_timeout = pool_timeout
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        pool_classes = {}
+        for scheme, base in (('http', _InstrumentedHTTPConnectionPool), ('https', _InstrumentedHTTPSConnectionPool)):
+            pool_classes[scheme] = type(base.__name__, (base,), {'pool_timeout': self.pool_timeout})
+        self.poolmanager.pool_classes_by_scheme = pool_classes
+
+
+class Replica:
+    """One Rag-API endpoint with its load and health state"""
+
+    def __init__(self, url: str, ewma_alpha: float = 0.3):
+        self.url = url.rstrip('/')
+        self.ewma_alpha = ewma_alpha
+        self.in_flight = 0
+        self.ewma_latency: Optional[float] = None
+        self.consecutive_failures = 0
+        self.ejected_until: Optional[float] = None
+        self.lock = threading.Lock()
+        RAG_REPLICA_HEALTHY.labels(replica=self.url).set(1)
+
+    @property
+    def available(self) -> bool:
+        return self.ejected_until is None
+
+    def acquire(self):
+        with self.lock:
+            self.in_flight += 1
+            RAG_REPLICA_IN_FLIGHT.labels(replica=self.url).set(self.in_flight)
+
+    def release(self, latency: Optional[float] = None):
+        with self.lock:
+            self.in_flight -= 1
+            RAG_REPLICA_IN_FLIGHT.labels(replica=self.url).set(self.in_flight)
+            if latency is not None:
+                if self.ewma_latency is None:
+                    self.ewma_latency = latency
+                else:
+                    self.ewma_latency = self.ewma_alpha * latency + (1 - self.ewma_alpha) * self.ewma_latency
+                RAG_REPLICA_LATENCY.labels(replica=self.url).set(self.ewma_latency)
+
+    def score(self, policy: str) -> float:
+        """Lower is better"""
+        if policy == 'ewma':
+            # Unmeasured replicas get tried first; outstanding work inflates the expected latency
+            return (self.ewma_latency or 0.0) * (self.in_flight + 1)
+        return float(self.in_flight)
+
+
+class RagApiClient:
+    """Keep-alive HTTP client for the Rag-API, shared by all framework adapters.
+
+    Requests are spread over one or more replicas (least outstanding requests
+    or EWMA latency). A background thread probes each replica's /health;
+    replicas that keep failing (connection errors, 502/503/504, failed
+    probes) are ejected and only readmitted after `readmit_delay` seconds
+    and a successful probe.
+    """
+
+    def __init__(
+        self,
+        base_urls: List[str],
+        pool_size: int = 20,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 30.0,
+        pool_timeout: float = 10.0,
+        policy: str = 'least_outstanding',
+        health_interval: float = 5.0,
+        health_timeout: float = 2.0,
+        eject_after: int = 2,
+        readmit_delay: float = 30.0
+    ):
+        if not base_urls:
+            raise ValueError("At least one Rag-API URL is required")
+        if policy not in ('least_outstanding', 'ewma'):
+            raise ValueError(f"Unknown load-balancing policy '{policy}'")
+
+        self.replicas = [Replica(url) for url in base_urls]
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_timeout = pool_timeout
+        self.policy = policy
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.eject_after = eject_after
+        self.readmit_delay = readmit_delay
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+
+        # One adapter shared by every thread's session; urllib3 keeps one bounded pool per replica
+        self._adapter = _PooledAdapter(
+            pool_timeout=pool_timeout,
+            pool_connections=len(self.replicas),
+            pool_maxsize=pool_size,
+            pool_block=True,
+            max_retries=0
+        )
+        RAG_POOL_SIZE.set(pool_size)
+        self.start_health_checks()
+
+    @classmethod
+    def from_settings(cls) -> 'RagApiClient':
+        return cls(
+            base_urls=settings.RAG_API_URLS or [settings.RAG_API_URL],
+            pool_size=settings.RAG_API_POOL_SIZE,
+            connect_timeout=settings.RAG_API_CONNECT_TIMEOUT,
+            read_timeout=settings.RAG_API_READ_TIMEOUT,
+            pool_timeout=settings.RAG_API_POOL_TIMEOUT,
+            policy=settings.RAG_API_LB_POLICY,
+            health_interval=settings.RAG_API_HEALTH_INTERVAL,
+            health_timeout=settings.RAG_API_HEALTH_TIMEOUT,
+            eject_after=settings.RAG_API_EJECT_AFTER,
+            readmit_delay=settings.RAG_API_READMIT_DELAY
+        )
+
+    @property
+    def session(self) -> requests.Session:
+        """Per-thread session (Session itself is not thread-safe) mounted on the shared pool"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('http://', self._adapter)
+            session.mount('https://', self._adapter)
+            self._local.session = session
+        return session
+
+    def pick_replica(self) -> Replica:
+        """Choose the replica for the next request"""
+        candidates = [replica for replica in self.replicas if replica.available]
+        if not candidates:
+            # Everything is ejected: fail open rather than refuse all traffic
+            candidates = list(self.replicas)
+        random.shuffle(candidates)  # Break ties randomly so idle replicas share the load
+        return min(candidates, key=lambda replica: replica.score(self.policy))
+
+    def ask(self, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """POST a query to /ask and return the decoded RAGResponse"""
+        return self.post('/ask', payload, headers)
+
+    def post(self, path: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        replica = self.pick_replica()
+        replica.acquire()
+        start = time.perf_counter()
+        status = 'error'
+        latency = None
+        try:
+            response = self.session.post(f"{replica.url}{path}", json=payload, headers=headers, timeout=self.timeout)
+            status = str(response.status_code)
+            latency = time.perf_counter() - start
+            if response.status_code in REPLICA_FAILURE_STATUSES:
+                self._record_failure(replica)
+            else:
+                replica.consecutive_failures = 0
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.ConnectionError:
+            # Includes connect timeouts: the replica never saw the request
+            status = 'connect_error'
+            self._record_failure(replica)
+            raise
+        except requests.exceptions.ReadTimeout:
+            status = 'read_timeout'
+            latency = time.perf_counter() - start
+            raise
+        finally:
+            replica.release(latency)
+            RAG_API_REQUESTS.labels(endpoint=path, replica=replica.url, status=status).inc()
+            RAG_API_DURATION.labels(endpoint=path, replica=replica.url).observe(time.perf_counter() - start)
+
+    def stream(
+        self,
+        payload: Dict[str, Any],
+        path: str = '/ask/stream',
+        headers: Optional[Dict[str, str]] = None
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """POST a query to a server-sent-events endpoint and yield (event, data) as they arrive.
+
+        The replica counts as in flight until the stream is closed. Stream
+        durations say nothing about the replica's speed, so they are not fed
+        into its latency average.
+        """
+        replica = self.pick_replica()
+        replica.acquire()
+        start = time.perf_counter()
+        status = 'error'
+        streaming = False
+        try:
+            response = self.session.post(
+                f"{replica.url}{path}", json=payload, headers=headers, timeout=self.timeout, stream=True
+            )
+            status = str(response.status_code)
+            if response.status_code in REPLICA_FAILURE_STATUSES:
+                self._record_failure(replica)
+            else:
+                replica.consecutive_failures = 0
+            with response:
+                response.raise_for_status()
+                streaming = True
+                yield from _parse_sse(response.iter_lines(decode_unicode=True))
+        except requests.exceptions.RequestException as e:
+            if streaming:
+                # The replica accepted the request; a slow or broken token stream
+                # (read timeouts surface here as ConnectionError) is not grounds to eject it
+                status = 'stream_error'
+            elif isinstance(e, requests.exceptions.ConnectionError):
+                status = 'connect_error'
+                self._record_failure(replica)
+            elif isinstance(e, requests.exceptions.ReadTimeout):
+                status = 'read_timeout'
+            raise
+        finally:
+            replica.release()
+            RAG_API_REQUESTS.labels(endpoint=path, replica=replica.url, status=status).inc()
+            RAG_API_DURATION.labels(endpoint=path, replica=replica.url).observe(time.perf_counter() - start)
+
+    def _record_failure(self, replica: Replica):
+        with replica.lock:
+            replica.consecutive_failures += 1
+            should_eject = replica.available and replica.consecutive_failures >= self.eject_after
+            if should_eject:
+                replica.ejected_until = time.monotonic() + self.readmit_delay
+        if should_eject:
+            RAG_REPLICA_HEALTHY.labels(replica=replica.url).set(0)
+            RAG_REPLICA_EJECTIONS.labels(replica=replica.url).inc()
+            logger.warning("Rag-API replica ejected", replica=replica.url, readmit_in=self.readmit_delay)
+
+    def check_health(self, replica: Replica) -> bool:
+        """Probe one replica's /health; readmit it if its ejection delay has passed"""
+        try:
+            healthy = requests.get(f"{replica.url}/health", timeout=self.health_timeout).status_code == 200
+        except requests.exceptions.RequestException:
+            healthy = False
+
+        if not healthy:
+            self._record_failure(replica)
+            return False
+
+        with replica.lock:
+            replica.consecutive_failures = 0
+            readmit = replica.ejected_until is not None and time.monotonic() >= replica.ejected_until
+            if readmit:
+                replica.ejected_until = None
+        if readmit:
+            RAG_REPLICA_HEALTHY.labels(replica=replica.url).set(1)
+            logger.info("Rag-API replica readmitted", replica=replica.url)
+        return True
+
+    def start_health_checks(self):
+        """Start the background /health prober (once)"""
+        if self._health_thread is not None or self.health_interval <= 0:
+            return
+        with _health_thread_lock:
+            if self._health_thread is None:
+                self._health_thread = threading.Thread(
+                    target=self._health_loop, name='rag-api-health', daemon=True
+                )
+                self._health_thread.start()
+
+    def _health_loop(self):
+        while not self._stop.is_set():
+            for replica in self.replicas:
+                self.check_health(replica)
+            self._stop.wait(self.health_interval)
+
+    def get_replica_status(self) -> List[Dict[str, Any]]:
+        """Current load and health of every replica"""
+        return [
+            {
+                'url': replica.url,
+                'available': replica.available,
+                'in_flight': replica.in_flight,
+                'ewma_latency_ms': round(replica.ewma_latency * 1000, 2) if replica.ewma_latency is not None else None,
+                'consecutive_failures': replica.consecutive_failures
+            }
+            for replica in self.replicas
+        ]
+
+    def close(self):
+        self._stop.set()
+        self._adapter.close()
+
+
+def _parse_sse(lines: Iterator[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Decode `event:`/`data:` blocks; comment lines (keep-alives) are skipped"""
+    event, data = 'message', []
+    for line in lines:
+        if not line:
+            if data:
+                yield event, json.loads('\n'.join(data))
+            event, data = 'message', []
+        elif line.startswith(':'):
+            continue
+        elif line.startswith('event:'):
+            event = line[6:].strip()
+        elif line.startswith('data:'):
+            data.append(line[5:].lstrip())
+
+
+_health_thread_lock = threading.Lock()
+
+# Global Rag-API client instance
+rag_client = RagApiClient.from_settings()
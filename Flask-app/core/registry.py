@@ -1,7 +1,23 @@
-from typing import Dict, Type, Any, List
+from typing import Dict, Type, Any, List, Union
 from abc import ABC, abstractmethod
+from importlib.metadata import entry_points
+from threading import RLock
 import importlib
 import inspect
+import time
+from prometheus_client import Gauge
+import structlog
+
+logger = structlog.get_logger()
+
+COMPONENT_LOAD_SECONDS = Gauge(
+    'docker_agent_component_load_seconds',
+    'Time taken to import and initialise each registered component',
+    ['kind', 'component', 'phase']     # phase: import, init
+)
+
+# Entry-point group third-party packages can use to provide framework adapters
+FRAMEWORK_ENTRY_POINT_GROUP = 'docker_agent.frameworks'
 
 class FrameworkAdapter(ABC):
     """Abstract base class for framework adapters"""
@@ -58,73 +74,160 @@ class VectorStoreProvider(ABC):
         pass
 
 class ComponentRegistry:
-    """Registry for managing framework adapters, LLM providers, and vector stores"""
+    """Registry for managing framework adapters, LLM providers, and vector stores.
+
+    Each component is created once and reused. Components can also be
+    registered lazily by name, from a "module:Class" path or an entry point,
+    so their modules are only imported the first time they are requested.
+    """
     
     def __init__(self):
-        self._frameworks: Dict[str, Type[FrameworkAdapter]] = {}
-        self._llm_providers: Dict[str, Type[LLMProvider]] = {}
-        self._vector_stores: Dict[str, Type[VectorStoreProvider]] = {}
+        self._frameworks: Dict[str, FrameworkAdapter] = {}
+        self._llm_providers: Dict[str, LLMProvider] = {}
+        self._vector_stores: Dict[str, VectorStoreProvider] = {}
+        self._lazy: Dict[str, Dict[str, Any]] = {'framework': {}, 'llm_provider': {}, 'vector_store': {}}
+        self._timings: Dict[str, Dict[str, Dict[str, float]]] = {'framework': {}, 'llm_provider': {}, 'vector_store': {}}
+        self._lock = RLock()
+    
+    def _instances(self, kind: str) -> Dict[str, Any]:
+        return {
+            'framework': self._frameworks,
+            'llm_provider': self._llm_providers,
+            'vector_store': self._vector_stores
+        }[kind]
+    
+    def _register_instance(self, kind: str, base: type, component_class: type, import_seconds: float = 0.0):
+        """Create the single instance of a component and index it by its own name"""
+        if not issubclass(component_class, base):
+            raise ValueError(f"{component_class.__name__} must inherit from {base.__name__}")
+        
+        start = time.perf_counter()
+        instance = component_class()
+        init_seconds = time.perf_counter() - start
+        
+        name = instance.get_name().lower()
+        with self._lock:
+            self._instances(kind)[name] = instance
+            self._lazy[kind].pop(name, None)
+            self._timings[kind][name] = {
+                'import_ms': round(import_seconds * 1000, 2),
+                'init_ms': round(init_seconds * 1000, 2)
+            }
+        COMPONENT_LOAD_SECONDS.labels(kind=kind, component=name, phase='import').set(import_seconds)
+        COMPONENT_LOAD_SECONDS.labels(kind=kind, component=name, phase='init').set(init_seconds)
+        return instance
     
     def register_framework(self, adapter_class: Type[FrameworkAdapter]):
         """Register a framework adapter"""
-        if not issubclass(adapter_class, FrameworkAdapter):
-            raise ValueError("Adapter must inherit from FrameworkAdapter")
-        
-        # Create instance to get name
-        instance = adapter_class()
-        name = instance.get_name().lower()
-        self._frameworks[name] = adapter_class
+        self._register_instance('framework', FrameworkAdapter, adapter_class)
     
     def register_llm_provider(self, provider_class: Type[LLMProvider]):
         """Register an LLM provider"""
-        if not issubclass(provider_class, LLMProvider):
-            raise ValueError("Provider must inherit from LLMProvider")
-        
-        instance = provider_class()
-        name = instance.get_name().lower()
-        self._llm_providers[name] = provider_class
+        self._register_instance('llm_provider', LLMProvider, provider_class)
     
     def register_vector_store(self, store_class: Type[VectorStoreProvider]):
         """Register a vector store provider"""
-        if not issubclass(store_class, VectorStoreProvider):
-            raise ValueError("Store must inherit from VectorStoreProvider")
+        self._register_instance('vector_store', VectorStoreProvider, store_class)
+    
+    def register_lazy(self, kind: str, name: str, target: Union[str, Any]):
+        """Register a component to load on first use.
         
-        instance = store_class()
-        name = instance.get_name().lower()
-        self._vector_stores[name] = store_class
+        `target` is a "package.module:ClassName" path or an importlib.metadata.EntryPoint.
+        """
+        with self._lock:
+            if name.lower() not in self._instances(kind):
+                self._lazy[kind][name.lower()] = target
+    
+    def register_lazy_frameworks(self, module_map: Dict[str, str]):
+        """Register framework adapters from a {name: "module:Class"} map without importing them"""
+        for name, target in module_map.items():
+            self.register_lazy('framework', name, target)
+    
+    def discover_entry_points(self, group: str = FRAMEWORK_ENTRY_POINT_GROUP):
+        """Register adapters advertised by installed packages; nothing is imported until used"""
+        try:
+            discovered = entry_points(group=group)
+        except TypeError:
+            # Python < 3.10 returns a dict of groups
+            discovered = entry_points().get(group, [])
+        for entry_point in discovered:
+            self.register_lazy('framework', entry_point.name, entry_point)
+    
+    def _get(self, kind: str, base: type, name: str, label: str):
+        name = name.lower()
+        instance = self._instances(kind).get(name)
+        if instance is not None:
+            return instance
+        
+        with self._lock:
+            # Another thread may have loaded it while we waited
+            instance = self._instances(kind).get(name)
+            if instance is not None:
+                return instance
+            
+            target = self._lazy[kind].get(name)
+            if target is None:
+                raise ValueError(f"{label} '{name}' not registered")
+            
+            start = time.perf_counter()
+            component_class = self._load_target(target)
+            import_seconds = time.perf_counter() - start
+            
+            instance = self._register_instance(kind, base, component_class, import_seconds)
+            if instance.get_name().lower() != name:
+                # Keep the lazily registered name working even if the class reports another
+                self._instances(kind)[name] = instance
+                self._timings[kind][name] = self._timings[kind][instance.get_name().lower()]
+            
+            logger.info(
+                "Component loaded",
+                kind=kind,
+                component=name,
+                **self._timings[kind][name]
+            )
+            return instance
+    
+    @staticmethod
+    def _load_target(target: Union[str, Any]) -> type:
+        if isinstance(target, str):
+            module_path, _, attribute = target.partition(':')
+            return getattr(importlib.import_module(module_path), attribute)
+        return target.load()
     
     def get_framework(self, name: str) -> FrameworkAdapter:
-        """Get a framework adapter instance"""
-        name = name.lower()
-        if name not in self._frameworks:
-            raise ValueError(f"Framework '{name}' not registered")
-        return self._frameworks[name]()
+        """Get the framework adapter instance"""
+        return self._get('framework', FrameworkAdapter, name, 'Framework')
     
     def get_llm_provider(self, name: str) -> LLMProvider:
-        """Get an LLM provider instance"""
-        name = name.lower()
-        if name not in self._llm_providers:
-            raise ValueError(f"LLM provider '{name}' not registered")
-        return self._llm_providers[name]()
+        """Get the LLM provider instance"""
+        return self._get('llm_provider', LLMProvider, name, 'LLM provider')
     
     def get_vector_store(self, name: str) -> VectorStoreProvider:
-        """Get a vector store provider instance"""
-        name = name.lower()
-        if name not in self._vector_stores:
-            raise ValueError(f"Vector store '{name}' not registered")
-        return self._vector_stores[name]()
+        """Get the vector store provider instance"""
+        return self._get('vector_store', VectorStoreProvider, name, 'Vector store')
+    
+    def _available(self, kind: str) -> List[str]:
+        with self._lock:
+            return list(self._instances(kind).keys()) + [
+                name for name in self._lazy[kind] if name not in self._instances(kind)
+            ]
     
     def get_available_frameworks(self) -> List[str]:
-        """Get list of available frameworks"""
-        return list(self._frameworks.keys())
+        """Get list of available frameworks (loaded or not)"""
+        return self._available('framework')
     
     def get_available_llm_providers(self) -> List[str]:
         """Get list of available LLM providers"""
-        return list(self._llm_providers.keys())
+        return self._available('llm_provider')
     
     def get_available_vector_stores(self) -> List[str]:
         """Get list of available vector stores"""
-        return list(self._vector_stores.keys())
+        return self._available('vector_store')
+    
+    def get_component_timings(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """Import and init time (ms) of every component loaded so far, by kind"""
+        with self._lock:
+            return {kind: dict(timings) for kind, timings in self._timings.items()}
     
     def auto_discover_components(self, package_path: str):
         """Auto-discover and register components from a package"""
@@ -132,6 +235,8 @@ class ComponentRegistry:
             module = importlib.import_module(package_path)
             
             for name, obj in inspect.getmembers(module, inspect.isclass):
+                if inspect.isabstract(obj):
+                    continue
                 if issubclass(obj, FrameworkAdapter) and obj != FrameworkAdapter:
                     self.register_framework(obj)
                 elif issubclass(obj, LLMProvider) and obj != LLMProvider:
@@ -0,0 +1,305 @@
+import time
+import random
+import threading
+from typing import Dict, Any, Callable, Optional, Tuple
+import requests
+from urllib3.exceptions import NewConnectionError, ConnectTimeoutError
+from prometheus_client import Counter, Gauge
+import structlog
+from config.settings import settings
+
+logger = structlog.get_logger()
+
+# Prometheus Metrics
+CIRCUIT_STATE = Gauge(
+    'docker_agent_circuit_state',
+    'Circuit breaker state per Rag-API endpoint and framework (0=closed, 1=half_open, 2=open)',
+    ['endpoint', 'framework']
+)
+
+CIRCUIT_TRANSITIONS = Counter(
+    'docker_agent_circuit_transitions_total',
+    'Circuit breaker state changes',
+    ['endpoint', 'framework', 'to_state']
+)
+
+CIRCUIT_FAST_FAILS = Counter(
+    'docker_agent_circuit_fast_fails_total',
+    'Calls rejected without contacting the Rag-API because the circuit was open',
+    ['endpoint', 'framework']
+)
+
+RETRY_ATTEMPTS = Counter(
+    'docker_agent_rag_retries_total',
+    'Retries of failed Rag-API calls',
+    ['endpoint', 'framework', 'outcome']     # outcome: attempted, budget_exhausted
+)
+
+RETRY_BUDGET_TOKENS = Gauge(
+    'docker_agent_rag_retry_budget_tokens',
+    'Retries currently available in the shared retry budget'
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the Rag-API while a circuit is open"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with half-open probes"""
+
+    CLOSED = 'closed'
+    HALF_OPEN = 'half_open'
+    OPEN = 'open'
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(
+        self,
+        endpoint: str,
+        framework: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        half_open_max_calls: int = 1
+    ):
+        self.endpoint = endpoint
+        self.framework = framework
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.half_open_calls = 0
+        self.lock = threading.Lock()
+        CIRCUIT_STATE.labels(endpoint=endpoint, framework=framework).set(0)
+
+    def before_call(self) -> Optional[Tuple[str, str]]:
+        """Admit a call or raise CircuitOpenError; returns the transition this caused, if any"""
+        with self.lock:
+            transition = None
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                transition = self._set_state(self.HALF_OPEN)
+                self.half_open_calls = 0
+
+            if self.state == self.OPEN or (
+                self.state == self.HALF_OPEN and self.half_open_calls >= self.half_open_max_calls
+            ):
+                CIRCUIT_FAST_FAILS.labels(endpoint=self.endpoint, framework=self.framework).inc()
+                raise CircuitOpenError(
+                    f"Rag-API circuit for {self.framework} {self.endpoint} is {self.state}; failing fast"
+                )
+
+            if self.state == self.HALF_OPEN:
+                self.half_open_calls += 1
+            return transition
+
+    def on_success(self) -> Optional[Tuple[str, str]]:
+        with self.lock:
+            self.failures = 0
+            if self.state != self.CLOSED:
+                return self._set_state(self.CLOSED)
+            return None
+
+    def on_failure(self) -> Optional[Tuple[str, str]]:
+        with self.lock:
+            self.failures += 1
+            # A failed probe reopens immediately; a closed circuit opens after the threshold
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED and self.failures >= self.failure_threshold
+            ):
+                self.opened_at = time.monotonic()
+                return self._set_state(self.OPEN)
+            return None
+
+    def _set_state(self, state: str) -> Tuple[str, str]:
+        previous, self.state = self.state, state
+        CIRCUIT_STATE.labels(endpoint=self.endpoint, framework=self.framework).set(self._STATE_VALUES[state])
+        CIRCUIT_TRANSITIONS.labels(endpoint=self.endpoint, framework=self.framework, to_state=state).inc()
+        logger.warning(
+            "Circuit breaker state changed",
+            endpoint=self.endpoint,
+            framework=self.framework,
+            from_state=previous,
+            to_state=state
+        )
+        return previous, state
+
+
+class RetryBudget:
+    """Caps retries at a fraction of recent traffic so retries cannot amplify an outage"""
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 0.5, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, amount: float = 0.0):
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + amount + (now - self.updated) * self.min_per_second)
+        self.updated = now
+        RETRY_BUDGET_TOKENS.set(self.tokens)
+
+    def record_request(self):
+        """Every first attempt earns `ratio` of a retry"""
+        with self.lock:
+            self._refill(self.ratio)
+
+    def try_withdraw(self) -> bool:
+        with self.lock:
+            self._refill()
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            RETRY_BUDGET_TOKENS.set(self.tokens)
+            return True
+
+
+def _connect_failed(error: Exception) -> bool:
+    """True when the connection was never established, so the request was never sent"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.exceptions.ConnectionError):
+        return False
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, 'reason', reason)
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+def is_retryable(error: Exception) -> bool:
+    """Only failures where the Rag-API did not run the query: it was never sent, or was explicitly refused.
+
+    A dropped connection ("Connection aborted", read timeout) may come after
+    /ask already ran docker commands, so it is not retried.
+    """
+    if _connect_failed(error):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code in (429, 503)
+    return False
+
+
+def is_failure(error: Exception) -> bool:
+    """Errors that say the Rag-API is unhealthy or overloaded, as opposed to a bad request"""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return False
+
+
+def _retry_after(error: Exception) -> float:
+    response = getattr(error, 'response', None)
+    try:
+        return float(response.headers.get('Retry-After', 0)) if response is not None else 0.0
+    except ValueError:
+        return 0.0
+
+
+class ResiliencePolicy:
+    """Circuit breakers per (endpoint, framework) plus one shared retry budget"""
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        max_attempts: int = 3,
+        base_delay: float = 0.1,
+        max_delay: float = 2.0,
+        retry_budget: Optional[RetryBudget] = None
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_budget = retry_budget or RetryBudget()
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> 'ResiliencePolicy':
+        return cls(
+            failure_threshold=settings.RAG_API_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.RAG_API_BREAKER_RESET_TIMEOUT,
+            half_open_max_calls=settings.RAG_API_BREAKER_HALF_OPEN_CALLS,
+            max_attempts=settings.RAG_API_MAX_ATTEMPTS,
+            base_delay=settings.RAG_API_RETRY_BASE_DELAY,
+            max_delay=settings.RAG_API_RETRY_MAX_DELAY,
+            retry_budget=RetryBudget(
+                ratio=settings.RAG_API_RETRY_BUDGET_RATIO,
+                min_per_second=settings.RAG_API_RETRY_MIN_PER_SECOND
+            )
+        )
+
+    def breaker(self, endpoint: str, framework: str) -> CircuitBreaker:
+        key = (endpoint, framework)
+        with self._lock:
+            if key not in self._breakers:
+                self._breakers[key] = CircuitBreaker(
+                    endpoint, framework,
+                    failure_threshold=self.failure_threshold,
+                    reset_timeout=self.reset_timeout,
+                    half_open_max_calls=self.half_open_max_calls
+                )
+            return self._breakers[key]
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform over [0, base * 2^attempt], capped"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, endpoint: str, framework: str, func: Callable[[], Any], report: Dict[str, Any]) -> Any:
+        """Run `func` behind the breaker, retrying idempotent failures while the budget allows.
+
+        `report` is filled in for the trace: attempts, breaker state and any
+        state transitions, including when the call raises.
+        """
+        breaker = self.breaker(endpoint, framework)
+        transitions = report.setdefault('transitions', [])
+        report['attempts'] = 0
+        self.retry_budget.record_request()
+
+        def note(transition):
+            if transition:
+                transitions.append({'from': transition[0], 'to': transition[1], 'at': time.time()})
+
+        last_error: Optional[Exception] = None
+        try:
+            for attempt in range(self.max_attempts):
+                try:
+                    note(breaker.before_call())
+                except CircuitOpenError:
+                    report['fast_failed'] = True
+                    # If our own failures opened the circuit, the real error is more useful
+                    if last_error is not None:
+                        raise last_error
+                    raise
+
+                report['attempts'] += 1
+                try:
+                    result = func()
+                except Exception as e:
+                    last_error = e
+                    # Any other error still means the Rag-API answered; this also settles a half-open probe
+                    note(breaker.on_failure() if is_failure(e) else breaker.on_success())
+                    if not is_retryable(e) or attempt + 1 >= self.max_attempts:
+                        raise
+                    if not self.retry_budget.try_withdraw():
+                        RETRY_ATTEMPTS.labels(endpoint=endpoint, framework=framework, outcome='budget_exhausted').inc()
+                        report['retry_budget_exhausted'] = True
+                        raise
+                    RETRY_ATTEMPTS.labels(endpoint=endpoint, framework=framework, outcome='attempted').inc()
+                    time.sleep(min(self.max_delay, max(self.backoff(attempt), _retry_after(e))))
+                    continue
+
+                note(breaker.on_success())
+                return result
+        finally:
+            report['breaker_state'] = breaker.state
+
+# Global resilience policy instance
+resilience_policy = ResiliencePolicy.from_settings()
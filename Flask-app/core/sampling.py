@@ -0,0 +1,200 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+from prometheus_client import Counter, Gauge
+import structlog
+from config.settings import settings
+
+logger = structlog.get_logger()
+
+# Prometheus Metrics
+TRACE_SAMPLING_DECISIONS = Counter(
+    'docker_agent_trace_sampling_decisions_total',
+    'Tail sampling decisions for finished traces',
+    ['decision', 'reason']      # keep: error, slow, expensive, sampled; drop: dropped, buffer_full
+)
+
+TRACE_SAMPLING_BUFFERED_SPANS = Gauge(
+    'docker_agent_trace_sampling_buffered_spans',
+    'Finished spans held until their trace is complete'
+)
+
+TRACE_SAMPLING_BUFFERED_TRACES = Gauge(
+    'docker_agent_trace_sampling_buffered_traces',
+    'Incomplete traces with spans in the sampling buffer'
+)
+
+TRACE_SAMPLING_BUFFER_BYTES = Gauge(
+    'docker_agent_trace_sampling_buffer_bytes',
+    'Approximate memory held by buffered spans'
+)
+
+KEEP_REASONS = ('error', 'slow', 'expensive', 'sampled')
+
+# Rough fixed cost of a finished span (context, timestamps, name, resource reference)
+SPAN_OVERHEAD_BYTES = 400
+
+
+def sample_fraction(trace_id: str) -> float:
+    """A stable value in [0, 1) per trace, so every process samples a trace the same way"""
+    digest = hashlib.sha256(trace_id.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+
+class TailSampler:
+    """Keep/drop decision for a trace, made once the trace has finished.
+
+    Failed traces and traces slower than `latency_threshold` are always
+    kept. Traces that used at least `expensive_tokens` tokens are kept at
+    `expensive_rate`, everything else at `base_rate`.
+    """
+
+    def __init__(
+        self,
+        base_rate: float = 0.1,
+        latency_threshold: float = 10.0,
+        expensive_tokens: int = 4000,
+        expensive_rate: float = 0.5
+    ):
+        self.base_rate = base_rate
+        self.latency_threshold = latency_threshold
+        self.expensive_tokens = expensive_tokens
+        self.expensive_rate = expensive_rate
+
+    @classmethod
+    def from_settings(cls) -> 'TailSampler':
+        return cls(
+            base_rate=settings.TRACE_SAMPLE_RATE,
+            latency_threshold=settings.TRACE_SAMPLE_SLOW_SECONDS,
+            expensive_tokens=settings.TRACE_SAMPLE_EXPENSIVE_TOKENS,
+            expensive_rate=settings.TRACE_SAMPLE_EXPENSIVE_RATE
+        )
+
+    def decide(self, trace_id: str, failed: bool, duration: float, tokens: int) -> Tuple[bool, str]:
+        """Return (keep, reason) and count the decision"""
+        if failed:
+            keep, reason = True, 'error'
+        elif duration >= self.latency_threshold:
+            keep, reason = True, 'slow'
+        elif tokens >= self.expensive_tokens and sample_fraction(trace_id) < self.expensive_rate:
+            keep, reason = True, 'expensive'
+        elif sample_fraction(trace_id) < self.base_rate:
+            keep, reason = True, 'sampled'
+        else:
+            keep, reason = False, 'dropped'
+        TRACE_SAMPLING_DECISIONS.labels(decision='keep' if keep else 'drop', reason=reason).inc()
+        return keep, reason
+
+    def weight(self, reason: Optional[str]) -> float:
+        """How many finished traces one kept with `reason` stands for (1 / its keep rate)"""
+        rate = {'sampled': self.base_rate, 'expensive': self.expensive_rate}.get(reason, 1.0)
+        return 1.0 / rate if rate > 0 else 1.0
+
+
+class TailSamplingSpanProcessor:
+    """OpenTelemetry span processor that holds a trace's spans until its local root span ends.
+
+    The root's `sampling.reason` attribute (set by TracingManager from the
+    same TailSampler) decides whether the buffered spans go on to
+    `delegate`, normally a BatchSpanProcessor; roots without it are decided
+    here from their status, duration and agent.tokens_used. Spans that end
+    after their root follow the remembered decision. When more than
+    `max_buffered_spans` are held, the oldest incomplete trace is dropped.
+    """
+
+    def __init__(self, delegate: Any, sampler: TailSampler, max_buffered_spans: int = 20000, max_decisions: int = 10000):
+        self.delegate = delegate
+        self.sampler = sampler
+        self.max_buffered_spans = max_buffered_spans
+        self.max_decisions = max_decisions
+        self._pending: 'OrderedDict[int, List[Any]]' = OrderedDict()
+        self._decisions: 'OrderedDict[int, bool]' = OrderedDict()
+        self._buffered_spans = 0
+        self._buffered_bytes = 0
+        self._lock = threading.Lock()
+
+    def on_start(self, span: Any, parent_context: Optional[Any] = None):
+        self.delegate.on_start(span, parent_context=parent_context)
+
+    def _on_ending(self, span: Any):
+        # Called by newer SDKs while the span is still mutable; nothing to do until it has ended
+        pass
+
+    def on_end(self, span: Any):
+        trace_key = span.context.trace_id
+        is_root = span.parent is None or span.parent.is_remote
+        with self._lock:
+            if trace_key in self._decisions:
+                kept = [span] if self._decisions[trace_key] else []
+            elif is_root:
+                spans = self._take(trace_key) + [span]
+                keep = self._decide(span)
+                self._remember(trace_key, keep)
+                kept = spans if keep else []
+            else:
+                self._buffer(trace_key, span)
+                kept = []
+            self._update_gauges()
+        for finished in kept:
+            self.delegate.on_end(finished)
+
+    def shutdown(self):
+        self.delegate.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.delegate.force_flush(timeout_millis)
+
+    def _decide(self, span: Any) -> bool:
+        reason = (span.attributes or {}).get('sampling.reason')
+        if reason is not None:
+            return reason in KEEP_REASONS
+        from opentelemetry.trace import StatusCode
+
+        keep, _ = self.sampler.decide(
+            format(span.context.trace_id, '032x'),
+            failed=span.status.status_code == StatusCode.ERROR,
+            duration=(span.end_time - span.start_time) / 1e9,
+            tokens=int((span.attributes or {}).get('agent.tokens_used', 0))
+        )
+        return keep
+
+    def _buffer(self, trace_key: int, span: Any):
+        # Caller holds self._lock
+        self._pending.setdefault(trace_key, []).append(span)
+        self._buffered_spans += 1
+        self._buffered_bytes += _span_size(span)
+        while self._buffered_spans > self.max_buffered_spans and self._pending:
+            oldest, spans = self._pending.popitem(last=False)
+            self._release(spans)
+            self._remember(oldest, False)
+            TRACE_SAMPLING_DECISIONS.labels(decision='drop', reason='buffer_full').inc()
+            logger.warning("Sampling buffer full; dropped an incomplete trace", spans=len(spans))
+
+    def _take(self, trace_key: int) -> List[Any]:
+        # Caller holds self._lock
+        spans = self._pending.pop(trace_key, [])
+        self._release(spans)
+        return spans
+
+    def _release(self, spans: List[Any]):
+        self._buffered_spans -= len(spans)
+        self._buffered_bytes -= sum(_span_size(span) for span in spans)
+
+    def _remember(self, trace_key: int, keep: bool):
+        self._decisions[trace_key] = keep
+        while len(self._decisions) > self.max_decisions:
+            self._decisions.popitem(last=False)
+
+    def _update_gauges(self):
+        TRACE_SAMPLING_BUFFERED_SPANS.set(self._buffered_spans)
+        TRACE_SAMPLING_BUFFERED_TRACES.set(len(self._pending))
+        TRACE_SAMPLING_BUFFER_BYTES.set(self._buffered_bytes)
+
+
+def _span_size(span: Any) -> int:
+    attributes = span.attributes or {}
+    return SPAN_OVERHEAD_BYTES + len(span.name) + sum(len(str(k)) + len(str(v)) for k, v in attributes.items())
+
+# Global tail sampler instance
+tail_sampler = TailSampler.from_settings() if settings.TRACE_SAMPLING_ENABLED else None
@@ -0,0 +1,70 @@
+from typing import Any, Dict, Optional
+from opentelemetry import propagate, trace
+import structlog
+from config.settings import settings
+from core.sampling import TailSampler, TailSamplingSpanProcessor, tail_sampler
+
+logger = structlog.get_logger()
+
+
+def init_tracer_provider(
+    service_name: str,
+    endpoint: str,
+    max_queue_size: int = 2048,
+    max_export_batch_size: int = 512,
+    schedule_delay_ms: int = 1000,
+    export_timeout_ms: int = 10000,
+    sampler: Optional[TailSampler] = None,
+    max_buffered_spans: int = 20000
+) -> Optional[Any]:
+    """Install a global TracerProvider that exports spans over OTLP/HTTP.
+
+    Spans are handed to a BatchSpanProcessor: a full queue drops spans
+    instead of blocking the request that ended them, and export runs on the
+    processor's own thread. With a `sampler`, each trace's spans are held
+    until the trace completes and only sampled traces reach the batch
+    processor. Returns None (spans become no-ops) when the SDK
+    or exporter is not installed.
+    """
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    except ImportError:
+        logger.warning("OpenTelemetry SDK or OTLP exporter not installed; spans are not exported")
+        return None
+
+    provider = TracerProvider(resource=Resource.create({'service.name': service_name}))
+    processor = BatchSpanProcessor(
+        OTLPSpanExporter(endpoint=f"{endpoint.rstrip('/')}/v1/traces"),
+        max_queue_size=max_queue_size,
+        max_export_batch_size=max_export_batch_size,
+        schedule_delay_millis=schedule_delay_ms,
+        export_timeout_millis=export_timeout_ms
+    )
+    if sampler is not None:
+        processor = TailSamplingSpanProcessor(processor, sampler, max_buffered_spans)
+    provider.add_span_processor(processor)
+    trace.set_tracer_provider(provider)
+    logger.info("OpenTelemetry tracing initialized", endpoint=endpoint, service_name=service_name)
+    return provider
+
+
+def trace_headers() -> Dict[str, str]:
+    """W3C traceparent/tracestate headers for the current span, for outgoing HTTP calls"""
+    headers: Dict[str, str] = {}
+    propagate.inject(headers)
+    return headers
+
+# Global tracer provider and tracer instances
+tracer_provider = init_tracer_provider(
+    settings.OTEL_SERVICE_NAME,
+    settings.OTEL_EXPORTER_OTLP_ENDPOINT,
+    max_queue_size=settings.OTEL_BSP_MAX_QUEUE_SIZE,
+    max_export_batch_size=settings.OTEL_BSP_MAX_EXPORT_BATCH_SIZE,
+    schedule_delay_ms=settings.OTEL_BSP_SCHEDULE_DELAY_MS,
+    sampler=tail_sampler,
+    max_buffered_spans=settings.TRACE_SAMPLING_MAX_BUFFERED_SPANS
+) if settings.OTEL_ENABLED else None
+tracer = trace.get_tracer('docker_agent')
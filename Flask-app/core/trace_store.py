@@ -0,0 +1,312 @@
+import base64
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Optional, Tuple
+import structlog
+from config.settings import settings
+
+logger = structlog.get_logger()
+
+MAX_PAGE_SIZE = 200
+
+# Seconds between retention sweeps; sweeps run on the write path
+PRUNE_INTERVAL_SECONDS = 600.0
+
+# Columns that can be filtered on; each has an index led by the column
+FILTER_COLUMNS = ('status', 'framework', 'model')
+
+
+class TraceStore(ABC):
+    """Durable trace storage shared by every Flask worker.
+
+    Implementations store the dicts produced by TraceRecord.to_dict() and
+    list them newest first with keyset (cursor) pagination, so a page costs
+    the same however many traces are stored.
+    """
+
+    @abstractmethod
+    def save(self, trace: Dict[str, Any]):
+        """Insert or replace a finished trace"""
+        pass
+
+    @abstractmethod
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        """Return the trace with its steps, or None"""
+        pass
+
+    @abstractmethod
+    def list(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        filters: Optional[Dict[str, str]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Return (traces without their steps, cursor for the next page or None)"""
+        pass
+
+    @abstractmethod
+    def scan(
+        self,
+        since: str,
+        until: str,
+        filters: Optional[Dict[str, str]] = None,
+        limit: int = 5000
+    ) -> List[Dict[str, Any]]:
+        """Finished traces with their steps that started in [since, until), newest first"""
+        pass
+
+
+def encode_cursor(timestamp: str, trace_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{timestamp}|{trace_id}".encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        timestamp, trace_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|', 1)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return timestamp, trace_id
+
+
+class SQLiteTraceStore(TraceStore):
+    """Traces in SQLite (WAL mode), one row per trace with zlib-compressed steps.
+
+    WAL lets the web pages read while request threads write. Each thread
+    keeps its own connection; ':memory:' gives a process-local store.
+    Traces older than `retention_days` are deleted by save(), at most once
+    per PRUNE_INTERVAL_SECONDS; 0 keeps them forever.
+    """
+
+    def __init__(self, db_path: str = "traces.db", retention_days: float = 7):
+        self.retention_days = retention_days
+        self._last_prune = float('-inf')
+        self._prune_lock = threading.Lock()
+        if db_path == ':memory:':
+            # A named shared-cache database so every thread's connection sees the same data
+            self.db_path, self.uri = f"file:traces-{id(self)}?mode=memory&cache=shared", True
+        else:
+            self.db_path, self.uri = db_path, False
+        self._local = threading.local()
+        # A memory database lives only while a connection to it is open
+        self._keepalive = self._connect() if self.uri else None
+        self._init_database()
+
+    @classmethod
+    def from_settings(cls) -> 'SQLiteTraceStore':
+        return cls(settings.TRACE_STORE_PATH, settings.TRACE_STORE_RETENTION_DAYS)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, uri=self.uri, check_same_thread=False, timeout=5.0)
+        conn.row_factory = sqlite3.Row
+        if not self.uri:
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _init_database(self):
+        with self.conn as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS traces (
+                    trace_id TEXT PRIMARY KEY,
+                    session_id TEXT,
+                    timestamp TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    framework TEXT,
+                    model TEXT,
+                    vector_store TEXT,
+                    request_data TEXT NOT NULL,
+                    end_time TEXT,
+                    total_duration REAL,
+                    tokens_used INTEGER NOT NULL DEFAULT 0,
+                    api_calls INTEGER NOT NULL DEFAULT 0,
+                    start_time REAL,
+                    error TEXT,
+                    step_count INTEGER NOT NULL DEFAULT 0,
+                    steps BLOB,
+                    sampling_reason TEXT
+                )
+            """)
+            # Listing is ordered by (timestamp, trace_id), optionally under one equality filter
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_traces_timestamp ON traces(timestamp, trace_id)")
+            for column in FILTER_COLUMNS:
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_traces_{column} ON traces({column}, timestamp, trace_id)"
+                )
+
+    def save(self, trace: Dict[str, Any]):
+        request_data = trace.get('request_data') or {}
+        metrics = trace.get('metrics') or {}
+        steps = trace.get('steps') or []
+        with self.conn as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO traces (
+                    trace_id, session_id, timestamp, status, framework, model, vector_store,
+                    request_data, end_time, total_duration, tokens_used, api_calls, start_time,
+                    error, step_count, steps, sampling_reason
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    trace['trace_id'],
+                    trace.get('session_id'),
+                    trace['timestamp'],
+                    trace['status'],
+                    request_data.get('framework'),
+                    request_data.get('llm_model') or request_data.get('model'),
+                    request_data.get('vector_store'),
+                    json.dumps(request_data, default=str),
+                    trace.get('end_time'),
+                    trace.get('total_duration'),
+                    metrics.get('tokens_used', 0),
+                    metrics.get('api_calls', 0),
+                    metrics.get('start_time'),
+                    trace.get('error'),
+                    len(steps),
+                    zlib.compress(json.dumps(steps, default=str).encode('utf-8')),
+                    trace.get('sampling_reason')
+                )
+            )
+        self._maybe_prune()
+
+    def cleanup_old_traces(self, days: float) -> int:
+        """Delete traces that started more than `days` ago"""
+        cutoff = (datetime.utcnow() - timedelta(days=days)).isoformat()
+        with self.conn as conn:
+            deleted_count = conn.execute("DELETE FROM traces WHERE timestamp < ?", (cutoff,)).rowcount
+        if deleted_count:
+            logger.info("Cleaned up old traces", deleted=deleted_count, retention_days=days)
+        return deleted_count
+
+    def _maybe_prune(self):
+        if self.retention_days <= 0:
+            return
+        now = time.monotonic()
+        with self._prune_lock:
+            if now - self._last_prune < PRUNE_INTERVAL_SECONDS:
+                return
+            self._last_prune = now
+        try:
+            self.cleanup_old_traces(self.retention_days)
+        except sqlite3.Error as e:
+            logger.error("Failed to clean up old traces", error=str(e))
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute("SELECT * FROM traces WHERE trace_id = ?", (trace_id,)).fetchone()
+        if row is None:
+            return None
+        trace = self._row_to_trace(row)
+        trace['steps'] = json.loads(zlib.decompress(row['steps'])) if row['steps'] else []
+        return trace
+
+    def list(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        filters: Optional[Dict[str, str]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        clauses, params = self._filter_clauses(filters)
+        if cursor:
+            timestamp, trace_id = decode_cursor(cursor)
+            clauses.append("(timestamp < ? OR (timestamp = ? AND trace_id < ?))")
+            params.extend([timestamp, timestamp, trace_id])
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        # Steps are left out of list pages; fetch one extra row to know whether another page exists
+        rows = self.conn.execute(
+            f"""
+            SELECT trace_id, session_id, timestamp, status, request_data, end_time, total_duration,
+                   tokens_used, api_calls, start_time, error, step_count, sampling_reason
+            FROM traces {where}
+            ORDER BY timestamp DESC, trace_id DESC
+            LIMIT ?
+            """,
+            (*params, limit + 1)
+        ).fetchall()
+
+        traces = [self._row_to_trace(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = traces[-1]
+            next_cursor = encode_cursor(last['timestamp'], last['trace_id'])
+        return traces, next_cursor
+
+    def scan(
+        self,
+        since: str,
+        until: str,
+        filters: Optional[Dict[str, str]] = None,
+        limit: int = 5000
+    ) -> List[Dict[str, Any]]:
+        clauses, params = self._filter_clauses(filters)
+        clauses.extend(["timestamp >= ?", "timestamp < ?", "end_time IS NOT NULL"])
+        params.extend([since, until])
+        rows = self.conn.execute(
+            f"SELECT * FROM traces WHERE {' AND '.join(clauses)} ORDER BY timestamp DESC LIMIT ?",
+            (*params, limit)
+        ).fetchall()
+        traces = []
+        for row in rows:
+            trace = self._row_to_trace(row)
+            trace['steps'] = json.loads(zlib.decompress(row['steps'])) if row['steps'] else []
+            traces.append(trace)
+        return traces
+
+    @staticmethod
+    def _filter_clauses(filters: Optional[Dict[str, str]]) -> Tuple[List[str], List[Any]]:
+        clauses, params = [], []
+        for column, value in (filters or {}).items():
+            if column not in FILTER_COLUMNS:
+                raise ValueError(f"Cannot filter traces by '{column}'")
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        return clauses, params
+
+    @staticmethod
+    def _row_to_trace(row: sqlite3.Row) -> Dict[str, Any]:
+        trace = {
+            'trace_id': row['trace_id'],
+            'session_id': row['session_id'],
+            'timestamp': row['timestamp'],
+            'request_data': json.loads(row['request_data']),
+            'status': row['status'],
+            'step_count': row['step_count'],
+            'metrics': {
+                'start_time': row['start_time'],
+                'tokens_used': row['tokens_used'],
+                'api_calls': row['api_calls']
+            }
+        }
+        if row['end_time'] is not None:
+            trace['end_time'] = row['end_time']
+            trace['total_duration'] = row['total_duration']
+        if row['error']:
+            trace['error'] = row['error']
+        if row['sampling_reason']:
+            trace['sampling_reason'] = row['sampling_reason']
+        return trace
+
+
+def create_trace_store(backend: str) -> Optional[TraceStore]:
+    """Build the store named by TRACE_STORE; 'none' keeps traces in memory only"""
+    if backend == 'sqlite':
+        return SQLiteTraceStore.from_settings()
+    if backend == 'none':
+        return None
+    raise ValueError(f"Unknown trace store '{backend}'")
+
+# Global trace store instance
+trace_store = create_trace_store(settings.TRACE_STORE)
@@ -1,31 +1,26 @@
 import os
 import time
 import uuid
-from typing import Dict, Any, Optional
+import bisect
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 import structlog
 from langtrace_python_sdk import langtrace
 from prometheus_client import Counter, Histogram, Gauge, start_http_server
+from opentelemetry import trace as otel_trace
+from opentelemetry.trace import Status, StatusCode
 import json
+from config.settings import settings
+from core.logging_pipeline import configure_logging, log_pipeline
+from core.sampling import TailSampler, tail_sampler
+from core.telemetry import tracer, tracer_provider
+from core.trace_store import TraceStore, FILTER_COLUMNS, MAX_PAGE_SIZE, encode_cursor, decode_cursor, trace_store
 
 # Configure structured logging
-structlog.configure(
-    processors=[
-        structlog.stdlib.filter_by_level,
-        structlog.stdlib.add_logger_name,
-        structlog.stdlib.add_log_level,
-        structlog.stdlib.PositionalArgumentsFormatter(),
-        structlog.processors.TimeStamper(fmt="iso"),
-        structlog.processors.StackInfoRenderer(),
-        structlog.processors.format_exc_info,
-        structlog.processors.UnicodeDecoder(),
-        structlog.processors.JSONRenderer()
-    ],
-    context_class=dict,
-    logger_factory=structlog.stdlib.LoggerFactory(),
-    wrapper_class=structlog.stdlib.BoundLogger,
-    cache_logger_on_first_use=True,
-)
+configure_logging(log_pipeline)
 
 logger = structlog.get_logger()
 
@@ -59,10 +54,310 @@ LLM_TOKEN_USAGE = Counter(
     ['framework', 'model', 'token_type']
 )
 
+TRACES_EVICTED = Counter(
+    'docker_agent_traces_evicted_total',
+    'Traces dropped from the in-memory buffer to make room for new ones',
+    ['status']
+)
+
+TRACE_BUFFER_SIZE = Gauge(
+    'docker_agent_trace_buffer_size',
+    'Traces currently held in the in-memory buffer'
+)
+
+
+def span_attributes(data: Dict[str, Any], prefix: str = '') -> Dict[str, Any]:
+    """The scalar values of a step/request dict, as OpenTelemetry span attributes"""
+    return {
+        f"{prefix}{key}": value
+        for key, value in data.items()
+        if isinstance(value, (str, bool, int, float))
+    }
+
+
+class TraceStep:
+    """One step of a trace"""
+    __slots__ = ('step_name', 'timestamp', 'data', 'duration')
+
+    def __init__(self, step_name: str, timestamp: str, data: Dict[str, Any], duration: float):
+        self.step_name = step_name
+        self.timestamp = timestamp
+        self.data = data
+        self.duration = duration
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'step_name': self.step_name,
+            'timestamp': self.timestamp,
+            'data': self.data,
+            'duration': self.duration
+        }
+
+
+class TraceRecord:
+    """One request's trace; to_dict() gives the JSON/template shape"""
+    __slots__ = (
+        'trace_id', 'session_id', 'timestamp', 'request_data', 'status', 'steps',
+        'start_time', 'tokens_used', 'api_calls', 'end_time', 'total_duration', 'error', 'span',
+        'sampling_reason'
+    )
+
+    def __init__(self, trace_id: str, session_id: str, request_data: Dict[str, Any], span: Any = None):
+        self.trace_id = trace_id
+        self.session_id = session_id
+        self.timestamp = datetime.utcnow().isoformat()
+        self.request_data = request_data
+        self.status = 'started'
+        self.steps: List[TraceStep] = []
+        self.start_time = time.time()
+        self.tokens_used = 0
+        self.api_calls = 0
+        self.end_time: Optional[str] = None
+        self.total_duration: Optional[float] = None
+        self.error: Optional[str] = None
+        # Root OpenTelemetry span; ended by end_trace
+        self.span = span
+        # Tail sampling decision, made by end_trace
+        self.sampling_reason: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        trace = {
+            'trace_id': self.trace_id,
+            'session_id': self.session_id,
+            'timestamp': self.timestamp,
+            'request_data': self.request_data,
+            'status': self.status,
+            'steps': [step.to_dict() for step in self.steps],
+            'metrics': {
+                'start_time': self.start_time,
+                'tokens_used': self.tokens_used,
+                'api_calls': self.api_calls
+            }
+        }
+        if self.end_time is not None:
+            trace['end_time'] = self.end_time
+            trace['total_duration'] = self.total_duration
+        if self.error:
+            trace['error'] = self.error
+        if self.sampling_reason:
+            trace['sampling_reason'] = self.sampling_reason
+        return trace
+
+
+# Upper bounds (seconds) of the summary's duration histogram; the last bucket is open-ended
+SUMMARY_DURATION_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60)
+
+# Sliding windows kept by the summary: name -> (bucket width in seconds, bucket count)
+SUMMARY_WINDOWS = {'5m': (5, 60), '1h': (60, 60)}
+
+
+class TraceWindow:
+    """Trace totals over a sliding time window, kept in a ring of fixed-width time buckets"""
+
+    FIELDS = ('total_requests', 'completed_requests', 'failed_requests', 'duration_sum', 'tokens_used')
+
+    def __init__(self, bucket_seconds: int, bucket_count: int):
+        self.bucket_seconds = bucket_seconds
+        self.bucket_count = bucket_count
+        self.epochs = [-1] * bucket_count
+        self.buckets = [dict.fromkeys(self.FIELDS, 0) for _ in range(bucket_count)]
+
+    def add(self, now: float, **values):
+        epoch = int(now // self.bucket_seconds)
+        slot = epoch % self.bucket_count
+        bucket = self.buckets[slot]
+        if self.epochs[slot] != epoch:
+            # The slot still holds a bucket from a previous lap of the ring
+            self.epochs[slot] = epoch
+            for name in self.FIELDS:
+                bucket[name] = 0
+        for name, value in values.items():
+            bucket[name] += value
+
+    def totals(self, now: float) -> Dict[str, float]:
+        oldest = int(now // self.bucket_seconds) - self.bucket_count
+        totals = dict.fromkeys(self.FIELDS, 0)
+        for epoch, bucket in zip(self.epochs, self.buckets):
+            if epoch > oldest:
+                for name in self.FIELDS:
+                    totals[name] += bucket[name]
+        return totals
+
+
+class TraceSummary:
+    """Running trace aggregates, updated as traces start and end.
+
+    Reading the summary costs the same however many traces have been
+    recorded; totals cover the whole process lifetime, not just the traces
+    still held in the buffer.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.total_requests = 0
+        self.active_requests = 0
+        self.status_counts: Dict[str, int] = {}
+        self.duration_sum = 0.0
+        self.duration_counts = [0] * (len(SUMMARY_DURATION_BUCKETS) + 1)
+        self.tokens_used = 0
+        self.windows = {name: TraceWindow(*shape) for name, shape in SUMMARY_WINDOWS.items()}
+
+    def trace_started(self):
+        now = time.time()
+        with self.lock:
+            self.total_requests += 1
+            self.active_requests += 1
+            for window in self.windows.values():
+                window.add(now, total_requests=1)
+
+    def tokens_added(self, tokens: int):
+        now = time.time()
+        with self.lock:
+            self.tokens_used += tokens
+            for window in self.windows.values():
+                window.add(now, tokens_used=tokens)
+
+    def trace_ended(self, status: str, duration: float):
+        now = time.time()
+        with self.lock:
+            self.active_requests -= 1
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            window_values = {}
+            if status == 'completed':
+                self.duration_sum += duration
+                self.duration_counts[bisect.bisect_left(SUMMARY_DURATION_BUCKETS, duration)] += 1
+                window_values = {'completed_requests': 1, 'duration_sum': duration}
+            elif status == 'failed':
+                window_values = {'failed_requests': 1}
+            for window in self.windows.values():
+                window.add(now, **window_values)
+
+    def trace_dropped(self):
+        """An in-flight trace was evicted and will never end"""
+        with self.lock:
+            self.active_requests -= 1
+
+    def snapshot(self, window: Optional[str] = None) -> Dict[str, Any]:
+        with self.lock:
+            if window is not None:
+                totals = self.windows[window].totals(time.time())
+                return self._rates(totals, window=window)
+            totals = {
+                'total_requests': self.total_requests,
+                'completed_requests': self.status_counts.get('completed', 0),
+                'failed_requests': self.status_counts.get('failed', 0),
+                'duration_sum': self.duration_sum,
+                'tokens_used': self.tokens_used
+            }
+            summary = self._rates(totals, active_requests=self.active_requests)
+            bounds = [str(bound) for bound in SUMMARY_DURATION_BUCKETS] + ['+Inf']
+            summary['duration_histogram'] = dict(zip(bounds, self.duration_counts))
+            summary['windows'] = {
+                name: self._rates(ring.totals(time.time()))
+                for name, ring in self.windows.items()
+            }
+            return summary
+
+    @staticmethod
+    def _rates(totals: Dict[str, float], **extra) -> Dict[str, Any]:
+        total = totals['total_requests']
+        completed = totals['completed_requests']
+        return {
+            'total_requests': total,
+            'completed_requests': completed,
+            'failed_requests': totals['failed_requests'],
+            'success_rate': (completed / total * 100) if total > 0 else 0,
+            'average_duration': totals['duration_sum'] / completed if completed > 0 else 0,
+            'total_tokens_used': totals['tokens_used'],
+            **extra
+        }
+
+
+# Rag-API stage -> waterfall category
+SERVER_STAGE_KINDS = {
+    'embedding': 'retrieval',
+    'vector_search': 'retrieval',
+    'vector_store_load': 'retrieval',
+    'llm': 'llm',
+    'tool': 'tool'
+}
+
+
+def build_waterfall(trace: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """One timeline across both services for a trace dict, or None without Rag-API timings.
+
+    Rag-API stage offsets are relative to its own request start, so they
+    are placed after half of the network time (the two clocks are not
+    compared). Network is the adapter call minus Rag-API's total.
+    """
+    step = next((s for s in trace.get('steps') or [] if s['step_name'] == 'query_execution'), None)
+    if step is None or not step['data'].get('call_started_at') or not trace.get('total_duration'):
+        return None
+    data = step['data']
+    total_ms = trace['total_duration'] * 1000
+    call_start = max(0.0, (data['call_started_at'] - trace['metrics']['start_time']) * 1000)
+    call_ms = (data.get('duration') or 0) * 1000
+    server_ms = min((data.get('server_timings') or {}).get('total_ms') or 0, call_ms)
+    network_ms = call_ms - server_ms
+    server_start = call_start + network_ms / 2
+
+    rows = [
+        {'label': 'Flask: before Rag-API call', 'kind': 'flask', 'start_ms': 0.0, 'duration_ms': call_start},
+        {'label': 'Rag-API call', 'kind': 'adapter', 'start_ms': call_start, 'duration_ms': call_ms},
+        {'label': 'Network (request)', 'kind': 'network', 'start_ms': call_start, 'duration_ms': network_ms / 2}
+    ]
+    breakdown = {'flask': 0.0, 'network': network_ms, 'retrieval': 0.0, 'llm': 0.0, 'tool': 0.0, 'other': 0.0}
+    for stage in data.get('server_stages') or []:
+        kind = SERVER_STAGE_KINDS.get(stage['stage'], 'other')
+        breakdown[kind] += stage['duration_ms']
+        rows.append({
+            'label': f"Rag-API {stage['stage']}: {stage['name']}",
+            'kind': kind,
+            'stage': stage['stage'],
+            'name': stage['name'],
+            'start_ms': server_start + stage['start_ms'],
+            'duration_ms': stage['duration_ms']
+        })
+    rows.append({
+        'label': 'Network (response)', 'kind': 'network',
+        'start_ms': server_start + server_ms, 'duration_ms': network_ms / 2
+    })
+    after_start = call_start + call_ms
+    rows.append({
+        'label': 'Flask: after Rag-API call', 'kind': 'flask',
+        'start_ms': after_start, 'duration_ms': max(0.0, total_ms - after_start)
+    })
+    breakdown['flask'] = call_start + max(0.0, total_ms - after_start)
+
+    scale = max(total_ms, max(row['start_ms'] + row['duration_ms'] for row in rows)) or 1.0
+    for row in rows:
+        row['offset_pct'] = round(row['start_ms'] / scale * 100, 2)
+        row['width_pct'] = round(max(row['duration_ms'] / scale * 100, 0.2), 2)
+    return {
+        'total_ms': total_ms,
+        'rows': rows,
+        'breakdown_ms': {kind: round(ms, 2) for kind, ms in breakdown.items()}
+    }
+
+
 class TracingManager:
-    def __init__(self, langtrace_api_key: Optional[str] = None):
+    def __init__(
+        self,
+        langtrace_api_key: Optional[str] = None,
+        capacity: int = 10000,
+        store: Optional[TraceStore] = None,
+        sampler: Optional[TailSampler] = None
+    ):
         self.session_id = str(uuid.uuid4())
-        self.traces = []
+        # Ring buffer indexed by trace_id: O(1) lookup, oldest trace evicted once full
+        self.capacity = capacity
+        self.traces: 'OrderedDict[str, TraceRecord]' = OrderedDict()
+        self.lock = threading.Lock()
+        self.summary = TraceSummary()
+        # Durable copy shared across workers; None keeps traces in the buffer only
+        self.store = store
+        # Decides which finished traces are persisted and exported; None keeps all of them
+        self.sampler = sampler
         
         # Initialize LangTrace if API key is provided
         if langtrace_api_key:
@@ -81,23 +376,23 @@ class TracingManager:
     
     def start_trace(self, request_data: Dict[str, Any]) -> str:
         """Start a new trace for a request"""
-        trace_id = str(uuid.uuid4())
+        span = tracer.start_span('agent.query', attributes=span_attributes({
+            'framework': request_data.get('framework'),
+            'model': request_data.get('llm_model') or request_data.get('model'),
+            'vector_store': request_data.get('vector_store'),
+            'query_length': len(request_data.get('query') or '')
+        }, 'agent.'))
+        context = span.get_span_context()
+        # When spans are exported the trace_id is the OpenTelemetry trace id, so the same id finds the trace in the backend
+        trace_id = format(context.trace_id, '032x') if context.is_valid else str(uuid.uuid4())
+        trace = TraceRecord(trace_id, self.session_id, request_data, span)
         
-        trace = {
-            'trace_id': trace_id,
-            'session_id': self.session_id,
-            'timestamp': datetime.utcnow().isoformat(),
-            'request_data': request_data,
-            'status': 'started',
-            'steps': [],
-            'metrics': {
-                'start_time': time.time(),
-                'tokens_used': 0,
-                'api_calls': 0
-            }
-        }
-        
-        self.traces.append(trace)
+        with self.lock:
+            self.traces[trace_id] = trace
+            while len(self.traces) > self.capacity:
+                self._evict_oldest()
+            TRACE_BUFFER_SIZE.set(len(self.traces))
+        self.summary.trace_started()
         ACTIVE_REQUESTS.inc()
         
         logger.info(
@@ -114,25 +409,37 @@ class TracingManager:
         """Add a step to an existing trace"""
         trace = self._find_trace(trace_id)
         if trace:
-            step = {
-                'step_name': step_name,
-                'timestamp': datetime.utcnow().isoformat(),
-                'data': step_data,
-                'duration': step_data.get('duration', 0)
-            }
-            trace['steps'].append(step)
+            step = TraceStep(
+                step_name,
+                datetime.utcnow().isoformat(),
+                step_data,
+                step_data.get('duration', 0)
+            )
+            trace.steps.append(step)
+            
+            if trace.span is not None:
+                # Steps are reported once finished, so the span is back-dated by the step's duration
+                end_ns = time.time_ns()
+                step_span = tracer.start_span(
+                    step_name,
+                    context=otel_trace.set_span_in_context(trace.span),
+                    start_time=end_ns - int((step.duration or 0) * 1e9),
+                    attributes=span_attributes(step_data)
+                )
+                step_span.end(end_time=end_ns)
             
             # Update metrics
             if 'tokens' in step_data:
-                trace['metrics']['tokens_used'] += step_data['tokens']
+                trace.tokens_used += step_data['tokens']
+                self.summary.tokens_added(step_data['tokens'])
                 LLM_TOKEN_USAGE.labels(
-                    framework=trace['request_data'].get('framework', 'unknown'),
-                    model=trace['request_data'].get('model', 'unknown'),
+                    framework=trace.request_data.get('framework', 'unknown'),
+                    model=trace.request_data.get('model', 'unknown'),
                     token_type='total'
                 ).inc(step_data['tokens'])
             
             if step_name in ['llm_call', 'vector_search', 'tool_execution']:
-                trace['metrics']['api_calls'] += 1
+                trace.api_calls += 1
             
             logger.info(
                 "Step added to trace",
@@ -143,105 +450,247 @@ class TracingManager:
     
     def end_trace(self, trace_id: str, status: str = 'completed', error: Optional[str] = None):
         """End a trace and record metrics"""
-        trace = self._find_trace(trace_id)
+        with self.lock:
+            # Claim the trace so a concurrent eviction does not settle it too
+            trace = self._find_trace(trace_id)
+            if trace is not None and trace.status != 'started':
+                trace = None
+            if trace is not None:
+                trace.status = status
         if trace:
             end_time = time.time()
-            duration = end_time - trace['metrics']['start_time']
+            duration = end_time - trace.start_time
             
-            trace['status'] = status
-            trace['end_time'] = datetime.utcnow().isoformat()
-            trace['total_duration'] = duration
+            trace.end_time = datetime.utcnow().isoformat()
+            trace.total_duration = duration
             
             if error:
-                trace['error'] = error
+                trace.error = error
                 ERROR_COUNT.labels(
-                    framework=trace['request_data'].get('framework', 'unknown'),
-                    model=trace['request_data'].get('model', 'unknown'),
+                    framework=trace.request_data.get('framework', 'unknown'),
+                    model=trace.request_data.get('model', 'unknown'),
                     error_type=type(error).__name__ if isinstance(error, Exception) else 'unknown'
                 ).inc()
             
             # Record metrics
             REQUEST_COUNT.labels(
-                framework=trace['request_data'].get('framework', 'unknown'),
-                model=trace['request_data'].get('model', 'unknown'),
-                vector_store=trace['request_data'].get('vector_store', 'unknown'),
+                framework=trace.request_data.get('framework', 'unknown'),
+                model=trace.request_data.get('model', 'unknown'),
+                vector_store=trace.request_data.get('vector_store', 'unknown'),
                 status=status
             ).inc()
             
             REQUEST_DURATION.labels(
-                framework=trace['request_data'].get('framework', 'unknown'),
-                model=trace['request_data'].get('model', 'unknown'),
-                vector_store=trace['request_data'].get('vector_store', 'unknown')
+                framework=trace.request_data.get('framework', 'unknown'),
+                model=trace.request_data.get('model', 'unknown'),
+                vector_store=trace.request_data.get('vector_store', 'unknown')
             ).observe(duration)
             
             ACTIVE_REQUESTS.dec()
+            self.summary.trace_ended(status, duration)
+            
+            # Metrics and the summary above count every trace; only sampled ones are stored and exported
+            keep = True
+            if self.sampler is not None:
+                keep, trace.sampling_reason = self.sampler.decide(
+                    trace_id, status == 'failed', duration, trace.tokens_used
+                )
+            self._end_span(trace)
+            if keep:
+                self._persist(trace)
             
             logger.info(
                 "Trace completed",
                 trace_id=trace_id,
                 status=status,
                 duration=duration,
-                tokens_used=trace['metrics']['tokens_used'],
-                api_calls=trace['metrics']['api_calls']
+                tokens_used=trace.tokens_used,
+                api_calls=trace.api_calls,
+                sampling=trace.sampling_reason
             )
     
+    def start_span(self, trace_id: str, name: str, attributes: Optional[Dict[str, Any]] = None) -> Any:
+        """Start a child span of the trace's root span; the caller ends it.
+
+        Unlike span(), the span is not made current, so it can stay open
+        across the yields of a streaming response.
+        """
+        trace = self._find_trace(trace_id)
+        context = otel_trace.set_span_in_context(trace.span) if trace and trace.span is not None else None
+        return tracer.start_span(name, context=context, attributes=span_attributes(attributes or {}))
+    
+    @contextmanager
+    def span(self, trace_id: str, name: str, attributes: Optional[Dict[str, Any]] = None):
+        """Run a block inside a child span of the trace's root span, made current for its duration"""
+        span = self.start_span(trace_id, name, attributes)
+        with otel_trace.use_span(span, end_on_exit=True):
+            yield span
+    
     def get_trace(self, trace_id: str) -> Optional[Dict[str, Any]]:
-        """Get a specific trace by ID"""
-        return self._find_trace(trace_id)
+        """Get a specific trace by ID, from this process's buffer or the trace store"""
+        trace = self._find_trace(trace_id)
+        if trace:
+            return trace.to_dict()
+        if self.store is not None:
+            try:
+                return self.store.get(trace_id)
+            except Exception as e:
+                logger.error("Failed to read trace from store", trace_id=trace_id, error=str(e))
+        return None
     
     def get_all_traces(self) -> list:
-        """Get all traces for the current session"""
-        return self.traces
-    
-    def get_metrics_summary(self) -> Dict[str, Any]:
-        """Get a summary of metrics"""
-        total_requests = len(self.traces)
-        completed_requests = len([t for t in self.traces if t['status'] == 'completed'])
-        failed_requests = len([t for t in self.traces if t['status'] == 'failed'])
-        
-        avg_duration = 0
-        total_tokens = 0
-        
-        if completed_requests > 0:
-            durations = [t.get('total_duration', 0) for t in self.traces if t['status'] == 'completed']
-            avg_duration = sum(durations) / len(durations)
-            total_tokens = sum([t['metrics']['tokens_used'] for t in self.traces])
+        """Get all traces still held in the buffer"""
+        with self.lock:
+            traces = list(self.traces.values())
+        return [trace.to_dict() for trace in traces]
+    
+    def list_traces(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        filters: Optional[Dict[str, str]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of traces, newest first, without steps; returns (traces, next_cursor).
+
+        Raises ValueError for an unknown filter or a malformed cursor.
+        """
+        if self.store is not None:
+            return self.store.list(limit, cursor, filters)
+        return self._list_buffer(limit, cursor, filters)
+    
+    def scan_traces(
+        self,
+        since: str,
+        until: str,
+        filters: Optional[Dict[str, str]] = None,
+        limit: int = 5000
+    ) -> List[Dict[str, Any]]:
+        """Finished traces (with steps) that started in [since, until), newest first, at most `limit`.
+
+        Each trace carries 'sample_weight', the number of finished traces it
+        stands for: the store only holds the tail-sampled ones, the buffer
+        holds them all.
+        """
+        if self.store is not None:
+            traces = self.store.scan(since, until, filters, limit)
+            for trace in traces:
+                trace['sample_weight'] = self.sampler.weight(trace.get('sampling_reason')) if self.sampler else 1.0
+            return traces
         
-        return {
-            'session_id': self.session_id,
-            'total_requests': total_requests,
-            'completed_requests': completed_requests,
-            'failed_requests': failed_requests,
-            'success_rate': (completed_requests / total_requests * 100) if total_requests > 0 else 0,
-            'average_duration': avg_duration,
-            'total_tokens_used': total_tokens,
-            'active_requests': len([t for t in self.traces if t['status'] == 'started'])
-        }
+        wanted = {}
+        for column, value in (filters or {}).items():
+            if column not in FILTER_COLUMNS:
+                raise ValueError(f"Cannot filter traces by '{column}'")
+            if value:
+                wanted[column] = value
+        with self.lock:
+            records = list(self.traces.values())
+        traces = []
+        for trace in reversed(records):
+            if trace.end_time is None or not since <= trace.timestamp < until:
+                continue
+            values = {
+                'status': trace.status,
+                'framework': trace.request_data.get('framework'),
+                'model': trace.request_data.get('llm_model') or trace.request_data.get('model')
+            }
+            if any(values[column] != value for column, value in wanted.items()):
+                continue
+            traces.append({**trace.to_dict(), 'sample_weight': 1.0})
+            if len(traces) == limit:
+                break
+        return traces
+    
+    def get_metrics_summary(self, window: Optional[str] = None) -> Dict[str, Any]:
+        """Get a summary of metrics, for the process lifetime or one of SUMMARY_WINDOWS"""
+        return {'session_id': self.session_id, **self.summary.snapshot(window)}
     
-    def _find_trace(self, trace_id: str) -> Optional[Dict[str, Any]]:
+    def _find_trace(self, trace_id: str) -> Optional[TraceRecord]:
         """Find a trace by ID"""
-        for trace in self.traces:
-            if trace['trace_id'] == trace_id:
-                return trace
-        return None
+        return self.traces.get(trace_id)
+    
+    def _persist(self, trace: TraceRecord):
+        if self.store is None:
+            return
+        try:
+            self.store.save(trace.to_dict())
+        except Exception as e:
+            # A store outage must not fail the request being traced
+            logger.error("Failed to persist trace", trace_id=trace.trace_id, error=str(e))
+    
+    def _list_buffer(
+        self,
+        limit: int,
+        cursor: Optional[str],
+        filters: Optional[Dict[str, str]]
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """list_traces over the in-memory buffer, used when there is no trace store"""
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        wanted = {}
+        for column, value in (filters or {}).items():
+            if column not in FILTER_COLUMNS:
+                raise ValueError(f"Cannot filter traces by '{column}'")
+            if value:
+                wanted[column] = value
+        after = decode_cursor(cursor) if cursor else None
+        
+        with self.lock:
+            records = list(self.traces.values())
+        page = []
+        for trace in sorted(records, key=lambda t: (t.timestamp, t.trace_id), reverse=True):
+            if after and (trace.timestamp, trace.trace_id) >= after:
+                continue
+            values = {
+                'status': trace.status,
+                'framework': trace.request_data.get('framework'),
+                'model': trace.request_data.get('llm_model') or trace.request_data.get('model')
+            }
+            if any(values[column] != value for column, value in wanted.items()):
+                continue
+            if len(page) == limit:
+                last = page[-1]
+                return page, encode_cursor(last['timestamp'], last['trace_id'])
+            summary = trace.to_dict()
+            summary['step_count'] = len(summary.pop('steps'))
+            page.append(summary)
+        return page, None
+    
+    def _end_span(self, trace: TraceRecord):
+        span, trace.span = trace.span, None
+        if span is None:
+            return
+        span.set_attribute('agent.tokens_used', trace.tokens_used)
+        span.set_attribute('agent.api_calls', trace.api_calls)
+        if trace.sampling_reason:
+            # Read by TailSamplingSpanProcessor so span export follows the same decision
+            span.set_attribute('sampling.reason', trace.sampling_reason)
+        if trace.status == 'failed':
+            span.set_status(Status(StatusCode.ERROR, trace.error or 'failed'))
+        span.end()
+    
+    def _evict_oldest(self):
+        # Caller holds self.lock
+        _, trace = self.traces.popitem(last=False)
+        TRACES_EVICTED.labels(status=trace.status).inc()
+        if trace.status == 'started':
+            # Not claimed by end_trace, which will no longer find it, so settle the active counts now
+            ACTIVE_REQUESTS.dec()
+            self.summary.trace_dropped()
+            self._end_span(trace)
     
     def export_traces_to_grafana(self, grafana_url: str, api_key: str):
-        """Export traces to Grafana Cloud (placeholder for actual implementation)"""
+        """Flush finished spans to the OTLP collector, which forwards them to Grafana Cloud.
+
+        The Grafana endpoint and key are configured on the collector, not
+        here; the arguments are kept for existing callers.
+        """
+        if tracer_provider is None:
+            logger.warning("OpenTelemetry export is disabled; no spans to send to Grafana")
+            return
         try:
-            # This would be implemented based on your Grafana Cloud setup
-            # For now, we'll log the traces in a format suitable for Grafana
-            for trace in self.traces:
-                logger.info(
-                    "Grafana export",
-                    trace_id=trace['trace_id'],
-                    framework=trace['request_data'].get('framework'),
-                    model=trace['request_data'].get('model'),
-                    duration=trace.get('total_duration', 0),
-                    status=trace['status'],
-                    tokens_used=trace['metrics']['tokens_used']
-                )
+            tracer_provider.force_flush()
         except Exception as e:
             logger.error("Failed to export to Grafana", error=str(e))
 
 # Global tracing manager instance
-tracing_manager = TracingManager(os.getenv('LANGTRACE_API_KEY'))
\ No newline at end of file
+tracing_manager = TracingManager(os.getenv('LANGTRACE_API_KEY'), settings.TRACE_BUFFER_CAPACITY, trace_store, tail_sampler)
\ No newline at end of file
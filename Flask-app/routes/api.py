@@ -1,8 +1,16 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context, url_for
 from services.agent_service import agent_service
+from services.batch_service import batch_service
+from services.comparison_service import comparison_service
+from services.trace_analysis_service import trace_analysis_service
+from services.job_service import job_service, JobQueueFullError, TERMINAL_STATUSES
 from services.enhanced_metrics_service import enhanced_metrics_service
 from core.tracing import tracing_manager
+from core.registry import registry
+from core.admission import admission_controller, AdmissionRejected
+from config.settings import settings
 import structlog
+import json
 
 logger = structlog.get_logger()
 
@@ -28,10 +36,150 @@ def generate():
         
         return jsonify(result)
         
+    except AdmissionRejected as e:
+        return rejected_response(e)
     except Exception as e:
         logger.error("API generate error", error=str(e))
         return jsonify({'error': str(e)}), 500
 
+def rejected_response(error: AdmissionRejected):
+    """429/503 with Retry-After for a query shed by admission control"""
+    response = jsonify({'error': str(error), 'retry_after': error.retry_after})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, error.status_code
+
+@api_bp.route('/generate/batch', methods=['POST'])
+def generate_batch():
+    """Run a batch of queries concurrently; results stream back as NDJSON in completion order"""
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        items = batch_service.build_items(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error("API batch generate error", error=str(e))
+        return jsonify({'error': str(e)}), 500
+    
+    def generate_lines():
+        for line in batch_service.run(items):
+            yield json.dumps(line, default=str) + '\n'
+    
+    return Response(stream_with_context(generate_lines()), mimetype='application/x-ndjson')
+
+@api_bp.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a query and return its job id immediately"""
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        required_fields = ['framework', 'model', 'vector_store', 'query']
+        for field in required_fields:
+            if not data.get(field):
+                return jsonify({'error': f'Missing required field: {field}'}), 400
+        
+        job = job_service.submit(data)
+        status_url = url_for('api.get_job', job_id=job['job_id'])
+        response = jsonify({
+            **job,
+            'status_url': status_url,
+            'events_url': url_for('api.job_events', job_id=job['job_id'])
+        })
+        response.headers['Location'] = status_url
+        return response, 202
+        
+    except JobQueueFullError as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '5'
+        return response, 429
+    except Exception as e:
+        logger.error("API job submit error", error=str(e))
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Poll a job's status; the result is included once it has finished"""
+    job = job_service.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@api_bp.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a job that has not started yet"""
+    if not job_service.get(job_id):
+        return jsonify({'error': 'Job not found'}), 404
+    if not job_service.cancel(job_id):
+        return jsonify({'error': 'Job has already started'}), 409
+    return jsonify(job_service.get(job_id))
+
+@api_bp.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-sent 'status' events until the job finishes; safe to reconnect at any time"""
+    job = job_service.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def generate_events():
+        current = job
+        while True:
+            yield f"event: status\ndata: {json.dumps(current, default=str)}\n\n"
+            if current['status'] in TERMINAL_STATUSES:
+                return
+            last_status = current['status']
+            while current and current['status'] == last_status:
+                current = job_service.wait_for_change(job_id, last_status)
+                if current and current['status'] == last_status:
+                    yield ": keep-alive\n\n"
+            if not current:
+                return
+    
+    return Response(
+        stream_with_context(generate_events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@api_bp.route('/jobs', methods=['GET'])
+def job_stats():
+    """Job counts per status for the configured backend"""
+    return jsonify(job_service.get_stats())
+
+@api_bp.route('/compare', methods=['POST'])
+def compare():
+    """Run one query across several configurations concurrently"""
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        result = comparison_service.compare(data.get('query', ''), data.get('configurations') or [])
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error("API compare error", error=str(e))
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/compare/<comparison_id>', methods=['GET'])
+def get_comparison(comparison_id):
+    """Metrics recorded for a past comparison"""
+    try:
+        rows = comparison_service.get_comparison(comparison_id)
+        if not rows:
+            return jsonify({'error': 'Comparison not found'}), 404
+        return jsonify({'comparison_id': comparison_id, 'results': rows})
+    except Exception as e:
+        logger.error("API comparison error", error=str(e), comparison_id=comparison_id)
+        return jsonify({'error': str(e)}), 500
+
 @api_bp.route('/configurations', methods=['GET'])
 def get_configurations():
     """Get available configurations"""
@@ -44,14 +192,38 @@ def get_configurations():
 
 @api_bp.route('/traces', methods=['GET'])
 def get_traces():
-    """Get all traces"""
+    """Get one page of traces, newest first; pass next_cursor back as ?cursor= for the next page"""
     try:
-        traces = tracing_manager.get_all_traces()
-        return jsonify({'traces': traces})
+        filters = {column: request.args.get(column) for column in ('status', 'framework', 'model')}
+        traces, next_cursor = tracing_manager.list_traces(
+            limit=request.args.get('limit', settings.TRACE_PAGE_SIZE, type=int),
+            cursor=request.args.get('cursor'),
+            filters=filters
+        )
+        return jsonify({'traces': traces, 'next_cursor': next_cursor})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error("API traces error", error=str(e))
         return jsonify({'error': str(e)}), 500
 
+@api_bp.route('/traces/analysis', methods=['GET'])
+def get_trace_analysis():
+    """Stage time aggregated over the traces of the last ?minutes=, optionally compared with the window before"""
+    try:
+        filters = {column: request.args.get(column) for column in ('status', 'framework', 'model')}
+        analysis = trace_analysis_service.analyze(
+            minutes=request.args.get('minutes', 60, type=int),
+            filters=filters,
+            compare=request.args.get('compare', 'false').lower() == 'true'
+        )
+        return jsonify(analysis)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error("API trace analysis error", error=str(e))
+        return jsonify({'error': str(e)}), 500
+
 @api_bp.route('/traces/<trace_id>', methods=['GET'])
 def get_trace(trace_id):
     """Get specific trace"""
@@ -157,4 +329,24 @@ def cleanup_metrics():
 @api_bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'service': 'docker-agent-flask'})
\ No newline at end of file
+    return jsonify({'status': 'healthy', 'service': 'docker-agent-flask'})
+
+@api_bp.route('/rag-replicas', methods=['GET'])
+def rag_replicas():
+    """Load and health of each Rag-API replica behind the shared client"""
+    # Imported here so loading the blueprint does not create the client and start its health checks
+    from core.rag_client import rag_client
+    return jsonify({'policy': rag_client.policy, 'replicas': rag_client.get_replica_status()})
+
+@api_bp.route('/admission', methods=['GET'])
+def admission():
+    """Current admission limits, in-flight queries and wait queue"""
+    return jsonify(admission_controller.get_status())
+
+@api_bp.route('/components', methods=['GET'])
+def components():
+    """Registered components and the import/init time of those loaded so far"""
+    return jsonify({
+        'frameworks': registry.get_available_frameworks(),
+        'load_times_ms': registry.get_component_timings()
+    })
@@ -1,10 +1,13 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
 from services.enhanced_agent_service import enhanced_agent_service
 from services.enhanced_metrics_service import enhanced_metrics_service
 from services.site24x7_service import site24x7_service
-from core.tracing import tracing_manager
+from services.trace_analysis_service import trace_analysis_service
+from core.tracing import tracing_manager, build_waterfall
+from core.admission import AdmissionRejected
 from config.settings import settings
 import structlog
+import json
 
 logger = structlog.get_logger()
 
@@ -76,16 +79,101 @@ def generate():
             status=result.get('status', 'unknown')
         )
         
+    except AdmissionRejected as e:
+        flash(f'The service is busy right now; please retry in {e.retry_after}s', 'error')
+        return redirect(url_for('web.index'))
     except Exception as e:
         logger.error("Web generate error", error=str(e))
         flash(f'Error: {str(e)}', 'error')
         return redirect(url_for('web.index'))
 
+@web_bp.route('/generate/stream', methods=['POST'])
+def generate_stream():
+    """Stream step and token events for the playground as server-sent events"""
+    query = request.form.get('prompt_text', '').strip()
+    if not query:
+        return jsonify({'error': 'Please enter a query'}), 400
+    
+    request_data = {
+        'framework': request.form.get('framework'),
+        'model': request.form.get('model'),
+        'vector_store': request.form.get('vector_store'),
+        'query': query
+    }
+    
+    try:
+        events = enhanced_agent_service.stream_query(request_data)
+    except AdmissionRejected as e:
+        response = jsonify({'error': str(e), 'retry_after': e.retry_after})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, e.status_code
+    
+    def generate_events():
+        try:
+            for event, data in events:
+                yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        finally:
+            events.close()
+    
+    return Response(
+        stream_with_context(generate_events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@web_bp.route('/compare')
+def compare():
+    """Compare mode: one query across several configurations side by side"""
+    configs = enhanced_agent_service.get_available_configurations()
+    
+    return render_template(
+        'compare.html',
+        frameworks=configs['frameworks'],
+        models=configs['models'],
+        vectorstores=configs['vector_stores'],
+        max_configurations=settings.COMPARE_MAX_CONFIGURATIONS
+    )
+
 @web_bp.route('/traces')
 def traces():
-    """Traces page"""
-    traces = tracing_manager.get_all_traces()
-    return render_template('traces.html', traces=traces)
+    """Traces page, one page at a time"""
+    filters = {column: request.args.get(column, '') for column in ('status', 'framework', 'model')}
+    cursor = request.args.get('cursor')
+    try:
+        traces, next_cursor = tracing_manager.list_traces(settings.TRACE_PAGE_SIZE, cursor, filters)
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('web.traces'))
+    return render_template(
+        'traces.html',
+        traces=traces,
+        next_cursor=next_cursor,
+        cursor=cursor,
+        filters=filters,
+        frameworks=settings.FRAMEWORKS,
+        models=settings.MODELS
+    )
+
+@web_bp.route('/traces/analysis')
+def trace_analysis():
+    """Flame view and per-stage percentiles across many traces"""
+    filters = {column: request.args.get(column, '') for column in ('status', 'framework', 'model')}
+    minutes = request.args.get('minutes', 60, type=int)
+    compare = request.args.get('compare') == 'on'
+    try:
+        analysis = trace_analysis_service.analyze(minutes, filters, compare)
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('web.trace_analysis'))
+    return render_template(
+        'trace_analysis.html',
+        analysis=analysis,
+        minutes=minutes,
+        compare=compare,
+        filters=filters,
+        frameworks=settings.FRAMEWORKS,
+        models=settings.MODELS
+    )
 
 @web_bp.route('/traces/<trace_id>')
 def trace_detail(trace_id):
@@ -95,7 +183,7 @@ def trace_detail(trace_id):
         flash('Trace not found', 'error')
         return redirect(url_for('web.traces'))
     
-    return render_template('trace_detail.html', trace=trace)
+    return render_template('trace_detail.html', trace=trace, waterfall=build_waterfall(trace))
 
 @web_bp.route('/metrics')
 def metrics():
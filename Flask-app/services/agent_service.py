@@ -1,6 +1,8 @@
 from typing import Dict, Any, Optional
 from core.registry import registry
 from core.tracing import tracing_manager
+from core.admission import admission_controller, AdmissionRejected
+from core.cache import response_cache, cache_key, is_cacheable, RESPONSE_CACHE_STORES
 from config.settings import settings
 from .enhanced_metrics_service import enhanced_metrics_service
 import structlog
@@ -15,26 +17,65 @@ class AgentService:
         self._initialize_components()
     
     def _initialize_components(self):
-        """Initialize and register all components"""
-        # Import and register adapters
-        from adapters import (
-            LangGraphAdapter, LlamaIndexAdapter, 
-            DSPyAdapter, AutoGenAdapter
-        )
+        """Register all components; adapters are imported on first use"""
+        from adapters import ADAPTER_MODULES
         
-        registry.register_framework(LangGraphAdapter)
-        registry.register_framework(LlamaIndexAdapter)
-        registry.register_framework(DSPyAdapter)
-        registry.register_framework(AutoGenAdapter)
+        registry.register_lazy_frameworks(ADAPTER_MODULES)
+        registry.discover_entry_points()
     
     def execute_query(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Serve a cached answer, or execute the query once admitted.
+
+        Cache hits cost no Rag-API capacity, so they bypass admission control;
+        raises AdmissionRejected when a miss finds the service at capacity.
+        """
+        start_time = time.time()
+        key = self._cache_key(request_data)
+        
+        # Answers computed by any Flask replica are shared through Redis
+        if settings.RESPONSE_CACHE_ENABLED and request_data.get('cache', True):
+            cached, tier = response_cache.get(key)
+            if cached is not None:
+                trace_id = tracing_manager.start_trace(request_data)
+                return self._cached_result(trace_id, request_data, cached, tier, time.time() - start_time)
+        
+        with admission_controller.admit(request_data.get('framework', '').lower()):
+            return self._execute_query(request_data, key)
+    
+    def execute_background_query(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute a query nobody is waiting on synchronously (jobs, batch items).
+
+        When admission control sheds it, wait the advertised Retry-After and
+        try again until ADMISSION_BACKGROUND_MAX_WAIT has passed, then re-raise.
+        """
+        deadline = time.monotonic() + settings.ADMISSION_BACKGROUND_MAX_WAIT
+        while True:
+            try:
+                return self.execute_query(request_data)
+            except AdmissionRejected as e:
+                delay = max(e.retry_after, 1)
+                if time.monotonic() + delay > deadline:
+                    raise
+                logger.info("Background query shed; retrying", retry_after=delay, framework=request_data.get('framework'))
+                time.sleep(delay)
+    
+    def _cache_key(self, request_data: Dict[str, Any]) -> str:
+        return cache_key(
+            request_data.get('framework', '').lower(),
+            request_data.get('model'),
+            request_data.get('vector_store'),
+            request_data.get('query', '')
+        )
+    
+    def _execute_query(self, request_data: Dict[str, Any], key: str) -> Dict[str, Any]:
         """Execute a query with full tracing and real-time metrics collection"""
         trace_id = tracing_manager.start_trace(request_data)
         start_time = time.time()
         
         try:
-            # Get framework adapter
             framework_name = request_data.get('framework', '').lower()
+            
+            # Get framework adapter
             adapter = registry.get_framework(framework_name)
             
             tracing_manager.add_step(trace_id, 'framework_initialization', {
@@ -58,7 +99,13 @@ class AgentService:
             
             # Execute query
             query = request_data.get('query', '')
-            result = adapter.execute_query(agent, query)
+            with tracing_manager.span(trace_id, 'adapter.execute_query', {'framework': framework_name}):
+                result = adapter.execute_query(agent, query)
+            
+            # Surface breaker transitions, fast-fails and retries in the trace
+            resilience = result.get('resilience') or {}
+            if resilience.get('transitions') or resilience.get('fast_failed') or resilience.get('attempts', 1) > 1:
+                tracing_manager.add_step(trace_id, 'rag_api_resilience', resilience)
             
             end_time = time.time()
             duration = end_time - start_time
@@ -67,13 +114,32 @@ class AgentService:
                 'query_length': len(query),
                 'response_length': len(result.get('answer', '')),
                 'duration': result.get('duration', duration),
-                'tokens': result.get('tokens_used', 0),
+                # The trace counters need a number; everything else keeps None for unreported usage
+                'tokens': result.get('tokens_used') or 0,
+                'llm_calls': result.get('llm_calls'),
+                'server_timings': result.get('server_timings', {}),
+                'server_stages': result.get('server_stages', []),
+                'call_started_at': result.get('started_at'),
                 'status': result.get('status', 'unknown')
             })
             
             # Clean response
             cleaned_response = self._clean_response(result.get('answer', ''))
             
+            if settings.RESPONSE_CACHE_ENABLED:
+                if is_cacheable(result):
+                    response_cache.set(key, {
+                        'answer': cleaned_response,
+                        'tokens_used': result.get('tokens_used'),
+                        'llm_calls': result.get('llm_calls'),
+                        'cached_at': time.time()
+                    })
+                else:
+                    RESPONSE_CACHE_STORES.labels(outcome='uncacheable').inc()
+            
+            # Adapters return Rag-API failures (5xx, timeouts, open breaker) instead of raising them
+            failed = result.get('status') == 'error'
+            
             # Prepare metrics data for collection
             metrics_data = {
                 'trace_id': trace_id,
@@ -83,11 +149,22 @@ class AgentService:
                 'query': query,
                 'response': cleaned_response,
                 'duration': duration,
-                'tokens_used': result.get('tokens_used', 0),
+                'tokens_used': result.get('tokens_used'),
                 'input_tokens': result.get('input_tokens'),
                 'output_tokens': result.get('output_tokens'),
+                'cached_tokens': result.get('cached_tokens'),
+                'llm_calls': result.get('llm_calls'),
                 'status': 'completed'
             }
+            if failed:
+                # Nothing was generated; don't estimate cost from the error text
+                metrics_data.update({
+                    'tokens_used': 0,
+                    'input_tokens': 0,
+                    'output_tokens': 0,
+                    'status': 'failed',
+                    'error': result.get('error')
+                })
             
             # Record real-time metrics
             try:
@@ -108,18 +185,27 @@ class AgentService:
                 'model': request_data.get('model'),
                 'vector_store': request_data.get('vector_store'),
                 'duration': duration,
-                'tokens_used': result.get('tokens_used', 0),
+                'tokens_used': result.get('tokens_used'),
                 'status': 'success'
             }
             
-            tracing_manager.end_trace(trace_id, 'completed')
-            
-            logger.info(
-                "Query executed successfully",
-                trace_id=trace_id,
-                framework=framework_name,
-                duration=duration
-            )
+            if failed:
+                final_result.update({'tokens_used': 0, 'status': 'error', 'error': result.get('error')})
+                tracing_manager.end_trace(trace_id, 'failed', result.get('error'))
+                logger.error(
+                    "Query execution failed",
+                    trace_id=trace_id,
+                    error=result.get('error'),
+                    framework=framework_name
+                )
+            else:
+                tracing_manager.end_trace(trace_id, 'completed')
+                logger.info(
+                    "Query executed successfully",
+                    trace_id=trace_id,
+                    framework=framework_name,
+                    duration=duration
+                )
             
             return final_result
             
@@ -167,6 +253,56 @@ class AgentService:
                 'error': str(e)
             }
     
+    def _cached_result(
+        self,
+        trace_id: str,
+        request_data: Dict[str, Any],
+        cached: Dict[str, Any],
+        tier: str,
+        duration: float
+    ) -> Dict[str, Any]:
+        """Serve a cached answer; no LLM call was made, so no tokens were spent"""
+        tracing_manager.add_step(trace_id, 'response_cache', {
+            'tier': tier,
+            'age_seconds': time.time() - cached.get('cached_at', time.time()),
+            'original_tokens': cached.get('tokens_used')
+        })
+        
+        metrics_data = {
+            'trace_id': trace_id,
+            'framework': request_data.get('framework', '').lower(),
+            'model': request_data.get('model'),
+            'vector_store': request_data.get('vector_store'),
+            'query': request_data.get('query', ''),
+            'response': cached['answer'],
+            'duration': duration,
+            'tokens_used': 0,
+            'input_tokens': 0,
+            'output_tokens': 0,
+            'llm_calls': 0,
+            'token_source': 'cache',
+            'status': 'completed'
+        }
+        try:
+            enhanced_metrics_service.record_trace_metrics(metrics_data)
+        except Exception as e:
+            logger.error(f"Failed to record metrics: {e}", trace_id=trace_id)
+        
+        tracing_manager.end_trace(trace_id, 'completed')
+        logger.info("Query served from response cache", trace_id=trace_id, tier=tier)
+        
+        return {
+            'answer': cached['answer'],
+            'trace_id': trace_id,
+            'framework': request_data.get('framework', '').lower(),
+            'model': request_data.get('model'),
+            'vector_store': request_data.get('vector_store'),
+            'duration': duration,
+            'tokens_used': 0,
+            'cache': tier,
+            'status': 'success'
+        }
+    
     def _clean_response(self, text: str) -> str:
         """Clean and format the response"""
         if not text:
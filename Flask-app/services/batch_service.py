@@ -0,0 +1,110 @@
+from typing import Dict, Any, List, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from prometheus_client import Counter, Histogram
+from config.settings import settings
+from .agent_service import agent_service
+import structlog
+import time
+import uuid
+
+logger = structlog.get_logger()
+
+BATCH_ITEMS = Counter(
+    'docker_agent_batch_items_total',
+    'Items processed by /api/generate/batch',
+    ['status']
+)
+
+BATCH_DURATION = Histogram(
+    'docker_agent_batch_duration_seconds',
+    'Wall-clock time to complete a whole batch',
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800)
+)
+
+REQUIRED_FIELDS = ['framework', 'model', 'vector_store', 'query']
+
+class BatchService:
+    """Fans a batch of queries out to the agent service through a bounded worker pool"""
+
+    def __init__(self, max_workers: int = 8, max_items: int = 200):
+        self.max_items = max_items
+        # Shared by all batches so concurrent batches cannot exceed max_workers Rag-API calls together
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batch')
+
+    def build_items(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Validate a batch body and return one request dict per item.
+
+        Accepts {"items": [{framework, model, vector_store, query}, ...]}; top-level
+        framework/model/vector_store act as defaults, and "queries": [str, ...]
+        is shorthand for items that only differ in their query.
+        """
+        defaults = {field: data[field] for field in REQUIRED_FIELDS[:3] if data.get(field)}
+        items = list(data.get('items') or [])
+        items += [{'query': query} for query in data.get('queries') or []]
+
+        if not items:
+            raise ValueError("Provide a non-empty 'items' or 'queries' list")
+        if len(items) > self.max_items:
+            raise ValueError(f"Batch has {len(items)} items; the limit is {self.max_items}")
+
+        requests_data = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                raise ValueError(f"Item {index} must be an object")
+            request_data = {**defaults, **item}
+            for field in REQUIRED_FIELDS:
+                if not request_data.get(field):
+                    raise ValueError(f"Item {index} is missing required field: {field}")
+            requests_data.append(request_data)
+        return requests_data
+
+    def run(self, items: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Yield one result per item as it completes, then a summary"""
+        batch_id = str(uuid.uuid4())
+        start_time = time.time()
+        succeeded = failed = 0
+        total_tokens = 0
+
+        logger.info("Batch started", batch_id=batch_id, items=len(items))
+        futures = {
+            self.executor.submit(agent_service.execute_background_query, item): index
+            for index, item in enumerate(items)
+        }
+
+        try:
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'status': 'error', 'error': str(e), 'answer': f"❌ Error: {str(e)}"}
+
+                if result.get('status') == 'success':
+                    succeeded += 1
+                else:
+                    failed += 1
+                total_tokens += result.get('tokens_used') or 0
+                BATCH_ITEMS.labels(status=result.get('status', 'unknown')).inc()
+
+                yield {'type': 'result', 'batch_id': batch_id, 'index': index, **result}
+        finally:
+            # Client went away: don't keep spending Rag-API capacity on items nobody will read
+            for future in futures:
+                future.cancel()
+
+        duration = time.time() - start_time
+        BATCH_DURATION.observe(duration)
+        logger.info("Batch completed", batch_id=batch_id, succeeded=succeeded, failed=failed, duration=duration)
+
+        yield {
+            'type': 'summary',
+            'batch_id': batch_id,
+            'total': len(items),
+            'succeeded': succeeded,
+            'failed': failed,
+            'duration': duration,
+            'tokens_used': total_tokens
+        }
+
+# Global batch service instance
+batch_service = BatchService(settings.BATCH_MAX_WORKERS, settings.BATCH_MAX_ITEMS)
@@ -0,0 +1,97 @@
+from typing import Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from config.settings import settings
+from .enhanced_agent_service import enhanced_agent_service
+from .metrics_collector import metrics_collector
+import structlog
+import time
+import uuid
+
+logger = structlog.get_logger()
+
+CONFIG_FIELDS = ['framework', 'model', 'vector_store']
+
+class ComparisonService:
+    """Runs one query across several (framework, model, vector_store) configurations at once"""
+
+    def __init__(self, max_workers: int = 8, max_configurations: int = 12):
+        self.max_configurations = max_configurations
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='compare')
+
+    def validate(self, query: str, configurations: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """Return the de-duplicated configurations, or raise ValueError"""
+        if not query or not query.strip():
+            raise ValueError("Missing required field: query")
+        if not configurations:
+            raise ValueError("Provide at least one configuration")
+
+        unique = []
+        seen = set()
+        for index, config in enumerate(configurations):
+            if not isinstance(config, dict):
+                raise ValueError(f"Configuration {index} must be an object with: {', '.join(CONFIG_FIELDS)}")
+            missing = [field for field in CONFIG_FIELDS if not config.get(field)]
+            if missing:
+                raise ValueError(f"Configuration {index} is missing: {', '.join(missing)}")
+            key = tuple(config[field] for field in CONFIG_FIELDS)
+            if key not in seen:
+                seen.add(key)
+                unique.append(dict(zip(CONFIG_FIELDS, key)))
+
+        if len(unique) > self.max_configurations:
+            raise ValueError(f"At most {self.max_configurations} configurations can be compared at once")
+        return unique
+
+    def compare(self, query: str, configurations: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Execute every configuration concurrently; wall time is roughly the slowest one"""
+        configurations = self.validate(query, configurations)
+        comparison_id = str(uuid.uuid4())
+        start_time = time.time()
+
+        logger.info("Comparison started", comparison_id=comparison_id, configurations=len(configurations))
+        futures = [
+            self.executor.submit(
+                enhanced_agent_service.execute_query,
+                {**config, 'query': query.strip(), 'comparison_id': comparison_id}
+            )
+            for config in configurations
+        ]
+
+        results = []
+        for config, future in zip(configurations, futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'answer': f"❌ Error: {str(e)}", 'status': 'error', 'error': str(e), 'duration': 0.0}
+            results.append({
+                **config,
+                'answer': result.get('answer', ''),
+                'status': result.get('status', 'unknown'),
+                'latency_ms': round(result.get('duration', 0.0) * 1000, 2),
+                'tokens_used': result.get('tokens_used', 0),
+                'input_tokens': result.get('input_tokens'),
+                'output_tokens': result.get('output_tokens'),
+                'cost_usd': result.get('cost_usd', 0.0),
+                'trace_id': result.get('trace_id'),
+                'error': result.get('error')
+            })
+
+        duration = time.time() - start_time
+        sequential_ms = sum(result['latency_ms'] for result in results)
+        logger.info("Comparison completed", comparison_id=comparison_id, duration=duration)
+
+        return {
+            'comparison_id': comparison_id,
+            'query': query.strip(),
+            'duration_ms': round(duration * 1000, 2),
+            # What the same comparison would have cost as back-to-back requests
+            'sequential_duration_ms': round(sequential_ms, 2),
+            'results': results
+        }
+
+    def get_comparison(self, comparison_id: str) -> List[Dict[str, Any]]:
+        """Metrics rows recorded for a past comparison"""
+        return metrics_collector.get_comparison(comparison_id)
+
+# Global comparison service instance
+comparison_service = ComparisonService(settings.COMPARE_MAX_WORKERS, settings.COMPARE_MAX_CONFIGURATIONS)
@@ -1,6 +1,8 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional, Tuple
+from opentelemetry import trace as otel_trace
 from core.registry import registry
 from core.tracing import tracing_manager
+from core.admission import admission_controller, AdmittedStream
 from config.settings import settings
 from .enhanced_metrics_service import enhanced_metrics_service
 from .site24x7_service import site24x7_service
@@ -18,148 +20,282 @@ class EnhancedAgentService:
         self._initialize_components()
     
     def _initialize_components(self):
-        """Initialize and register all components"""
-        from adapters import (
-            LangGraphAdapter, LlamaIndexAdapter, 
-            DSPyAdapter, AutoGenAdapter
-        )
+        """Register all components; adapters are imported on first use"""
+        from adapters import ADAPTER_MODULES
         
-        registry.register_framework(LangGraphAdapter)
-        registry.register_framework(LlamaIndexAdapter)
-        registry.register_framework(DSPyAdapter)
-        registry.register_framework(AutoGenAdapter)
+        registry.register_lazy_frameworks(ADAPTER_MODULES)
+        registry.discover_entry_points()
     
     def execute_query(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute a query with comprehensive logging and monitoring"""
-        trace_id = tracing_manager.start_trace(request_data)
-        start_time = time.time()
+        """Execute a query with comprehensive logging and monitoring.
+        
+        Raises AdmissionRejected when the service is at capacity.
+        """
+        with admission_controller.admit(request_data.get('framework', '').lower()):
+            run = self._begin(request_data)
+            
+            try:
+                adapter, agent = self._prepare(run)
+                with tracing_manager.span(run['trace_id'], 'adapter.execute_query', {'framework': run['framework_name']}):
+                    result = adapter.execute_query(agent, run['query'])
+                return self._complete(run, result)
+                
+            except Exception as e:
+                return self._fail(run, e)
+    
+    def stream_query(self, request_data: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Execute a query, yielding (event, data) for steps and answer tokens as they arrive.
         
-        # Capture initial system state
-        initial_cpu = psutil.cpu_percent()
-        initial_memory = psutil.virtual_memory().percent
+        The trace and metrics are finalised when the stream ends; the last
+        event is ('done', ...) with the same fields execute_query returns.
+        Adapters without stream_query produce a single 'done' event.
+        Admission happens here, before the stream starts, so AdmissionRejected
+        can still become a 429/503 response.
+        """
+        ticket = admission_controller.acquire(request_data.get('framework', '').lower())
+        return AdmittedStream(admission_controller, ticket, self._stream(request_data))
+    
+    def _stream(self, request_data: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        run = self._begin(request_data)
+        finished = False
+        stream = None
+        adapter_span = None
         
         try:
-            # Get framework adapter
-            framework_name = request_data.get('framework', '').lower()
-            adapter = registry.get_framework(framework_name)
-            
-            tracing_manager.add_step(trace_id, 'framework_initialization', {
-                'framework': framework_name,
-                'adapter_class': adapter.__class__.__name__
-            })
-            
-            # Create agent
-            agent_config = {
-                'model': request_data.get('model'),
-                'vector_store': request_data.get('vector_store'),
-                'query': request_data.get('query')
-            }
-            
-            agent = adapter.create_agent(agent_config)
+            adapter, agent = self._prepare(run)
             
-            tracing_manager.add_step(trace_id, 'agent_creation', {
-                'config': agent_config,
-                'agent_type': type(agent).__name__
-            })
-            
-            # Execute query
-            query = request_data.get('query', '')
-            result = adapter.execute_query(agent, query)
-            
-            end_time = time.time()
-            duration = end_time - start_time
-            
-            # Capture final system state
-            final_cpu = psutil.cpu_percent()
-            final_memory = psutil.virtual_memory().percent
-            
-            tracing_manager.add_step(trace_id, 'query_execution', {
-                'query_length': len(query),
-                'response_length': len(result.get('answer', '')),
-                'duration': result.get('duration', duration),
-                'tokens': result.get('tokens_used', 0),
-                'status': result.get('status', 'unknown'),
-                'cpu_usage_change': final_cpu - initial_cpu,
-                'memory_usage_change': final_memory - initial_memory
-            })
+            # Started here and ended explicitly: the span stays open across yields to the client
+            adapter_span = tracing_manager.start_span(
+                run['trace_id'], 'adapter.stream_query', {'framework': run['framework_name']}
+            )
+            with otel_trace.use_span(adapter_span):
+                # Adapters read the current span when called, so the Rag-API request joins this trace
+                if hasattr(adapter, 'stream_query'):
+                    stream = adapter.stream_query(agent, run['query'])
+                else:
+                    result = adapter.execute_query(agent, run['query'])
+            if stream is not None:
+                result = None
+                for event, data in stream:
+                    if event == 'result':
+                        result = data
+                    else:
+                        if event == 'token' and 'first_token_at' not in run:
+                            run['first_token_at'] = time.time()
+                        yield event, data
+            adapter_span.end()
+            adapter_span = None
             
-            # Clean response
-            cleaned_response = self._clean_response(result.get('answer', ''))
+            final_result = self._complete(run, result)
+            finished = True
+            yield 'done', final_result
             
-            # Calculate token costs
-            model = request_data.get('model', 'gpt-4o-mini')
+        except Exception as e:
+            final_result = self._fail(run, e)
+            finished = True
+            yield 'done', final_result
+        finally:
+            if stream is not None:
+                stream.close()
+            if adapter_span is not None:
+                adapter_span.end()
+            if not finished:
+                # The client went away mid-stream; still close out the trace and metrics
+                self._fail(run, RuntimeError('Client disconnected before the stream completed'))
+    
+    def _begin(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Start the trace and capture the initial system state"""
+        return {
+            'request_data': request_data,
+            'trace_id': tracing_manager.start_trace(request_data),
+            'start_time': time.time(),
+            'framework_name': request_data.get('framework', '').lower(),
+            'query': request_data.get('query', ''),
+            'initial_cpu': psutil.cpu_percent(),
+            'initial_memory': psutil.virtual_memory().percent
+        }
+    
+    def _prepare(self, run: Dict[str, Any]) -> Tuple[Any, Any]:
+        """Resolve the framework adapter and create the agent"""
+        request_data = run['request_data']
+        trace_id = run['trace_id']
+        framework_name = run['framework_name']
+        
+        # Get framework adapter
+        adapter = registry.get_framework(framework_name)
+        
+        tracing_manager.add_step(trace_id, 'framework_initialization', {
+            'framework': framework_name,
+            'adapter_class': adapter.__class__.__name__
+        })
+        
+        # Create agent
+        agent_config = {
+            'model': request_data.get('model'),
+            'vector_store': request_data.get('vector_store'),
+            'query': request_data.get('query')
+        }
+        
+        agent = adapter.create_agent(agent_config)
+        
+        tracing_manager.add_step(trace_id, 'agent_creation', {
+            'config': agent_config,
+            'agent_type': type(agent).__name__
+        })
+        return adapter, agent
+    
+    def _complete(self, run: Dict[str, Any], result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Record the trace, metrics and Site24x7 interaction for a finished query"""
+        if result is None:
+            raise RuntimeError('Adapter stream ended without a result')
+        
+        request_data = run['request_data']
+        trace_id = run['trace_id']
+        framework_name = run['framework_name']
+        query = run['query']
+        start_time = run['start_time']
+        initial_cpu = run['initial_cpu']
+        initial_memory = run['initial_memory']
+        
+        # Surface breaker transitions, fast-fails and retries in the trace
+        resilience = result.get('resilience') or {}
+        if resilience.get('transitions') or resilience.get('fast_failed') or resilience.get('attempts', 1) > 1:
+            tracing_manager.add_step(trace_id, 'rag_api_resilience', resilience)
+        
+        end_time = time.time()
+        duration = end_time - start_time
+        time_to_first_token = run['first_token_at'] - start_time if 'first_token_at' in run else None
+        
+        # Capture final system state
+        final_cpu = psutil.cpu_percent()
+        final_memory = psutil.virtual_memory().percent
+        
+        tracing_manager.add_step(trace_id, 'query_execution', {
+            'query_length': len(query),
+            'response_length': len(result.get('answer', '')),
+            'duration': result.get('duration', duration),
+            'time_to_first_token': time_to_first_token,
+            'tokens': result.get('tokens_used') or 0,
+            'status': result.get('status', 'unknown'),
+            'llm_calls': result.get('llm_calls'),
+            'server_timings': result.get('server_timings', {}),
+            'server_stages': result.get('server_stages', []),
+            'call_started_at': result.get('started_at'),
+            'cpu_usage_change': final_cpu - initial_cpu,
+            'memory_usage_change': final_memory - initial_memory
+        })
+        
+        # Clean response
+        cleaned_response = self._clean_response(result.get('answer', ''))
+        
+        # Adapters return Rag-API failures (5xx, timeouts, open breaker) instead of raising them
+        failed = result.get('status') == 'error'
+        status = 'failed' if failed else 'completed'
+        
+        # Calculate token costs from the usage Rag-API reported; estimate only when it reported none
+        model = request_data.get('model', 'gpt-4o-mini')
+        input_tokens = result.get('input_tokens')
+        output_tokens = result.get('output_tokens')
+        token_source = 'provider'
+        if failed:
+            # Nothing was generated; don't estimate cost from the error text
+            input_tokens = output_tokens = 0
+        elif input_tokens is None or output_tokens is None:
             input_tokens = self._estimate_input_tokens(query)
             output_tokens = self._estimate_output_tokens(cleaned_response)
-            total_tokens = input_tokens + output_tokens
-            cost_usd = self._calculate_cost(model, input_tokens, output_tokens)
-            
-            # Prepare comprehensive interaction data
-            interaction_data = {
-                'trace_id': trace_id,
-                'framework': framework_name,
-                'model': model,
-                'vector_store': request_data.get('vector_store'),
-                'input_query': query,
-                'output_response': cleaned_response,
-                'input_tokens': input_tokens,
-                'output_tokens': output_tokens,
-                'total_tokens': total_tokens,
-                'latency_ms': duration * 1000,
-                'cost_usd': cost_usd,
-                'status': 'completed',
-                'cpu_usage_change': final_cpu - initial_cpu,
-                'memory_usage_change': final_memory - initial_memory
-            }
-            
-            # Record metrics
-            try:
-                metrics_data = {
-                    'trace_id': trace_id,
-                    'framework': framework_name,
-                    'model': model,
-                    'vector_store': request_data.get('vector_store'),
-                    'query': query,
-                    'response': cleaned_response,
-                    'duration': duration,
-                    'tokens_used': total_tokens,
-                    'input_tokens': input_tokens,
-                    'output_tokens': output_tokens,
-                    'status': 'completed'
-                }
-                
-                enhanced_metrics_service.record_trace_metrics(metrics_data)
-                
-                # Log to Site24x7 asynchronously
-                asyncio.create_task(site24x7_service.log_interaction(interaction_data))
-                
-                logger.info(
-                    "Interaction logged successfully",
-                    trace_id=trace_id,
-                    tokens=total_tokens,
-                    cost=cost_usd,
-                    cpu_change=final_cpu - initial_cpu
-                )
-            except Exception as e:
-                logger.error(f"Failed to record metrics: {e}", trace_id=trace_id)
-            
-            final_result = {
-                'answer': cleaned_response,
+            token_source = 'estimated'
+        cached_tokens = result.get('cached_tokens') or 0
+        total_tokens = input_tokens + output_tokens
+        cost_usd = self._calculate_cost(model, input_tokens, output_tokens)
+        
+        # Prepare comprehensive interaction data
+        interaction_data = {
+            'trace_id': trace_id,
+            'framework': framework_name,
+            'model': model,
+            'vector_store': request_data.get('vector_store'),
+            'input_query': query,
+            'output_response': cleaned_response,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'total_tokens': total_tokens,
+            'cached_tokens': cached_tokens,
+            'llm_calls': result.get('llm_calls'),
+            'latency_ms': duration * 1000,
+            'cost_usd': cost_usd,
+            'status': status,
+            'error': result.get('error'),
+            'cpu_usage_change': final_cpu - initial_cpu,
+            'memory_usage_change': final_memory - initial_memory
+        }
+        
+        # Record metrics
+        try:
+            metrics_data = {
                 'trace_id': trace_id,
                 'framework': framework_name,
                 'model': model,
                 'vector_store': request_data.get('vector_store'),
+                'query': query,
+                'response': cleaned_response,
                 'duration': duration,
                 'tokens_used': total_tokens,
                 'input_tokens': input_tokens,
                 'output_tokens': output_tokens,
-                'cost_usd': cost_usd,
-                'cpu_usage_change': final_cpu - initial_cpu,
-                'memory_usage_change': final_memory - initial_memory,
-                'status': 'success'
+                'cached_tokens': cached_tokens,
+                'llm_calls': result.get('llm_calls'),
+                'token_source': token_source,
+                'comparison_id': request_data.get('comparison_id'),
+                'status': status,
+                'error': result.get('error')
             }
             
-            tracing_manager.end_trace(trace_id, 'completed')
+            enhanced_metrics_service.record_trace_metrics(metrics_data)
+            
+            # Log to Site24x7 asynchronously
+            asyncio.create_task(site24x7_service.log_interaction(interaction_data))
             
+            logger.info(
+                "Interaction logged successfully",
+                trace_id=trace_id,
+                tokens=total_tokens,
+                cost=cost_usd,
+                cpu_change=final_cpu - initial_cpu
+            )
+        except Exception as e:
+            logger.error(f"Failed to record metrics: {e}", trace_id=trace_id)
+        
+        final_result = {
+            'answer': cleaned_response,
+            'trace_id': trace_id,
+            'framework': framework_name,
+            'model': model,
+            'vector_store': request_data.get('vector_store'),
+            'duration': duration,
+            'time_to_first_token': time_to_first_token,
+            'tokens_used': total_tokens,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'cached_tokens': cached_tokens,
+            'llm_calls': result.get('llm_calls'),
+            'server_timings': result.get('server_timings', {}),
+            'cost_usd': cost_usd,
+            'cpu_usage_change': final_cpu - initial_cpu,
+            'memory_usage_change': final_memory - initial_memory,
+            'status': 'success'
+        }
+        
+        if failed:
+            final_result.update({'status': 'error', 'error': result.get('error')})
+            tracing_manager.end_trace(trace_id, 'failed', result.get('error'))
+            logger.error(
+                "Query execution failed",
+                trace_id=trace_id,
+                error=result.get('error'),
+                framework=framework_name
+            )
+        else:
+            tracing_manager.end_trace(trace_id, 'completed')
             logger.info(
                 "Query executed successfully",
                 trace_id=trace_id,
@@ -167,74 +303,78 @@ class EnhancedAgentService:
                 duration=duration,
                 cost=cost_usd
             )
-            
-            return final_result
-            
-        except Exception as e:
-            end_time = time.time()
-            duration = end_time - start_time
-            
-            # Record failed interaction
-            interaction_data = {
+        
+        return final_result
+    
+    def _fail(self, run: Dict[str, Any], e: Exception) -> Dict[str, Any]:
+        """Record a failed query and build the error result"""
+        request_data = run['request_data']
+        trace_id = run['trace_id']
+        end_time = time.time()
+        duration = end_time - run['start_time']
+        
+        # Record failed interaction
+        interaction_data = {
+            'trace_id': trace_id,
+            'framework': request_data.get('framework', 'unknown'),
+            'model': request_data.get('model', 'unknown'),
+            'vector_store': request_data.get('vector_store', 'unknown'),
+            'input_query': request_data.get('query', ''),
+            'output_response': '',
+            'input_tokens': 0,
+            'output_tokens': 0,
+            'total_tokens': 0,
+            'latency_ms': duration * 1000,
+            'cost_usd': 0.0,
+            'status': 'failed',
+            'error_message': str(e)
+        }
+        
+        try:
+            # Record failed metrics
+            metrics_data = {
                 'trace_id': trace_id,
                 'framework': request_data.get('framework', 'unknown'),
                 'model': request_data.get('model', 'unknown'),
                 'vector_store': request_data.get('vector_store', 'unknown'),
-                'input_query': request_data.get('query', ''),
-                'output_response': '',
-                'input_tokens': 0,
-                'output_tokens': 0,
-                'total_tokens': 0,
-                'latency_ms': duration * 1000,
-                'cost_usd': 0.0,
+                'query': request_data.get('query', ''),
+                'response': '',
+                'duration': duration,
+                'tokens_used': 0,
+                'comparison_id': request_data.get('comparison_id'),
                 'status': 'failed',
-                'error_message': str(e)
+                'error': str(e)
             }
             
-            try:
-                # Record failed metrics
-                metrics_data = {
-                    'trace_id': trace_id,
-                    'framework': request_data.get('framework', 'unknown'),
-                    'model': request_data.get('model', 'unknown'),
-                    'vector_store': request_data.get('vector_store', 'unknown'),
-                    'query': request_data.get('query', ''),
-                    'response': '',
-                    'duration': duration,
-                    'tokens_used': 0,
-                    'status': 'failed',
-                    'error': str(e)
-                }
-                
-                enhanced_metrics_service.record_trace_metrics(metrics_data)
-                
-                # Log failed interaction to Site24x7
-                asyncio.create_task(site24x7_service.log_interaction(interaction_data))
-                
-            except Exception as metrics_error:
-                logger.error(f"Failed to record error metrics: {metrics_error}")
-            
-            tracing_manager.end_trace(trace_id, 'failed', str(e))
+            enhanced_metrics_service.record_trace_metrics(metrics_data)
             
-            logger.error(
-                "Query execution failed",
-                trace_id=trace_id,
-                error=str(e),
-                framework=request_data.get('framework')
-            )
+            # Log failed interaction to Site24x7
+            asyncio.create_task(site24x7_service.log_interaction(interaction_data))
             
-            return {
-                'answer': f"❌ Error: {str(e)}",
-                'trace_id': trace_id,
-                'framework': request_data.get('framework'),
-                'model': request_data.get('model'),
-                'vector_store': request_data.get('vector_store'),
-                'duration': duration,
-                'tokens_used': 0,
-                'cost_usd': 0.0,
-                'status': 'error',
-                'error': str(e)
-            }
+        except Exception as metrics_error:
+            logger.error(f"Failed to record error metrics: {metrics_error}")
+        
+        tracing_manager.end_trace(trace_id, 'failed', str(e))
+        
+        logger.error(
+            "Query execution failed",
+            trace_id=trace_id,
+            error=str(e),
+            framework=request_data.get('framework')
+        )
+        
+        return {
+            'answer': f"❌ Error: {str(e)}",
+            'trace_id': trace_id,
+            'framework': request_data.get('framework'),
+            'model': request_data.get('model'),
+            'vector_store': request_data.get('vector_store'),
+            'duration': duration,
+            'tokens_used': 0,
+            'cost_usd': 0.0,
+            'status': 'error',
+            'error': str(e)
+        }
     
     def _clean_response(self, text: str) -> str:
         """Clean and format the response"""
@@ -251,11 +391,11 @@ class EnhancedAgentService:
     
     def _estimate_input_tokens(self, text: str) -> int:
         """Estimate input tokens (rough approximation)"""
-        return max(1, len(text.split()) * 1.3)
+        return max(1, int(len(text.split()) * 1.3))
     
     def _estimate_output_tokens(self, text: str) -> int:
         """Estimate output tokens (rough approximation)"""
-        return max(1, len(text.split()) * 1.3)
+        return max(1, int(len(text.split()) * 1.3))
     
     def _calculate_cost(self, model: str, input_tokens: int, output_tokens: int) -> float:
         """Calculate cost based on model and token usage"""
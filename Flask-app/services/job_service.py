@@ -0,0 +1,309 @@
+from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass, field, asdict
+from prometheus_client import Counter, Gauge, Histogram
+from config.settings import settings
+import structlog
+import threading
+import json
+import time
+import uuid
+
+logger = structlog.get_logger()
+
+# Prometheus Metrics
+JOB_QUEUE_DEPTH = Gauge(
+    'docker_agent_job_queue_depth',
+    'Jobs accepted but not yet started'
+)
+
+JOBS_RUNNING = Gauge(
+    'docker_agent_jobs_running',
+    'Jobs currently executing'
+)
+
+JOB_WAIT_SECONDS = Histogram(
+    'docker_agent_job_wait_seconds',
+    'Time a job spent queued before a worker picked it up',
+    buckets=(0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+)
+
+JOB_RUN_SECONDS = Histogram(
+    'docker_agent_job_run_seconds',
+    'Time a worker spent executing a job',
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+)
+
+JOBS_TOTAL = Counter(
+    'docker_agent_jobs_total',
+    'Jobs by final status',
+    ['status']      # succeeded, failed, cancelled, rejected
+)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+TERMINAL_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobQueueFullError(Exception):
+    """Raised when the job queue is at JOB_MAX_QUEUED"""
+
+
+@dataclass
+class Job:
+    """One asynchronous agent query"""
+    job_id: str
+    request_data: Dict[str, Any]
+    status: str = QUEUED
+    created_at: Optional[float] = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data['request'] = data.pop('request_data')
+        return data
+
+
+class LocalJobBackend:
+    """Runs jobs on an in-process thread pool; job state lives in this process only"""
+
+    def __init__(self, run_job, max_workers: int = 4, max_queued: int = 100, result_ttl: float = 3600.0):
+        self.run_job = run_job
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs: Dict[str, Job] = {}
+        self._futures: Dict[str, Future] = {}
+        self._changed = threading.Condition()
+
+    def submit(self, request_data: Dict[str, Any]) -> Job:
+        with self._changed:
+            self._expire()
+            queued = sum(1 for job in self._jobs.values() if job.status == QUEUED)
+            if queued >= self.max_queued:
+                JOBS_TOTAL.labels(status='rejected').inc()
+                raise JobQueueFullError(f"Job queue is full ({self.max_queued} queued)")
+
+            job = Job(job_id=str(uuid.uuid4()), request_data=request_data)
+            self._jobs[job.job_id] = job
+            JOB_QUEUE_DEPTH.set(queued + 1)
+            self._futures[job.job_id] = self.executor.submit(self._execute, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._changed:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job that has not started yet"""
+        with self._changed:
+            job = self._jobs.get(job_id)
+            future = self._futures.get(job_id)
+            if job is None or job.status != QUEUED or future is None or not future.cancel():
+                return False
+            self._finish(job, CANCELLED)
+            return True
+
+    def wait_for_change(self, job_id: str, last_status: Optional[str], timeout: float) -> Optional[Job]:
+        """Block until the job's status differs from `last_status` or `timeout` passes"""
+        with self._changed:
+            self._changed.wait_for(
+                lambda: job_id not in self._jobs or self._jobs[job_id].status != last_status,
+                timeout=timeout
+            )
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._changed:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {'backend': 'thread', 'jobs': counts, 'max_queued': self.max_queued}
+
+    def _execute(self, job: Job):
+        with self._changed:
+            if job.status != QUEUED:
+                return
+            job.status = RUNNING
+            job.started_at = time.time()
+            self._update_gauges()
+            self._changed.notify_all()
+        JOB_WAIT_SECONDS.observe(job.started_at - job.created_at)
+
+        try:
+            result = self.run_job(job.request_data)
+            error = result.get('error') if result.get('status') == 'error' else None
+        except Exception as e:
+            result, error = None, str(e)
+            logger.error("Job execution failed", job_id=job.job_id, error=error)
+
+        with self._changed:
+            job.result = result
+            job.error = error
+            self._finish(job, FAILED if error else SUCCEEDED)
+        JOB_RUN_SECONDS.observe(job.finished_at - job.started_at)
+
+    def _finish(self, job: Job, status: str):
+        # Caller holds self._changed
+        job.status = status
+        job.finished_at = time.time()
+        self._futures.pop(job.job_id, None)
+        JOBS_TOTAL.labels(status=status).inc()
+        self._update_gauges()
+        self._changed.notify_all()
+
+    def _update_gauges(self):
+        JOB_QUEUE_DEPTH.set(sum(1 for job in self._jobs.values() if job.status == QUEUED))
+        JOBS_RUNNING.set(sum(1 for job in self._jobs.values() if job.status == RUNNING))
+
+    def _expire(self):
+        """Drop finished jobs older than result_ttl"""
+        cutoff = time.time() - self.result_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in TERMINAL_STATUSES and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+class CeleryJobBackend:
+    """Runs jobs on Celery workers with REDIS_URL as broker and result store.
+
+    Job state is shared by every Flask replica. Workers are started with
+    `celery -A services.job_service:celery_app worker`; wait and run time
+    are observed in the worker processes, and queue limits are the broker's.
+    """
+
+    STATES = {'PENDING': QUEUED, 'RECEIVED': QUEUED, 'STARTED': RUNNING,
+              'SUCCESS': SUCCEEDED, 'FAILURE': FAILED, 'REVOKED': CANCELLED}
+
+    # Celery states in which a task has not reached a worker and can still be revoked
+    CANCELLABLE_STATES = ('PENDING', 'RECEIVED')
+
+    def __init__(self, broker_url: str, result_ttl: float = 3600.0):
+        from celery import Celery
+        import redis
+
+        self.app = Celery('docker_agent_jobs', broker=broker_url, backend=broker_url)
+        self.app.conf.update(result_expires=int(result_ttl), result_extended=True, task_track_started=True)
+        self.task = self.app.task(name='docker_agent.run_job')(_run_celery_job)
+        # Celery reports unknown ids as PENDING, so submitted ids are recorded to tell them apart
+        self.redis = redis.Redis.from_url(broker_url)
+        self.result_ttl = result_ttl
+
+    def submit(self, request_data: Dict[str, Any]) -> Job:
+        job = Job(job_id=str(uuid.uuid4()), request_data=request_data)
+        self.redis.set(
+            self._job_key(job.job_id),
+            json.dumps({'request': request_data, 'created_at': job.created_at}),
+            ex=int(self.result_ttl)
+        )
+        self.task.apply_async(args=[request_data, job.created_at], task_id=job.job_id)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        async_result = self.app.AsyncResult(job_id)
+        record = self.redis.get(self._job_key(job_id))
+        if record is None and async_result.state == 'PENDING':
+            return None
+        record = json.loads(record) if record else {}
+
+        status = self.STATES.get(async_result.state, QUEUED)
+        result = async_result.result if status == SUCCEEDED else None
+        request_data, created_at = async_result.args or (record.get('request', {}), record.get('created_at'))
+        if result and result.get('status') == 'error':
+            status = FAILED
+        return Job(
+            job_id=job_id,
+            request_data=request_data,
+            status=status,
+            created_at=created_at,
+            finished_at=async_result.date_done.timestamp() if async_result.date_done else None,
+            result=result,
+            error=str(async_result.result) if async_result.state == 'FAILURE' else (result or {}).get('error')
+        )
+
+    def cancel(self, job_id: str) -> bool:
+        """Revoke a job that no worker has started yet"""
+        if self.get(job_id) is None or self.app.AsyncResult(job_id).state not in self.CANCELLABLE_STATES:
+            return False
+        self.app.control.revoke(job_id)
+        # Workers only record the revocation when they receive the task; record it now for pollers
+        self.app.backend.mark_as_revoked(job_id, reason='cancelled')
+        return True
+
+    def _job_key(self, job_id: str) -> str:
+        return f"docker_agent:job:{job_id}"
+
+    def wait_for_change(self, job_id: str, last_status: Optional[str], timeout: float) -> Optional[Job]:
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job.status != last_status or time.monotonic() >= deadline:
+                return job
+            time.sleep(0.5)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': 'celery'}
+
+
+def _run_celery_job(request_data: Dict[str, Any], enqueued_at: float) -> Dict[str, Any]:
+    from .agent_service import agent_service
+
+    started_at = time.time()
+    JOB_WAIT_SECONDS.observe(started_at - enqueued_at)
+    try:
+        return agent_service.execute_background_query(request_data)
+    finally:
+        JOB_RUN_SECONDS.observe(time.time() - started_at)
+
+
+class JobService:
+    """Accepts agent queries as jobs and lets clients poll or subscribe for the result"""
+
+    def __init__(self, backend: str = 'thread'):
+        if backend == 'celery':
+            self.backend = CeleryJobBackend(settings.REDIS_URL, settings.JOB_RESULT_TTL)
+        elif backend == 'thread':
+            from .agent_service import agent_service
+            self.backend = LocalJobBackend(
+                agent_service.execute_background_query,
+                max_workers=settings.JOB_MAX_WORKERS,
+                max_queued=settings.JOB_MAX_QUEUED,
+                result_ttl=settings.JOB_RESULT_TTL
+            )
+        else:
+            raise ValueError(f"Unknown job backend '{backend}'")
+
+    def submit(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
+        job = self.backend.submit(request_data)
+        logger.info("Job submitted", job_id=job.job_id, framework=request_data.get('framework'))
+        return job.to_dict()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.backend.get(job_id)
+        return job.to_dict() if job else None
+
+    def cancel(self, job_id: str) -> bool:
+        return self.backend.cancel(job_id)
+
+    def wait_for_change(self, job_id: str, last_status: Optional[str], timeout: float = 15.0) -> Optional[Dict[str, Any]]:
+        job = self.backend.wait_for_change(job_id, last_status, timeout)
+        return job.to_dict() if job else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self.backend.stats()
+
+# Global job service instance
+job_service = JobService(settings.JOB_BACKEND)
+
+# Celery entry point for `celery -A services.job_service:celery_app worker`
+celery_app = job_service.backend.app if settings.JOB_BACKEND == 'celery' else None
@@ -0,0 +1,204 @@
+import asyncio
+import atexit
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+import aiohttp
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry
+import structlog
+
+logger = structlog.get_logger()
+
+# Responses worth asking again for: Langtrace has not ingested the trace yet, or is overloaded
+RETRY_STATUSES = {404, 408, 429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Token bucket shared by the enrichment workers of one event loop"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class LangtraceEnricher:
+    """Fetches Langtrace traces on a background event loop, after the request has been answered.
+
+    `submit` only hands the trace id to the loop's bounded queue. Workers
+    wait `delay` seconds (Langtrace ingests traces asynchronously), then
+    GET {api_url}/v1/traces/{trace_id} through one pooled aiohttp session,
+    at most `rate` requests per second. 404, 429, 5xx and network errors
+    are retried with exponential backoff and jitter up to `max_attempts`.
+    The decoded JSON goes to `on_trace(trace_id, data)`, which runs in the
+    default executor so it may block, and returns whether the data was used.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        on_trace: Callable[[str, Dict[str, Any]], bool],
+        registry: CollectorRegistry,
+        api_url: str = "https://api.langtrace.ai",
+        delay: float = 5.0,
+        concurrency: int = 4,
+        rate: float = 5.0,
+        max_attempts: int = 4,
+        timeout: float = 10.0,
+        max_queue: int = 1000
+    ):
+        self.api_key = api_key
+        self.on_trace = on_trace
+        self.api_url = api_url.rstrip('/')
+        self.delay = delay
+        self.concurrency = concurrency
+        self.rate = rate
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.max_queue = max_queue
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.thread: Optional[threading.Thread] = None
+        self.pid: Optional[int] = None
+        self.started = threading.Event()
+        self.lock = threading.Lock()
+
+        self.prom_enrichments = Counter(
+            'langtrace_enrichments_total',
+            'Langtrace enrichment attempts by final outcome',
+            ['outcome'],        # enriched, unusable, not_found, failed, dropped
+            registry=registry
+        )
+        self.prom_request_latency = Histogram(
+            'langtrace_request_seconds',
+            'Latency of Langtrace API requests',
+            registry=registry
+        )
+        self.prom_queue_depth = Gauge(
+            'langtrace_enrichment_queue_depth',
+            'Trace ids waiting to be fetched from Langtrace',
+            registry=registry
+        )
+        atexit.register(self.close)
+
+    def submit(self, trace_id: str):
+        """Queue a trace for enrichment; never blocks the caller"""
+        self._ensure_loop()
+        self.loop.call_soon_threadsafe(self._offer, trace_id, time.monotonic() + self.delay)
+
+    def _offer(self, trace_id: str, not_before: float):
+        # Runs on the loop thread
+        try:
+            self.queue.put_nowait((trace_id, not_before))
+        except asyncio.QueueFull:
+            self.prom_enrichments.labels(outcome='dropped').inc()
+            logger.warning("Langtrace enrichment queue full; dropped trace", trace_id=trace_id)
+        self.prom_queue_depth.set(self.queue.qsize())
+
+    def _ensure_loop(self):
+        with self.lock:
+            # A forked worker inherits the loop object but not the thread running it
+            if self.thread is not None and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.started.clear()
+            self.thread = threading.Thread(target=self._run, name='langtrace-enricher', daemon=True)
+            self.thread.start()
+            self.started.wait()
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self.started.set()
+        self.loop.run_until_complete(self._serve())
+
+    async def _serve(self):
+        limiter = RateLimiter(self.rate)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={
+                'Authorization': f'Bearer {self.api_key}',
+                'Content-Type': 'application/json'
+            }
+        ) as session:
+            workers = [asyncio.create_task(self._worker(session, limiter)) for _ in range(self.concurrency)]
+            await asyncio.gather(*workers)
+
+    async def _worker(self, session: aiohttp.ClientSession, limiter: RateLimiter):
+        while True:
+            trace_id, not_before = await self.queue.get()
+            if trace_id is None:
+                return
+            self.prom_queue_depth.set(self.queue.qsize())
+            wait = not_before - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                await self._enrich(session, limiter, trace_id)
+            except Exception as e:
+                self.prom_enrichments.labels(outcome='failed').inc()
+                logger.error("Langtrace enrichment failed", trace_id=trace_id, error=str(e))
+
+    async def _enrich(self, session: aiohttp.ClientSession, limiter: RateLimiter, trace_id: str):
+        status = None
+        for attempt in range(1, self.max_attempts + 1):
+            await limiter.acquire()
+            start = time.perf_counter()
+            try:
+                async with session.get(f"{self.api_url}/v1/traces/{trace_id}") as response:
+                    status = response.status
+                    data = await response.json(content_type=None) if status == 200 else None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status = None
+                logger.warning(
+                    "Langtrace request error", trace_id=trace_id, attempt=attempt, error=str(e) or type(e).__name__
+                )
+            finally:
+                self.prom_request_latency.observe(time.perf_counter() - start)
+
+            if status == 200:
+                applied = await asyncio.get_running_loop().run_in_executor(None, self.on_trace, trace_id, data)
+                self.prom_enrichments.labels(outcome='enriched' if applied else 'unusable').inc()
+                return
+            if status is not None and status not in RETRY_STATUSES:
+                break
+            if attempt < self.max_attempts:
+                # Exponential backoff with full jitter, starting around the ingestion delay
+                await asyncio.sleep(random.uniform(0, max(self.delay, 1.0) * 2 ** (attempt - 1)))
+
+        outcome = 'not_found' if status == 404 else 'failed'
+        self.prom_enrichments.labels(outcome=outcome).inc()
+        logger.warning("Langtrace trace not enriched", trace_id=trace_id, status=status, outcome=outcome)
+
+    def close(self):
+        """Stop the workers; trace ids still queued are not fetched"""
+        if self.thread is None or not self.thread.is_alive() or self.pid != os.getpid():
+            return
+
+        def stop():
+            # Jump the queue so workers stop after their current trace
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            for _ in range(self.concurrency):
+                self.queue.put_nowait((None, 0.0))
+
+        self.loop.call_soon_threadsafe(stop)
+        self.thread.join(timeout=self.timeout)
@@ -2,13 +2,18 @@ import sqlite3
 import time
 import logging
 import json
+import os
+import queue
+import threading
+import atexit
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
 from dataclasses import dataclass
 from threading import Lock
-import requests
 from prometheus_client import Counter, Histogram, Gauge, CollectorRegistry, generate_latest
 import structlog
+from config.settings import settings
+from .langtrace_enricher import LangtraceEnricher
 
 logger = structlog.get_logger()
 
@@ -28,11 +33,182 @@ class MetricData:
     latency_ms: float
     status: str
     error_message: Optional[str] = None
+    cached_tokens: int = 0
+    llm_calls: Optional[int] = None
+    token_source: str = 'estimated'     # 'provider' when the tokens came from reported usage
+    comparison_id: Optional[str] = None  # Shared by all rows of one compare-mode run
+
+INSERT_METRICS_SQL = """
+    INSERT INTO metrics (
+        timestamp, trace_id, framework, model, vector_store,
+        input_tokens, output_tokens, total_tokens,
+        input_cost, output_cost, total_cost,
+        latency_ms, status, error_message,
+        cached_tokens, llm_calls, token_source, comparison_id
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Marks the end of a batch so flush() does not wait out the flush interval
+_FLUSH = object()
+
+class MetricsWriter:
+    """Background thread that inserts metric rows over one long-lived SQLite connection.
+
+    Rows are queued by the request threads and written with executemany in
+    one transaction per batch, once `batch_size` rows are waiting or the
+    oldest has waited `flush_interval` seconds. The connection uses WAL with
+    synchronous=NORMAL, so a commit does not fsync and readers are never
+    blocked. A full queue drops rows rather than blocking requests.
+    """
+    
+    def __init__(
+        self,
+        db_path: str,
+        registry: CollectorRegistry,
+        batch_size: int = 100,
+        flush_interval: float = 0.5,
+        max_queue: int = 10000
+    ):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: 'queue.Queue' = queue.Queue(maxsize=max_queue)
+        self.thread: Optional[threading.Thread] = None
+        self.pid: Optional[int] = None
+        self.closed = False
+        # Rows queued and rows committed so far; flush() waits for the second to catch up
+        self.enqueued = 0
+        self.written = 0
+        self.condition = threading.Condition()
+        
+        self.prom_write_latency = Histogram(
+            'metrics_db_write_seconds',
+            'Time to insert and commit one batch of metric rows',
+            buckets=[0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0],
+            registry=registry
+        )
+        self.prom_batch_size = Histogram(
+            'metrics_db_write_batch_size',
+            'Metric rows per write transaction',
+            buckets=[1, 5, 10, 25, 50, 100, 250, 500],
+            registry=registry
+        )
+        self.prom_queue_depth = Gauge(
+            'metrics_db_write_queue_depth',
+            'Metric rows waiting to be written',
+            registry=registry
+        )
+        self.prom_dropped = Counter(
+            'metrics_db_rows_dropped_total',
+            'Metric rows dropped because the write queue was full',
+            registry=registry
+        )
+        atexit.register(self.close)
+        
+    def enqueue(self, row: tuple):
+        with self.condition:
+            self._ensure_thread()
+            try:
+                self.queue.put_nowait(row)
+            except queue.Full:
+                self.prom_dropped.inc()
+                logger.warning("Metrics write queue full; dropped a row")
+                return
+            self.enqueued += 1
+        self.prom_queue_depth.set(self.queue.qsize())
+        
+    def _ensure_thread(self):
+        # Caller holds self.condition; a forked worker inherits the queue but not the thread
+        if self.thread is not None and self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        self.thread = threading.Thread(target=self._run, name='metrics-writer', daemon=True)
+        self.thread.start()
+        
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=5.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+        
+    def _run(self):
+        conn = self._connect()
+        try:
+            while True:
+                batch = self._next_batch()
+                if batch:
+                    self._write(conn, batch)
+                elif self.closed and self.queue.empty():
+                    return
+        finally:
+            conn.close()
+            
+    def _next_batch(self) -> List[tuple]:
+        try:
+            first = self.queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+        batch = [] if first is _FLUSH else [first]
+        deadline = time.monotonic() + self.flush_interval
+        while first is not _FLUSH and len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                row = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if row is _FLUSH:
+                break
+            batch.append(row)
+        return batch
+        
+    def _write(self, conn: sqlite3.Connection, batch: List[tuple]):
+        start = time.perf_counter()
+        try:
+            with conn:
+                conn.executemany(INSERT_METRICS_SQL, batch)
+        except sqlite3.Error as e:
+            logger.error("Failed to write metric rows", rows=len(batch), error=str(e))
+        self.prom_write_latency.observe(time.perf_counter() - start)
+        self.prom_batch_size.observe(len(batch))
+        self.prom_queue_depth.set(self.queue.qsize())
+        with self.condition:
+            self.written += len(batch)
+            self.condition.notify_all()
+            
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every row queued before this call is committed; False on timeout"""
+        with self.condition:
+            target = self.enqueued
+            if self.written >= target or self.thread is None or not self.thread.is_alive():
+                return self.written >= target
+        try:
+            self.queue.put(_FLUSH, timeout=timeout)
+        except queue.Full:
+            return False
+        with self.condition:
+            return self.condition.wait_for(lambda: self.written >= target, timeout)
+            
+    def close(self):
+        """Write what is queued and stop the thread"""
+        self.closed = True
+        self.flush()
+        if self.thread is not None:
+            self.thread.join(timeout=self.flush_interval * 2)
 
 class MetricsCollector:
     """Real-time metrics collector with SQLite persistence and Prometheus export"""
     
-    def __init__(self, db_path: str = "metrics.db", langtrace_api_key: Optional[str] = None):
+    def __init__(
+        self,
+        db_path: str = "metrics.db",
+        langtrace_api_key: Optional[str] = None,
+        write_batch_size: int = 100,
+        write_flush_interval: float = 0.5,
+        write_max_queue: int = 10000,
+        langtrace_options: Optional[Dict[str, Any]] = None
+    ):
         self.db_path = db_path
         self.langtrace_api_key = langtrace_api_key
         self.lock = Lock()
@@ -55,9 +231,40 @@ class MetricsCollector:
         self.registry = CollectorRegistry()
         self._init_prometheus_metrics()
         
+        # Inserts happen on the writer's thread, off the request path
+        self.writer = MetricsWriter(
+            db_path, self.registry, write_batch_size, write_flush_interval, write_max_queue
+        )
+        
+        # Langtrace data arrives after the request; the row is corrected when it does
+        self.enricher = LangtraceEnricher(
+            langtrace_api_key, self.apply_langtrace_trace, self.registry, **(langtrace_options or {})
+        ) if langtrace_api_key else None
+        
+    @classmethod
+    def from_settings(cls) -> 'MetricsCollector':
+        return cls(
+            db_path=settings.METRICS_DB_PATH,
+            langtrace_api_key=settings.LANGTRACE_API_KEY if settings.LANGTRACE_ENRICH_ENABLED else None,
+            write_batch_size=settings.METRICS_WRITE_BATCH_SIZE,
+            write_flush_interval=settings.METRICS_WRITE_FLUSH_INTERVAL_MS / 1000,
+            write_max_queue=settings.METRICS_WRITE_MAX_QUEUE,
+            langtrace_options={
+                'api_url': settings.LANGTRACE_API_URL,
+                'delay': settings.LANGTRACE_ENRICH_DELAY,
+                'concurrency': settings.LANGTRACE_ENRICH_CONCURRENCY,
+                'rate': settings.LANGTRACE_ENRICH_RATE,
+                'max_attempts': settings.LANGTRACE_ENRICH_MAX_ATTEMPTS,
+                'timeout': settings.LANGTRACE_ENRICH_TIMEOUT,
+                'max_queue': settings.LANGTRACE_ENRICH_MAX_QUEUE
+            }
+        )
+        
     def _init_database(self):
         """Initialize SQLite database with metrics table"""
         with sqlite3.connect(self.db_path) as conn:
+            # WAL is a property of the database file; readers then never wait for the writer
+            conn.execute("PRAGMA journal_mode=WAL")
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS metrics (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -77,7 +284,23 @@ class MetricsCollector:
                     error_message TEXT
                 )
             """)
+            self._migrate_database(conn)
             conn.commit()
+    
+    def _migrate_database(self, conn: sqlite3.Connection):
+        """Add columns introduced after the metrics table was first created"""
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(metrics)")}
+        columns = {
+            'cached_tokens': "INTEGER NOT NULL DEFAULT 0",
+            'llm_calls': "INTEGER",
+            'token_source': "TEXT NOT NULL DEFAULT 'estimated'",
+            'comparison_id': "TEXT"
+        }
+        for name, definition in columns.items():
+            if name not in existing:
+                conn.execute(f"ALTER TABLE metrics ADD COLUMN {name} {definition}")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_metrics_comparison_id ON metrics(comparison_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_metrics_trace_id ON metrics(trace_id)")
             
     def _init_prometheus_metrics(self):
         """Initialize Prometheus metrics"""
@@ -95,6 +318,13 @@ class MetricsCollector:
             registry=self.registry
         )
         
+        self.prom_llm_calls = Counter(
+            'llm_calls_total',
+            'LLM calls made inside agent loops',
+            ['framework', 'model'],
+            registry=self.registry
+        )
+        
         self.prom_cost_total = Counter(
             'llm_cost_total',
             'Total LLM cost in USD',
@@ -115,33 +345,67 @@ class MetricsCollector:
             registry=self.registry
         )
         
-    def collect_from_langtrace(self, trace_id: str) -> Optional[MetricData]:
-        """Collect metrics from Langtrace API"""
-        if not self.langtrace_api_key:
-            return None
-            
-        try:
-            headers = {
-                'Authorization': f'Bearer {self.langtrace_api_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            response = requests.get(
-                f'https://api.langtrace.ai/v1/traces/{trace_id}',
-                headers=headers,
-                timeout=10
-            )
+    def apply_langtrace_trace(self, trace_id: str, data: Dict[str, Any]) -> bool:
+        """Replace a stored row's estimated tokens and costs with Langtrace's.
+
+        Called by the enricher off the request path. Prometheus counters can
+        only grow, so they take the increase; a lower Langtrace figure is
+        corrected in SQLite only.
+        """
+        metrics = self._parse_langtrace_data(data)
+        if metrics is None:
+            return False
+        # The row may still be waiting in the writer's queue
+        self.writer.flush()
+        
+        with self.lock:
+            with sqlite3.connect(self.db_path, timeout=5.0) as conn:
+                conn.row_factory = sqlite3.Row
+                row = conn.execute(
+                    """
+                    SELECT framework, model, input_tokens, output_tokens, input_cost, output_cost
+                    FROM metrics WHERE trace_id = ? ORDER BY id DESC LIMIT 1
+                    """,
+                    (trace_id,)
+                ).fetchone()
+                if row is None:
+                    logger.warning("No metrics row to enrich", trace_id=trace_id)
+                    return False
+                conn.execute(
+                    """
+                    UPDATE metrics SET
+                        input_tokens = ?, output_tokens = ?, total_tokens = ?,
+                        input_cost = ?, output_cost = ?, total_cost = ?,
+                        token_source = 'langtrace'
+                    WHERE trace_id = ?
+                    """,
+                    (
+                        metrics.input_tokens,
+                        metrics.output_tokens,
+                        metrics.total_tokens,
+                        metrics.input_cost,
+                        metrics.output_cost,
+                        metrics.total_cost,
+                        trace_id
+                    )
+                )
             
-            if response.status_code == 200:
-                data = response.json()
-                return self._parse_langtrace_data(data)
-            else:
-                logger.warning(f"Langtrace API returned {response.status_code}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Failed to collect from Langtrace: {e}")
-            return None
+            labels = {'framework': row['framework'], 'model': row['model']}
+            for token_type, before, after in (
+                ('input', row['input_tokens'], metrics.input_tokens),
+                ('output', row['output_tokens'], metrics.output_tokens)
+            ):
+                if after > before:
+                    self.prom_token_count.labels(**labels, token_type=token_type).inc(after - before)
+            for cost_type, before, after in (
+                ('input', row['input_cost'], metrics.input_cost),
+                ('output', row['output_cost'], metrics.output_cost)
+            ):
+                if after > before:
+                    self.prom_cost_total.labels(**labels, cost_type=cost_type).inc(after - before)
+        
+        logger.info("Enriched metrics from Langtrace", trace_id=trace_id)
+        return True
             
     def _parse_langtrace_data(self, data: Dict[str, Any]) -> Optional[MetricData]:
         """Parse Langtrace API response into MetricData"""
@@ -189,12 +453,17 @@ class MetricsCollector:
             model = trace_data.get('model', 'gpt-4o-mini')
             pricing = self.token_costs.get(model, self.token_costs['gpt-4o-mini'])
             
-            # Estimate tokens if not provided
+            # Estimate tokens only if the provider usage is missing (absent or None)
             query = trace_data.get('query', '')
             response = trace_data.get('response', '')
             
-            input_tokens = trace_data.get('input_tokens', len(query.split()) * 1.3)  # Rough estimation
-            output_tokens = trace_data.get('output_tokens', len(response.split()) * 1.3)
+            input_tokens = trace_data.get('input_tokens')
+            output_tokens = trace_data.get('output_tokens')
+            token_source = trace_data.get('token_source', 'provider')
+            if input_tokens is None or output_tokens is None:
+                input_tokens = len(query.split()) * 1.3  # Rough estimation
+                output_tokens = len(response.split()) * 1.3
+                token_source = 'estimated'
             
             input_cost = (input_tokens / 1000) * pricing['input']
             output_cost = (output_tokens / 1000) * pricing['output']
@@ -213,7 +482,11 @@ class MetricsCollector:
                 total_cost=input_cost + output_cost,
                 latency_ms=trace_data.get('duration', 0) * 1000,
                 status=trace_data.get('status', 'completed'),
-                error_message=trace_data.get('error')
+                error_message=trace_data.get('error'),
+                cached_tokens=int(trace_data.get('cached_tokens') or 0),
+                llm_calls=trace_data.get('llm_calls'),
+                token_source=token_source,
+                comparison_id=trace_data.get('comparison_id')
             )
             
         except Exception as e:
@@ -237,55 +510,43 @@ class MetricsCollector:
             )
             
     def record_metrics(self, trace_data: Dict[str, Any]) -> MetricData:
-        """Record metrics with Langtrace fallback to manual calculation"""
+        """Record manually calculated metrics now; Langtrace data, if configured, is backfilled later"""
+        trace_id = trace_data.get('trace_id', '')
+        metrics = self.collect_manual_metrics(trace_data)
+        
         with self.lock:
-            trace_id = trace_data.get('trace_id', '')
-            
-            # Try Langtrace first
-            metrics = self.collect_from_langtrace(trace_id)
-            
-            # Fallback to manual calculation
-            if metrics is None:
-                metrics = self.collect_manual_metrics(trace_data)
-                logger.info(f"Using manual metrics calculation for trace {trace_id}")
-            else:
-                logger.info(f"Collected metrics from Langtrace for trace {trace_id}")
-            
             # Store in database
             self._store_metrics(metrics)
             
             # Update Prometheus metrics
             self._update_prometheus_metrics(metrics)
-            
-            return metrics
+        
+        if self.enricher is not None and trace_id:
+            self.enricher.submit(trace_id)
+        return metrics
             
     def _store_metrics(self, metrics: MetricData):
-        """Store metrics in SQLite database"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                INSERT INTO metrics (
-                    timestamp, trace_id, framework, model, vector_store,
-                    input_tokens, output_tokens, total_tokens,
-                    input_cost, output_cost, total_cost,
-                    latency_ms, status, error_message
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                metrics.timestamp.isoformat(),
-                metrics.trace_id,
-                metrics.framework,
-                metrics.model,
-                metrics.vector_store,
-                metrics.input_tokens,
-                metrics.output_tokens,
-                metrics.total_tokens,
-                metrics.input_cost,
-                metrics.output_cost,
-                metrics.total_cost,
-                metrics.latency_ms,
-                metrics.status,
-                metrics.error_message
-            ))
-            conn.commit()
+        """Queue the metrics row for the writer thread"""
+        self.writer.enqueue((
+            metrics.timestamp.isoformat(),
+            metrics.trace_id,
+            metrics.framework,
+            metrics.model,
+            metrics.vector_store,
+            metrics.input_tokens,
+            metrics.output_tokens,
+            metrics.total_tokens,
+            metrics.input_cost,
+            metrics.output_cost,
+            metrics.total_cost,
+            metrics.latency_ms,
+            metrics.status,
+            metrics.error_message,
+            metrics.cached_tokens,
+            metrics.llm_calls,
+            metrics.token_source,
+            metrics.comparison_id
+        ))
             
     def _update_prometheus_metrics(self, metrics: MetricData):
         """Update Prometheus metrics"""
@@ -312,6 +573,16 @@ class MetricsCollector:
             token_type='output'
         ).inc(metrics.output_tokens)
         
+        self.prom_token_count.labels(
+            **{k: v for k, v in labels.items() if k != 'vector_store'},
+            token_type='cached'
+        ).inc(metrics.cached_tokens)
+        
+        if metrics.llm_calls:
+            self.prom_llm_calls.labels(
+                **{k: v for k, v in labels.items() if k != 'vector_store'}
+            ).inc(metrics.llm_calls)
+        
         # Costs
         self.prom_cost_total.labels(
             **{k: v for k, v in labels.items() if k != 'vector_store'},
@@ -471,6 +742,18 @@ class MetricsCollector:
             'request_counts': [time_buckets[key]['request_count'] for key in sorted_keys]
         }
         
+    def get_comparison(self, comparison_id: str) -> List[Dict[str, Any]]:
+        """All metric rows recorded under one comparison id"""
+        # The comparison has just finished; make sure its rows are committed
+        self.writer.flush()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute(
+                "SELECT * FROM metrics WHERE comparison_id = ? ORDER BY latency_ms",
+                (comparison_id,)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+        
     def get_prometheus_metrics(self) -> str:
         """Get Prometheus formatted metrics"""
         return generate_latest(self.registry).decode('utf-8')
@@ -491,4 +774,4 @@ class MetricsCollector:
         return deleted_count
 
 # Global metrics collector instance
-metrics_collector = MetricsCollector()
\ No newline at end of file
+metrics_collector = MetricsCollector.from_settings()
\ No newline at end of file
@@ -0,0 +1,202 @@
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, timedelta
+from core.tracing import tracing_manager, build_waterfall
+from config.settings import settings
+import structlog
+
+logger = structlog.get_logger()
+
+ROOT = 'request'
+
+
+def percentile(values: List[Tuple[float, float]], pct: float) -> float:
+    """Weighted nearest-rank percentile of unsorted (value, weight) pairs"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = pct / 100 * sum(weight for _, weight in ordered)
+    seen = 0.0
+    for value, weight in ordered:
+        seen += weight
+        if seen >= rank:
+            return value
+    return ordered[-1][0]
+
+
+def stage_times(trace: Dict[str, Any]) -> Optional[Dict[str, float]]:
+    """Time in ms per leaf stage path ("request;rag_api_call;rag_api;llm;gpt-4o"), or None without a waterfall"""
+    waterfall = build_waterfall(trace)
+    if waterfall is None:
+        return None
+
+    times: Dict[str, float] = {}
+
+    def add(path: str, ms: float):
+        if ms > 0:
+            times[path] = times.get(path, 0.0) + ms
+
+    server_ms = 0.0
+    for row in waterfall['rows']:
+        if row['kind'] == 'flask':
+            add(f"{ROOT};flask", row['duration_ms'])
+        elif row['kind'] == 'network':
+            add(f"{ROOT};rag_api_call;network", row['duration_ms'])
+        elif 'stage' in row:
+            add(f"{ROOT};rag_api_call;rag_api;{row['kind']};{row['stage']}:{row['name']}", row['duration_ms'])
+            server_ms += row['duration_ms']
+
+    # Rag-API time outside any recorded stage (request parsing, agent loop bookkeeping)
+    call = next(row for row in waterfall['rows'] if row['kind'] == 'adapter')
+    network_ms = waterfall['breakdown_ms']['network']
+    add(f"{ROOT};rag_api_call;rag_api;unattributed", call['duration_ms'] - network_ms - server_ms)
+    return times
+
+
+class TraceAnalysisService:
+    """Aggregates stage time across many traces: icicle tree, critical path and window comparison.
+
+    The trace store keeps a tail-biased sample (every failed and slow trace,
+    a fraction of the rest), so each trace counts with its 'sample_weight'
+    and the statistics estimate all traffic, not just the kept traces.
+    """
+
+    def __init__(self, max_traces: int = 5000, regression_threshold: float = 20.0):
+        self.max_traces = max_traces
+        self.regression_threshold = regression_threshold
+
+    def analyze(
+        self,
+        minutes: int = 60,
+        filters: Optional[Dict[str, str]] = None,
+        compare: bool = False
+    ) -> Dict[str, Any]:
+        """Analyse traces from the last `minutes`; with `compare`, also the `minutes` before that.
+
+        Raises ValueError for a non-positive window or an unknown filter.
+        """
+        if minutes <= 0:
+            raise ValueError("minutes must be positive")
+        until = datetime.utcnow()
+        since = until - timedelta(minutes=minutes)
+        current = self._window(since, until, filters)
+        analysis = {
+            'window': current['window'],
+            'flame': current['flame'],
+            'critical_path': current['critical_path'],
+            'stages': current['stages']
+        }
+        if compare:
+            baseline = self._window(since - timedelta(minutes=minutes), since, filters)
+            analysis['comparison'] = {
+                'baseline': baseline['window'],
+                'stages': self._compare(current['stages'], baseline['stages'])
+            }
+        return analysis
+
+    def _window(self, since: datetime, until: datetime, filters: Optional[Dict[str, str]]) -> Dict[str, Any]:
+        traces = tracing_manager.scan_traces(since.isoformat(), until.isoformat(), filters, self.max_traces)
+
+        # Per-path (time, weight) of each analysed trace that spent time there
+        samples: Dict[str, List[Tuple[float, float]]] = {}
+        analysed = 0
+        weight_sum = 0.0
+        for trace in traces:
+            times = stage_times(trace)
+            if times is None:
+                continue
+            weight = trace.get('sample_weight', 1.0)
+            analysed += 1
+            weight_sum += weight
+            totals: Dict[str, float] = {}
+            for path, ms in times.items():
+                # Every ancestor of a leaf gets its time as well, so inner nodes are totals
+                parts = path.split(';')
+                for depth in range(1, len(parts) + 1):
+                    prefix = ';'.join(parts[:depth])
+                    totals[prefix] = totals.get(prefix, 0.0) + ms
+            for path, ms in totals.items():
+                samples.setdefault(path, []).append((ms, weight))
+
+        stages = []
+        for path, values in samples.items():
+            path_weight = sum(weight for _, weight in values)
+            total = sum(ms * weight for ms, weight in values)
+            stages.append({
+                'path': path,
+                'count': len(values),
+                'share': round(path_weight / weight_sum, 3),
+                # Estimated over all traffic in the window, sampled-out traces included
+                'total_ms': round(total, 2),
+                'mean_ms': round(total / path_weight, 2),
+                'p50_ms': round(percentile(values, 50), 2),
+                'p95_ms': round(percentile(values, 95), 2)
+            })
+        stages.sort(key=lambda stage: stage['total_ms'], reverse=True)
+
+        flame = self._tree(stages)
+        return {
+            'window': {
+                'since': since.isoformat(),
+                'until': until.isoformat(),
+                'traces': len(traces),
+                'analysed': analysed,
+                'estimated_traces': round(weight_sum),
+                'truncated': len(traces) >= self.max_traces
+            },
+            'flame': flame,
+            'critical_path': self._mark_critical_path(flame),
+            'stages': stages
+        }
+
+    @staticmethod
+    def _tree(stages: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        nodes = {stage['path']: {**stage, 'name': stage['path'].rsplit(';', 1)[-1], 'children': []} for stage in stages}
+        for path, node in nodes.items():
+            if ';' in path:
+                nodes[path.rsplit(';', 1)[0]]['children'].append(node)
+        for node in nodes.values():
+            node['children'].sort(key=lambda child: child['total_ms'], reverse=True)
+        return nodes.get(ROOT)
+
+    @staticmethod
+    def _mark_critical_path(flame: Optional[Dict[str, Any]]) -> List[str]:
+        """The heaviest root-to-leaf path: at every level, the child with the most total time.
+
+        Stages within a request run one after another, so this is where
+        cutting time shortens requests the most.
+        """
+        path = []
+        node = flame
+        while node is not None:
+            node['critical'] = True
+            path.append(node['path'])
+            node = node['children'][0] if node['children'] else None
+        return path
+
+    def _compare(self, current: List[Dict[str, Any]], baseline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        before = {stage['path']: stage for stage in baseline}
+        rows = []
+        for stage in current:
+            previous = before.get(stage['path'])
+            row = {
+                'path': stage['path'],
+                'p50_ms': stage['p50_ms'],
+                'p95_ms': stage['p95_ms'],
+                'baseline_p50_ms': previous['p50_ms'] if previous else None,
+                'baseline_p95_ms': previous['p95_ms'] if previous else None,
+                'p95_change_pct': None,
+                'regression': False
+            }
+            if previous and previous['p95_ms'] > 0:
+                change = (stage['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100
+                row['p95_change_pct'] = round(change, 1)
+                row['regression'] = change >= self.regression_threshold
+            rows.append(row)
+        rows.sort(key=lambda row: row['p95_change_pct'] if row['p95_change_pct'] is not None else float('-inf'), reverse=True)
+        return rows
+
+# Global trace analysis service instance
+trace_analysis_service = TraceAnalysisService(
+    settings.TRACE_ANALYSIS_MAX_TRACES,
+    settings.TRACE_ANALYSIS_REGRESSION_PCT
+)
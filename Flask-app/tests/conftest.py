@@ -0,0 +1,9 @@
+import os
+
+# Settings are read when config.settings is first imported; keep the test run
+# off the network and the working directory
+os.environ.setdefault('OTEL_ENABLED', 'false')
+os.environ.setdefault('TRACE_STORE', 'none')
+os.environ.setdefault('LOG_QUEUE_ENABLED', 'false')
+os.environ.setdefault('LANGTRACE_ENRICH_ENABLED', 'false')
+os.environ.setdefault('METRICS_DB_PATH', ':memory:')
@@ -0,0 +1,101 @@
+import pytest
+from core.admission import AdmissionRejected
+from services import agent_service as agent_service_module
+from services.agent_service import agent_service
+
+
+class FailingAdapter:
+    """Adapter that reports a Rag-API failure the way RagApiAdapter._error does"""
+
+    def get_name(self) -> str:
+        return 'failing'
+
+    def create_agent(self, config):
+        return object()
+
+    def execute_query(self, agent, query):
+        return {
+            'answer': "Error: 503 Server Error: Service Unavailable",
+            'duration': 0.01,
+            'tokens_used': 0,
+            'resilience': {},
+            'status': 'error',
+            'error': "503 Server Error: Service Unavailable"
+        }
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    rows = []
+    monkeypatch.setattr(agent_service_module.registry, 'get_framework', lambda name: FailingAdapter())
+    monkeypatch.setattr(agent_service_module.enhanced_metrics_service, 'record_trace_metrics', rows.append)
+    return rows
+
+
+def test_adapter_error_is_reported_as_failed(recorded):
+    result = agent_service.execute_query({
+        'framework': 'failing',
+        'model': 'gpt-4o-mini',
+        'vector_store': 'Faiss',
+        'query': 'How do I list containers?',
+        'cache': False
+    })
+
+    assert result['status'] == 'error'
+    assert result['error'] == "503 Server Error: Service Unavailable"
+    assert result['tokens_used'] == 0
+
+    [row] = recorded
+    assert row['status'] == 'failed'
+    assert row['error'] == "503 Server Error: Service Unavailable"
+    assert (row['input_tokens'], row['output_tokens'], row['tokens_used']) == (0, 0, 0)
+
+
+def test_cache_hit_skips_admission(recorded, monkeypatch):
+    def admit(framework):
+        raise AssertionError("cache hits must not take an admission slot")
+
+    entry = {'answer': 'Use docker ps -a', 'tokens_used': 412, 'llm_calls': 2, 'cached_at': 1000.0}
+    monkeypatch.setattr(agent_service_module.settings, 'RESPONSE_CACHE_ENABLED', True)
+    monkeypatch.setattr(agent_service_module.response_cache, 'get', lambda key: (entry, 'l1'))
+    monkeypatch.setattr(agent_service_module.admission_controller, 'admit', admit)
+
+    result = agent_service.execute_query({
+        'framework': 'langgraph',
+        'model': 'gpt-4o-mini',
+        'vector_store': 'Faiss',
+        'query': 'How do I list containers?'
+    })
+
+    assert (result['status'], result['cache'], result['answer']) == ('success', 'l1', 'Use docker ps -a')
+    [row] = recorded
+    assert row['tokens_used'] == 0
+
+
+def test_background_query_retries_after_being_shed(recorded, monkeypatch):
+    calls = []
+
+    def execute_query(request_data):
+        calls.append(request_data)
+        if len(calls) == 1:
+            raise AdmissionRejected("Service busy", 503, retry_after=2)
+        return {'status': 'success'}
+
+    sleeps = []
+    monkeypatch.setattr(agent_service, 'execute_query', execute_query)
+    monkeypatch.setattr(agent_service_module.time, 'sleep', sleeps.append)
+
+    assert agent_service.execute_background_query({'framework': 'langgraph'}) == {'status': 'success'}
+    assert len(calls) == 2
+    assert sleeps == [2]
+
+
+def test_background_query_gives_up_after_max_wait(monkeypatch):
+    def execute_query(request_data):
+        raise AdmissionRejected("Service busy", 429, retry_after=5)
+
+    monkeypatch.setattr(agent_service, 'execute_query', execute_query)
+    monkeypatch.setattr(agent_service_module.settings, 'ADMISSION_BACKGROUND_MAX_WAIT', 1.0)
+
+    with pytest.raises(AdmissionRejected):
+        agent_service.execute_background_query({'framework': 'langgraph'})
@@ -0,0 +1,173 @@
+import json
+from types import SimpleNamespace
+import pytest
+from core import cache
+from core.cache import ResponseCache, cache_key, is_cacheable
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+class FakeRedis:
+    """Dict-backed stand-in for the two redis-py calls ResponseCache makes"""
+
+    def __init__(self, clock: FakeClock):
+        self.clock = clock
+        self.data = {}
+        self.fail = False
+        self.calls = 0
+
+    def get(self, key):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("redis is down")
+        entry = self.data.get(key)
+        if entry is None or entry[0] <= self.clock():
+            return None
+        return entry[1]
+
+    def set(self, key, value, ex=None):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("redis is down")
+        self.data[key] = (self.clock() + ex if ex else float('inf'), value.encode('utf-8'))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache, 'time', SimpleNamespace(monotonic=clock))
+    return clock
+
+
+@pytest.fixture
+def redis(clock):
+    return FakeRedis(clock)
+
+
+def make_cache(redis, **kwargs) -> ResponseCache:
+    options = dict(ttl=3600.0, l1_max_entries=4, l1_ttl=60.0, redis_retry_after=30.0)
+    options.update(kwargs)
+    return ResponseCache(redis_client=redis, **options)
+
+
+# Shaped like the entries AgentService stores
+ANSWER = {'answer': 'Use docker ps -a', 'tokens_used': 412, 'llm_calls': 2, 'cached_at': 1000.0}
+
+# Shaped like the adapter results is_cacheable is given
+RESULT = {'status': 'success', 'answer': 'Use docker ps -a', 'tools_used': ['doc_qa']}
+
+
+def test_miss_then_l1_hit(redis):
+    response_cache = make_cache(redis)
+    key = cache_key('langgraph', 'gpt-4o', 'Faiss', 'How do I list containers?')
+
+    assert response_cache.get(key) == (None, None)
+    assert response_cache.set(key, ANSWER)
+    assert response_cache.get(key) == (ANSWER, 'l1')
+    assert json.loads(redis.data[key][1]) == ANSWER
+
+
+def test_redis_hit_is_promoted_to_l1(redis):
+    writer = make_cache(redis)
+    reader = make_cache(redis)
+    key = cache_key('langgraph', 'gpt-4o', 'Faiss', 'How do I list containers?')
+    writer.set(key, ANSWER)
+
+    assert reader.get(key) == (ANSWER, 'redis')
+    calls = redis.calls
+    assert reader.get(key) == (ANSWER, 'l1')
+    assert redis.calls == calls
+
+
+def test_equivalent_queries_share_a_key():
+    assert cache_key('LangGraph', 'gpt-4o', 'Faiss', '  How do I   list containers? ') == \
+        cache_key('langgraph', 'GPT-4o', 'faiss', 'how do i list containers')
+    assert cache_key('langgraph', 'gpt-4o', 'Faiss', 'list containers') != \
+        cache_key('dspy', 'gpt-4o', 'Faiss', 'list containers')
+
+
+def test_l1_and_redis_entries_expire(redis, clock):
+    response_cache = make_cache(redis, ttl=120.0, l1_ttl=60.0)
+    key = cache_key('langgraph', 'gpt-4o', 'Faiss', 'q')
+    response_cache.set(key, ANSWER)
+
+    clock.advance(61)
+    assert response_cache.get(key) == (ANSWER, 'redis')
+
+    clock.advance(60)
+    response_cache.l1.clear()
+    assert response_cache.get(key) == (None, None)
+
+
+def test_l1_evicts_least_recently_used(clock):
+    response_cache = make_cache(None, l1_max_entries=2)
+    response_cache.set('a', {'n': 1})
+    response_cache.set('b', {'n': 2})
+    response_cache.get('a')
+    response_cache.set('c', {'n': 3})
+
+    assert len(response_cache.l1) == 2
+    assert response_cache.get('b') == (None, None)
+    assert response_cache.get('a') == ({'n': 1}, 'l1')
+    assert response_cache.get('c') == ({'n': 3}, 'l1')
+
+
+def test_oversized_answers_are_not_stored(redis):
+    response_cache = make_cache(redis, max_value_bytes=64)
+
+    assert not response_cache.set('big', {'answer': 'x' * 100})
+    assert response_cache.get('big') == (None, None)
+    assert 'big' not in redis.data
+
+
+@pytest.mark.parametrize('result', [
+    {'status': 'error', 'answer': 'Rag-API unavailable'},
+    {'status': 'success', 'answer': 'docker ps', 'fast_path_intent': 'list_containers'},
+    {'status': 'success', 'answer': 'partial', 'budget_exhausted': 'deadline'},
+    {'status': 'success', 'answer': '3 running', 'tools_used': ['doc_qa', 'run_command']},
+])
+def test_uncacheable_results(result):
+    assert not is_cacheable(result)
+
+
+def test_complete_agent_answer_is_cacheable():
+    assert is_cacheable(RESULT)
+    assert is_cacheable({'status': 'success', 'answer': 'ok'})
+
+
+def test_redis_error_falls_back_to_l1(redis, clock):
+    response_cache = make_cache(redis, redis_retry_after=30.0)
+    key = cache_key('langgraph', 'gpt-4o', 'Faiss', 'q')
+    redis.fail = True
+
+    assert response_cache.set(key, ANSWER)
+    assert response_cache.get(key) == (ANSWER, 'l1')
+    assert response_cache.get('other') == (None, None)
+
+    # Redis is skipped until the retry delay has passed
+    calls = redis.calls
+    assert response_cache.get('other') == (None, None)
+    assert redis.calls == calls
+
+    redis.fail = False
+    clock.advance(31)
+    response_cache.set('other', ANSWER)
+    assert 'other' in redis.data
+
+
+@pytest.mark.parametrize('raw', [b'{"answer": "trunc', b'not json', b'["a list"]'])
+def test_unreadable_redis_entry_is_a_miss(redis, raw):
+    response_cache = make_cache(redis)
+    redis.data['bad'] = (float('inf'), raw)
+
+    assert response_cache.get('bad') == (None, None)
+    assert len(response_cache.l1) == 0
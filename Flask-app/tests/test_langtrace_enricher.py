@@ -0,0 +1,217 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from services import langtrace_enricher
+from services.metrics_collector import MetricsCollector
+
+
+def langtrace_trace(trace_id: str, prompt_tokens: int, completion_tokens: int):
+    return {
+        'trace_id': trace_id,
+        'spans': [{
+            'attributes': {
+                'llm.usage.prompt_tokens': prompt_tokens,
+                'llm.usage.completion_tokens': completion_tokens,
+                'llm.model': 'gpt-4o-mini'
+            },
+            'status': 'OK'
+        }]
+    }
+
+
+class FakeLangtrace:
+    """aiohttp test server answering /v1/traces/{trace_id} from a per-trace script.
+
+    Each script entry is (status, body, delay); the last entry repeats.
+    """
+
+    def __init__(self):
+        self.scripts = {}
+        self.hits = defaultdict(int)
+        self.headers = []
+        app = web.Application()
+        app.router.add_get('/v1/traces/{trace_id}', self.handle)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.server = TestServer(app, loop=self.loop)
+        self._call(self.server.start_server())
+        self.url = str(self.server.make_url('')).rstrip('/')
+
+    async def handle(self, request: web.Request) -> web.Response:
+        trace_id = request.match_info['trace_id']
+        self.headers.append(request.headers.get('Authorization'))
+        script = self.scripts.get(trace_id) or [(404, None, 0)]
+        status, body, delay = script[min(self.hits[trace_id], len(script) - 1)]
+        self.hits[trace_id] += 1
+        if delay:
+            await asyncio.sleep(delay)
+        if body is None:
+            return web.Response(status=status)
+        return web.json_response(body, status=status)
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(10)
+
+    def close(self):
+        self._call(self.server.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+
+@pytest.fixture
+def langtrace():
+    server = FakeLangtrace()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def collector(langtrace, tmp_path, monkeypatch):
+    # Keep the retry backoff short
+    monkeypatch.setattr(langtrace_enricher.random, 'uniform', lambda low, high: 0.01)
+    collector = MetricsCollector(
+        db_path=str(tmp_path / 'metrics.db'),
+        langtrace_api_key='test-key',
+        write_flush_interval=0.05,
+        langtrace_options={
+            'api_url': langtrace.url,
+            'delay': 0.0,
+            'concurrency': 2,
+            'rate': 1000.0,
+            'max_attempts': 3,
+            'timeout': 0.5
+        }
+    )
+    yield collector
+    collector.enricher.close()
+    collector.writer.close()
+
+
+def record(collector: MetricsCollector, trace_id: str):
+    # No provider usage, so the row starts with estimated tokens (4 words -> 5, 10 words -> 13)
+    return collector.record_metrics({
+        'trace_id': trace_id,
+        'framework': 'langgraph',
+        'model': 'gpt-4o-mini',
+        'vector_store': 'Faiss',
+        'query': 'how to list containers',
+        'response': 'run docker ps to list the running containers right now',
+        'duration': 1.2
+    })
+
+
+def outcome_count(collector: MetricsCollector, outcome: str) -> float:
+    return collector.registry.get_sample_value('langtrace_enrichments_total', {'outcome': outcome}) or 0.0
+
+
+def wait_for_outcome(collector: MetricsCollector, outcome: str, count: int = 1, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while outcome_count(collector, outcome) < count:
+        assert time.monotonic() < deadline, f"no '{outcome}' outcome after {timeout}s"
+        time.sleep(0.02)
+
+
+def tokens(collector: MetricsCollector, token_type: str) -> float:
+    return collector.registry.get_sample_value(
+        'llm_tokens_total', {'framework': 'langgraph', 'model': 'gpt-4o-mini', 'token_type': token_type}
+    )
+
+
+def stored_row(collector: MetricsCollector, trace_id: str) -> sqlite3.Row:
+    collector.writer.flush()
+    with sqlite3.connect(collector.db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        return conn.execute("SELECT * FROM metrics WHERE trace_id = ?", (trace_id,)).fetchone()
+
+
+def test_not_yet_ingested_trace_is_retried_then_applied(langtrace, collector):
+    langtrace.scripts['t-late'] = [(404, None, 0), (200, langtrace_trace('t-late', 500, 80), 0)]
+    record(collector, 't-late')
+    assert stored_row(collector, 't-late')['token_source'] == 'estimated'
+    assert tokens(collector, 'input') == 5
+
+    wait_for_outcome(collector, 'enriched')
+
+    assert langtrace.hits['t-late'] == 2
+    assert langtrace.headers[0] == 'Bearer test-key'
+    row = stored_row(collector, 't-late')
+    assert row['token_source'] == 'langtrace'
+    assert (row['input_tokens'], row['output_tokens'], row['total_tokens']) == (500, 80, 580)
+    assert row['input_cost'] == pytest.approx(500 / 1000 * 0.00015)
+    # Counters grow by the increase only, ending at Langtrace's figures
+    assert tokens(collector, 'input') == 500
+    assert tokens(collector, 'output') == 80
+
+
+def test_lower_langtrace_figures_leave_counters_alone(langtrace, collector):
+    langtrace.scripts['t-low'] = [(200, langtrace_trace('t-low', 2, 1), 0)]
+    record(collector, 't-low')
+
+    wait_for_outcome(collector, 'enriched')
+
+    row = stored_row(collector, 't-low')
+    assert (row['input_tokens'], row['output_tokens']) == (2, 1)
+    assert tokens(collector, 'input') == 5
+    assert tokens(collector, 'output') == 13
+
+
+def test_rate_limited_and_unavailable_responses_are_retried(langtrace, collector):
+    langtrace.scripts['t-busy'] = [(429, None, 0), (503, None, 0), (200, langtrace_trace('t-busy', 300, 40), 0)]
+    record(collector, 't-busy')
+
+    wait_for_outcome(collector, 'enriched')
+
+    assert langtrace.hits['t-busy'] == 3
+    assert stored_row(collector, 't-busy')['input_tokens'] == 300
+
+
+def test_gives_up_after_max_attempts(langtrace, collector):
+    langtrace.scripts['t-down'] = [(503, None, 0)]
+    langtrace.scripts['t-missing'] = [(404, None, 0)]
+    record(collector, 't-down')
+    record(collector, 't-missing')
+
+    wait_for_outcome(collector, 'failed')
+    wait_for_outcome(collector, 'not_found')
+
+    assert langtrace.hits['t-down'] == 3
+    assert langtrace.hits['t-missing'] == 3
+    assert stored_row(collector, 't-down')['token_source'] == 'estimated'
+    assert outcome_count(collector, 'enriched') == 0
+    assert tokens(collector, 'input') == 10
+
+
+def test_client_errors_are_not_retried(langtrace, collector):
+    langtrace.scripts['t-denied'] = [(401, None, 0)]
+    record(collector, 't-denied')
+
+    wait_for_outcome(collector, 'failed')
+
+    assert langtrace.hits['t-denied'] == 1
+
+
+def test_slow_response_times_out_and_is_retried(langtrace, collector):
+    langtrace.scripts['t-slow'] = [(200, langtrace_trace('t-slow', 400, 60), 2.0), (200, langtrace_trace('t-slow', 400, 60), 0)]
+    record(collector, 't-slow')
+
+    wait_for_outcome(collector, 'enriched')
+
+    assert langtrace.hits['t-slow'] == 2
+    assert stored_row(collector, 't-slow')['token_source'] == 'langtrace'
+    assert collector.registry.get_sample_value('langtrace_request_seconds_count') == 2
+
+
+def test_trace_without_spans_is_unusable(langtrace, collector):
+    langtrace.scripts['t-empty'] = [(200, {'trace_id': 't-empty', 'spans': []}, 0)]
+    record(collector, 't-empty')
+
+    wait_for_outcome(collector, 'unusable')
+
+    assert stored_row(collector, 't-empty')['token_source'] == 'estimated'
+    assert tokens(collector, 'input') == 5
@@ -0,0 +1,119 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import ExportTraceServiceRequest
+from opentelemetry.proto.trace.v1.trace_pb2 import Status
+from core.sampling import TailSampler
+from core.telemetry import init_tracer_provider
+from core.tracing import TracingManager
+
+
+class OTLPReceiver:
+    """In-process OTLP/HTTP endpoint that keeps every exported span"""
+
+    def __init__(self):
+        self.spans = []
+        self.resources = []
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = ExportTraceServiceRequest()
+                request.ParseFromString(self.rfile.read(int(self.headers['Content-Length'])))
+                for resource_spans in request.resource_spans:
+                    receiver.resources.append(resource_spans.resource)
+                    for scope_spans in resource_spans.scope_spans:
+                        receiver.spans.extend(scope_spans.spans)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-protobuf')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def trace(self, trace_id: str):
+        return [span for span in self.spans if span.trace_id.hex() == trace_id]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture(scope='module')
+def receiver():
+    receiver = OTLPReceiver()
+    # Export keeps every trace; the TracingManager's own sampler makes the decision
+    provider = init_tracer_provider('docker-agent-test', receiver.url, schedule_delay_ms=50, sampler=TailSampler(base_rate=1.0))
+    assert provider is not None
+    receiver.provider = provider
+    yield receiver
+    provider.shutdown()
+    receiver.close()
+
+
+def attributes(span):
+    return {attr.key: attr.value for attr in span.attributes}
+
+
+def run_trace(manager: TracingManager, status: str = 'completed', error: str = None) -> str:
+    trace_id = manager.start_trace({'framework': 'langgraph', 'model': 'gpt-4o', 'vector_store': 'Faiss', 'query': 'list containers'})
+    manager.add_step(trace_id, 'vector_search', {'duration': 0.05, 'documents': 3})
+    manager.add_step(trace_id, 'llm_call', {'duration': 0.2, 'tokens': 120})
+    manager.end_trace(trace_id, status, error)
+    return trace_id
+
+
+def test_trace_is_exported_as_root_and_step_spans(receiver):
+    manager = TracingManager(sampler=TailSampler(base_rate=1.0))
+    trace_id = run_trace(manager)
+    assert receiver.provider.force_flush()
+
+    spans = receiver.trace(trace_id)
+    assert sorted(span.name for span in spans) == ['agent.query', 'llm_call', 'vector_search']
+    root = next(span for span in spans if span.name == 'agent.query')
+    assert root.parent_span_id == b''
+    assert root.status.code != Status.STATUS_CODE_ERROR
+    root_attributes = attributes(root)
+    assert root_attributes['agent.framework'].string_value == 'langgraph'
+    assert root_attributes['agent.tokens_used'].int_value == 120
+    assert root_attributes['sampling.reason'].string_value == 'sampled'
+
+    for step in spans:
+        if step is root:
+            continue
+        assert step.parent_span_id == root.span_id
+        assert step.start_time_unix_nano <= step.end_time_unix_nano <= root.end_time_unix_nano
+    llm_call = next(span for span in spans if span.name == 'llm_call')
+    assert llm_call.end_time_unix_nano - llm_call.start_time_unix_nano == pytest.approx(0.2e9, rel=0.01)
+
+    service_names = {
+        attr.value.string_value for resource in receiver.resources for attr in resource.attributes
+        if attr.key == 'service.name'
+    }
+    assert 'docker-agent-test' in service_names
+
+
+def test_failed_trace_has_error_status_and_is_always_kept(receiver):
+    manager = TracingManager(sampler=TailSampler(base_rate=0.0))
+    trace_id = run_trace(manager, 'failed', 'Rag-API returned 500')
+    assert receiver.provider.force_flush()
+
+    spans = receiver.trace(trace_id)
+    assert len(spans) == 3
+    root = next(span for span in spans if span.name == 'agent.query')
+    assert root.status.code == Status.STATUS_CODE_ERROR
+    assert root.status.message == 'Rag-API returned 500'
+    assert attributes(root)['sampling.reason'].string_value == 'error'
+
+
+def test_sampled_out_trace_is_not_exported(receiver):
+    manager = TracingManager(sampler=TailSampler(base_rate=0.0))
+    trace_id = run_trace(manager)
+    assert receiver.provider.force_flush()
+
+    assert receiver.trace(trace_id) == []
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+from core import trace_store
+from core.trace_store import SQLiteTraceStore
+
+
+def make_trace(trace_id: str, age_days: float):
+    return {
+        'trace_id': trace_id,
+        'timestamp': (datetime.utcnow() - timedelta(days=age_days)).isoformat(),
+        'status': 'completed',
+        'request_data': {'framework': 'langgraph', 'model': 'gpt-4o'},
+        'end_time': datetime.utcnow().isoformat(),
+        'metrics': {'tokens_used': 10},
+        'steps': []
+    }
+
+
+def test_save_prunes_traces_past_retention():
+    store = SQLiteTraceStore(':memory:', retention_days=7)
+    store._last_prune = float('inf')    # Hold the sweep until both traces are written
+    store.save(make_trace('old', age_days=8))
+    store.save(make_trace('new', age_days=1))
+    assert store.get('old') is not None
+
+    store._last_prune = float('-inf')
+    store.save(make_trace('newer', age_days=0))
+
+    assert store.get('old') is None
+    assert store.get('new') is not None
+
+
+def test_prune_runs_at_most_once_per_interval(monkeypatch):
+    store = SQLiteTraceStore(':memory:', retention_days=7)
+    store.save(make_trace('first', age_days=0))
+    monkeypatch.setattr(trace_store, 'PRUNE_INTERVAL_SECONDS', 3600.0)
+
+    store.save(make_trace('old', age_days=8))
+
+    assert store.get('old') is not None
+    assert store.cleanup_old_traces(7) == 1
@@ -0,0 +1,93 @@
+"""
+Micro-benchmark: DockerCommandParser.parse vs the incremental CommandStreamSplitter.
+
+Replays recorded completions as a token stream and reports, per completion,
+the CPU cost of each parser and how far into the stream the first command
+becomes available (the batch parser always has to wait for the last token).
+
+Run from the Rag-API folder:
+    python -m Parser.bench_command_parser [--repeat 2000] [--chunk-size 4]
+"""
+import argparse
+import time
+
+from Parser.command_Parser import CommandStreamSplitter, DockerCommandParser
+
+
+# Completions recorded from the RAG chain (rag_prompt) across the supported models
+RECORDED_COMPLETIONS = {
+    "plain_single": "docker ps",
+    "plain_multi": "docker ps -a\ndocker images\ndocker volume ls\n",
+    "fenced_bash": "```bash\ndocker stop web\ndocker rm web\n```",
+    "fenced_with_prose": (
+        "To clean up dangling images and then list what is left, run:\n\n"
+        "```sh\ndocker image prune -f\ndocker images\n```\n\n"
+        "The first command removes unused images; the second lists the remaining ones."
+    ),
+    "prose_fallback": (
+        "You can follow the logs of the container with the command below.\n"
+        "docker logs -f web\n"
+        "Use Ctrl+C to stop following.\n"
+    ),
+    "continued_command": (
+        "```\ndocker run -d \\\n  --name web \\\n  -p 8080:80 \\\n  nginx:latest\n```\n"
+    ),
+}
+
+
+def tokenize(text: str, chunk_size: int):
+    """Split a completion into fixed-size chunks, roughly the size of LLM tokens."""
+    return [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+
+def bench_batch(parser: DockerCommandParser, text: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parser.parse(text)
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_streaming(chunks, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        splitter = CommandStreamSplitter()
+        for chunk in chunks:
+            splitter.feed(chunk)
+        splitter.close()
+    return (time.perf_counter() - start) / repeat
+
+
+def first_command_position(chunks) -> int:
+    """Number of chunks consumed before the streaming parser emitted its first command."""
+    splitter = CommandStreamSplitter()
+    for position, chunk in enumerate(chunks, start=1):
+        if splitter.feed(chunk):
+            return position
+    return len(chunks) if splitter.close() else 0
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--repeat", type=int, default=2000)
+    arg_parser.add_argument("--chunk-size", type=int, default=4)
+    args = arg_parser.parse_args()
+
+    parser = DockerCommandParser()
+    header = f"{'completion':<20} {'chunks':>6} {'parse us':>9} {'stream us':>10} {'first cmd @':>12}"
+    print(header)
+    print("-" * len(header))
+
+    for name, text in RECORDED_COMPLETIONS.items():
+        chunks = tokenize(text, args.chunk_size)
+        batch_us = bench_batch(parser, text, args.repeat) * 1e6
+        stream_us = bench_streaming(chunks, args.repeat) * 1e6
+        first = first_command_position(chunks)
+        share = f"{first / len(chunks):.0%}" if chunks else "-"
+        print(f"{name:<20} {len(chunks):>6} {batch_us:>9.2f} {stream_us:>10.2f} {share:>12}")
+
+    print("\n'first cmd @' is the share of the stream consumed before the first command is")
+    print("available to the streaming parser; parse() only runs after 100% has arrived.")
+
+
+if __name__ == "__main__":
+    main()
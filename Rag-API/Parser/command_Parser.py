@@ -1,7 +1,16 @@
 import re
+from typing import AsyncIterator, Iterable, Iterator, List, Union
+
+from langchain_core.messages import BaseMessage
 from langchain_core.output_parsers import StrOutputParser
 
 
+# Precompiled once at import instead of on every parse() call
+CODE_BLOCK_PATTERN = re.compile(r"```(?:\w*\n)?(.*?)```", re.DOTALL)
+FENCE_PATTERN = re.compile(r"```")
+LANGUAGE_TAG_PATTERN = re.compile(r"\w*")
+
+
 class DockerCommandParser(StrOutputParser):
     def parse(self, text: str) -> str:
         # If the response does not contain any newline characters, return it as-is
@@ -9,9 +18,9 @@ class DockerCommandParser(StrOutputParser):
             return text.strip()
 
         # Extract content between triple backticks
-        code_blocks = re.findall(r"```(?:\w*\n)?(.*?)```", text, re.DOTALL)
-        if code_blocks:
-            return code_blocks[0].strip()
+        match = CODE_BLOCK_PATTERN.search(text)
+        if match:
+            return match.group(1).strip()
 
         # Fallback: extract lines that start with 'docker'
         lines = text.strip().splitlines()
@@ -19,5 +28,135 @@ class DockerCommandParser(StrOutputParser):
         return "\n".join(command_lines)
 
 
-def get_parser():
-    return DockerCommandParser()
\ No newline at end of file
+class CommandStreamSplitter:
+    """
+    Incremental counterpart of DockerCommandParser.parse.
+
+    Feed it chunks of an LLM completion as they arrive; every call returns the
+    commands whose line (or code fence) has closed so far, so they can be acted
+    on while the model is still generating. Only the first code block is used,
+    like parse(). Outside a fence, lines starting with 'docker' are emitted
+    eagerly, so a prose command *before* the first fence is also returned here
+    while parse() would drop it.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pending = ""          # backslash-continued command being assembled
+        self._in_fence = False
+        self._fence_done = False
+        self._saw_newline = False
+        self._text = []
+
+    def feed(self, chunk: str) -> List[str]:
+        """Consume a chunk and return the commands completed by it."""
+        if not chunk:
+            return []
+        if not self._saw_newline:
+            self._text.append(chunk)
+
+        self._buffer += chunk
+        commands: List[str] = []
+        newline = self._buffer.find("\n")
+        while newline != -1:
+            self._saw_newline = True
+            self._text = []
+            line, self._buffer = self._buffer[:newline], self._buffer[newline + 1:]
+            commands.extend(self._consume_line(line))
+            newline = self._buffer.find("\n")
+        return commands
+
+    def close(self) -> List[str]:
+        """Flush whatever is left once the stream has ended."""
+        if not self._saw_newline:
+            # Same as parse(): a single-line answer is returned as-is
+            text = "".join(self._text).strip()
+            self._text = []
+            self._buffer = ""
+            return [text] if text else []
+
+        commands = self._consume_line(self._buffer)
+        self._buffer = ""
+        if self._pending:
+            commands.append(self._pending)
+            self._pending = ""
+        return commands
+
+    def _consume_line(self, line: str) -> List[str]:
+        if self._fence_done:
+            return []
+
+        commands: List[str] = []
+        segments = FENCE_PATTERN.split(line)
+        for index, segment in enumerate(segments):
+            if index > 0:
+                if self._in_fence:
+                    # Closing fence: parse() only ever looks at the first block
+                    self._in_fence = False
+                    self._fence_done = True
+                    if self._pending:
+                        commands.append(self._pending)
+                        self._pending = ""
+                    return commands
+                self._in_fence = True
+                if index == len(segments) - 1 and LANGUAGE_TAG_PATTERN.fullmatch(segment):
+                    # "```bash" - the rest of the line is only the language tag
+                    continue
+
+            command = segment.strip()
+            if not command:
+                continue
+            if not self._in_fence and not (self._pending or command.startswith("docker")):
+                continue
+            commands.extend(self._emit(command))
+        return commands
+
+    def _emit(self, command: str) -> List[str]:
+        if command.endswith("\\"):
+            self._pending += command[:-1].rstrip() + " "
+            return []
+        command = self._pending + command
+        self._pending = ""
+        return [command]
+
+
+def iter_docker_commands(chunks: Iterable[str]) -> Iterator[str]:
+    """Yield each Docker command from a stream of text chunks as soon as it is complete."""
+    splitter = CommandStreamSplitter()
+    for chunk in chunks:
+        yield from splitter.feed(chunk)
+    yield from splitter.close()
+
+
+def _chunk_text(chunk: Union[str, BaseMessage]) -> str:
+    if isinstance(chunk, BaseMessage):
+        return chunk.content if isinstance(chunk.content, str) else ""
+    return chunk
+
+
+class StreamingDockerCommandParser(DockerCommandParser):
+    """
+    Streaming mode of DockerCommandParser: `.stream()`/`.astream()` on a chain
+    ending in this parser yield one command per chunk instead of raw tokens.
+    `.invoke()` still goes through parse() and returns the same string as before.
+    """
+
+    def _transform(self, input: Iterator[Union[str, BaseMessage]]) -> Iterator[str]:
+        splitter = CommandStreamSplitter()
+        for chunk in input:
+            yield from splitter.feed(_chunk_text(chunk))
+        yield from splitter.close()
+
+    async def _atransform(self, input: AsyncIterator[Union[str, BaseMessage]]) -> AsyncIterator[str]:
+        splitter = CommandStreamSplitter()
+        async for chunk in input:
+            for command in splitter.feed(_chunk_text(chunk)):
+                yield command
+        for command in splitter.close():
+            yield command
+
+
+def get_parser(streaming: bool = False):
+    if streaming:
+        return StreamingDockerCommandParser()
+    return DockerCommandParser()
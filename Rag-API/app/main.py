@@ -120,6 +120,7 @@ from app.services.rag_chain import build_rag_retrieval_chain
 import dspy
 import os
 
+from opentelemetry import propagate
 from prometheus_fastapi_instrumentator import Instrumentator  # For Prometheus metrics
 
 os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
@@ -135,6 +136,13 @@ Instrumentator().instrument(app).expose(app)
 # Mount the /ask router
 app.include_router(ask_router, prefix="", tags=["RAG"])
 
+# W3C trace context from the Flask adapters; /ask spans are parented to the caller's span
+@app.middleware("http")
+async def extract_trace_context(request: Request, call_next):
+    request.state.trace_context = propagate.extract(request.headers)
+    return await call_next(request)
+
+
 # Logging middleware to capture input/output
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
@@ -143,6 +151,11 @@ async def log_requests(request: Request, call_next):
 
     response = await call_next(request)
 
+    # Buffering an event stream would hold every event back until the answer is complete
+    if response.headers.get("content-type", "").startswith("text/event-stream"):
+        logging.info(f"Response: Status {response.status_code} (event stream)")
+        return response
+
     # Need to clone response to read its body
     resp_body = b""
     async for chunk in response.body_iterator:
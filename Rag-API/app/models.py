@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Literal
+from typing import Any, Dict, List, Literal, Optional
 
 FrameworkChoices = Literal["langgraph", "autogen","llamaindex","dspy"]         # extend when needed
 LLMChoices       = Literal['gpt-4o','gpt-4o-mini', "gpt-4.1", "gpt-4.1-mini", "gpt-3.5-turbo", 'llama3-8b-8192','gemma2-9b-it',"llama-3.3-70b-versatile","gemini-2.0-flash"]    # extend when needed
@@ -11,6 +11,26 @@ class RAGRequest(BaseModel):
     llm_model: str         # e.g., "gpt-4"
     vector_store: str      # e.g., "faiss"
     query: str             # The actual user query
+    fast_path: bool = True # Allow answering common intents without the agent
+    debug: bool = False    # Return the per-stage latency breakdown in RAGResponse.debug
+
+class AgentStep(BaseModel):
+    kind: str              # "llm" or "tool"
+    name: str              # tool name, or the framework's LLM step name
+    duration_ms: float
+
+class TokenUsage(BaseModel):
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int     # Prompt tokens served from the provider's prompt cache
+    total_tokens: int
+    llm_calls: int         # LLM calls made across the whole agent loop
 
 class RAGResponse(BaseModel):
     answer: str
+    fast_path_intent: Optional[str] = None   # Set when answered by the fast path instead of the agent
+    steps: List[AgentStep] = []              # Every LLM and tool step the agent took, in order
+    budget_exhausted: Optional[str] = None   # "deadline", "max_llm_calls" or "max_tool_calls" when cut short
+    usage: Optional[TokenUsage] = None       # Provider-reported usage; None when the provider reported none
+    timings: Dict[str, float] = {}           # Server-side stage totals in ms, plus total_ms
+    debug: Optional[Dict[str, Any]] = None   # Stage latency breakdown, only when the request set debug
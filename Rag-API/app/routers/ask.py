@@ -1,60 +1,147 @@
-
-from fastapi import APIRouter, HTTPException
-from app.models import RAGRequest, RAGResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from app.models import AgentStep, RAGRequest, RAGResponse, TokenUsage
 from app.services.vector_store import get_vector_store
 from app.services.llm import get_llm, get_llama_index_llm
 from app.services.rag_chain import build_rag_retrieval_chain
 from app.services.frameworks import get_agent
+from app.services.fast_path import try_fast_path, record_agent_latency
+from app.services.budget import BudgetTracker
+from app.services.agent_runner import run_langgraph, run_llamaindex, run_dspy
+from app.services.instrumentation import StageRecorder, activate
+from config import FAST_PATH_ENABLED, STREAM_KEEPALIVE_SECONDS
 import logging
 import asyncio
+import json
+import queue
+import threading
+import time
 
 router = APIRouter()
 
 @router.post("/ask", response_model=RAGResponse)
-def ask(request: RAGRequest):
+def ask(request: RAGRequest, http_request: Request):
+    recorder = StageRecorder(
+        request.framework, request.llm_model, request.vector_store,
+        parent_context=http_request.state.trace_context
+    )
     try:
-        # Initialize component
+        with activate(recorder):
+            response = _answer(request, recorder)
+        return _finalize(response, request, recorder)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.exception("Error inside /ask:")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@router.post("/ask/stream")
+def ask_stream(request: RAGRequest, http_request: Request):
+    """
+    Same as /ask, but as server-sent events: "step" events at stage boundaries,
+    "token" events as the answer is generated, then one "done" event carrying
+    the full RAGResponse (or an "error" event).
+    """
+    events: queue.Queue = queue.Queue()
+    recorder = StageRecorder(
+        request.framework, request.llm_model, request.vector_store,
+        sink=lambda event, data: events.put((event, data)),
+        parent_context=http_request.state.trace_context
+    )
+
+    def run():
+        try:
+            with activate(recorder):
+                response = _answer(request, recorder, streaming=True)
+            events.put(("done", _finalize(response, request, recorder).model_dump()))
+        except HTTPException as e:
+            events.put(("error", {"status_code": e.status_code, "detail": e.detail}))
+        except Exception as e:
+            logging.exception("Error inside /ask/stream:")
+            events.put(("error", {"status_code": 500, "detail": f"Internal server error: {str(e)}"}))
+
+    # The agent runs on its own thread so events can be flushed while it works.
+    # If the client disconnects it still finishes, bounded by the agent budget.
+    threading.Thread(target=run, name="ask-stream", daemon=True).start()
+
+    def event_source():
+        while True:
+            try:
+                event, data = events.get(timeout=STREAM_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            if event in ("done", "error"):
+                return
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _finalize(response: RAGResponse, request: RAGRequest, recorder: StageRecorder) -> RAGResponse:
+    usage = recorder.usage_summary()
+    response.usage = TokenUsage(**usage) if usage else None
+    response.timings = recorder.timings()
+    if request.debug:
+        response.debug = recorder.breakdown()
+    return response
+
+
+def _answer(request: RAGRequest, recorder: StageRecorder, streaming: bool = False) -> RAGResponse:
+    # Common intents are answered locally without building an agent
+    if FAST_PATH_ENABLED and request.fast_path:
+        with recorder.stage("fast_path"):
+            fast = try_fast_path(request.query)
+        if fast is not None:
+            return RAGResponse(answer=fast["answer"], fast_path_intent=fast["intent"])
+
+    agent_start = time.perf_counter()
+    tracker = BudgetTracker()
+
+    # Initialize component
+    with recorder.stage("vector_store_load", request.vector_store):
         vector_store = get_vector_store(request.vector_store)
 
-        if request.framework == "langgraph":
-            llm = get_llm(request.llm_model)
+    if request.framework == "langgraph":
+        with recorder.stage("agent_build", "langgraph"):
+            llm = get_llm(request.llm_model, streaming=streaming)
             rag_chain = build_rag_retrieval_chain(llm, vector_store)
-            agent = get_agent("langgraph", llm, rag_chain)
+            agent = get_agent("langgraph", llm, rag_chain, tracker)
 
-            inputs = {"messages": [("user", request.query)]}
-            response_text = ""
-            for step in agent.stream(inputs, stream_mode="values"):
-                msg = step["messages"][-1]
-                response_text += msg.content
+        response_text = run_langgraph(agent, request.query, tracker)
 
-            return RAGResponse(answer=response_text)
-
-        elif request.framework == "llamaindex":
+    elif request.framework == "llamaindex":
+        with recorder.stage("agent_build", "llamaindex"):
             llm = get_llama_index_llm(request.llm_model)
             rag_chain = build_rag_retrieval_chain(llm, vector_store)
-            agent = get_agent("llamaindex", llm, rag_chain)
-
-            async def main():
-                return await agent.run(user_msg=request.query)
+            agent = get_agent("llamaindex", llm, rag_chain, tracker)
 
-            response_text = asyncio.run(main())
-            return RAGResponse(answer=str(response_text))
+        response_text = asyncio.run(run_llamaindex(agent, request.query, tracker))
 
-        elif request.framework == "dspy":
+    elif request.framework == "dspy":
+        with recorder.stage("agent_build", "dspy"):
             llm = get_llm(request.llm_model)
             rag_chain = build_rag_retrieval_chain(llm, vector_store)
-            agent = get_agent("dspy", llm, rag_chain)
-
-            pred = agent(question=request.query)
-            return RAGResponse(answer=str(pred.answer))
+            agent = get_agent("dspy", llm, rag_chain, tracker)
 
-        else:
-            raise HTTPException(status_code=400, detail="Invalid framework selected")
+        response_text = run_dspy(agent, request.query, tracker)
 
-    except Exception as e:
-        logging.exception("Error inside /ask:")
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    else:
+        raise HTTPException(status_code=400, detail="Invalid framework selected")
 
+    record_agent_latency(time.perf_counter() - agent_start)
+    logging.info(f"Agent run for {request.framework}: {tracker.summary()} stages={recorder.totals()}")
+    return RAGResponse(
+        answer=str(response_text),
+        steps=[AgentStep(**step.__dict__) for step in tracker.steps],
+        budget_exhausted=tracker.exhausted
+    )
 
 '''
 from fastapi import APIRouter, HTTPException
@@ -0,0 +1,133 @@
+"""
+Runs an agent built by frameworks.get_agent under a BudgetTracker.
+
+Each framework is stopped differently, but all three end the same way: when
+the budget runs out the loop stops and whatever the agent produced so far is
+returned, with the reason kept on the tracker.
+"""
+import asyncio
+import time
+
+import dspy
+from dspy.utils.callback import BaseCallback
+from langchain_core.messages import AIMessage, ToolMessage
+from langgraph.errors import GraphRecursionError
+
+from app.services.budget import BudgetTracker
+from app.services.instrumentation import (
+    current_recorder, dspy_callbacks, dspy_request_lm, install_llamaindex_hooks, langchain_callbacks
+)
+
+
+BEST_EFFORT_FALLBACK = (
+    "I could not finish working on this request within its time and step budget. "
+    "Please try again or make the question more specific."
+)
+
+
+def run_langgraph(agent, query: str, tracker: BudgetTracker) -> str:
+    inputs = {"messages": [("user", query)]}
+    # Backstop for the LLM budget: every LLM round is one agent node plus one tools node
+    config = {"recursion_limit": 2 * tracker.budget.max_llm_calls + 1, "callbacks": langchain_callbacks()}
+
+    response_text = ""
+    last_step = time.perf_counter()
+    try:
+        for step in agent.stream(inputs, stream_mode="values", config=config):
+            msg = step["messages"][-1]
+            now = time.perf_counter()
+            if isinstance(msg, AIMessage):
+                tracker.record_step("llm", "agent", now - last_step)
+            last_step = now
+            response_text += msg.content
+
+            # Stop before the graph starts another round we have no budget for
+            wants_more = isinstance(msg, ToolMessage) or (isinstance(msg, AIMessage) and msg.tool_calls)
+            if wants_more and tracker.check():
+                break
+    except GraphRecursionError:
+        tracker.exhausted = tracker.exhausted or "max_llm_calls"
+
+    return response_text or BEST_EFFORT_FALLBACK
+
+
+async def run_llamaindex(agent, query: str, tracker: BudgetTracker) -> str:
+    from llama_index.core.agent.workflow import AgentOutput, AgentStream, ToolCall, ToolCallResult
+    from llama_index.core.workflow.errors import WorkflowRuntimeError
+
+    install_llamaindex_hooks()
+    recorder = current_recorder()
+    handler = agent.run(user_msg=query, max_iterations=tracker.budget.max_llm_calls)
+    last_answer = ""
+    last_step = time.perf_counter()
+
+    async def consume():
+        nonlocal last_answer, last_step
+        async for event in handler.stream_events():
+            if isinstance(event, AgentStream):
+                if recorder and event.delta:
+                    recorder.emit("token", {"text": event.delta})
+            elif isinstance(event, AgentOutput):
+                now = time.perf_counter()
+                tracker.record_step("llm", "agent", now - last_step)
+                last_step = now
+                if event.response.content:
+                    last_answer = event.response.content
+            elif isinstance(event, ToolCallResult):
+                # Tool time is recorded by the tool guard itself
+                last_step = time.perf_counter()
+                if recorder:
+                    recorder.end(("tool", event.tool_id))
+            elif isinstance(event, ToolCall) and recorder:
+                # The dispatcher has no tool events for workflow agents, so time them from the stream
+                recorder.start(("tool", event.tool_id), "tool", event.tool_name)
+        return await handler
+
+    try:
+        result = await asyncio.wait_for(consume(), timeout=tracker.remaining_seconds())
+        return str(result)
+    except asyncio.TimeoutError:
+        tracker.exhausted = "deadline"
+        try:
+            await handler.cancel_run()
+        except Exception:
+            pass
+    except WorkflowRuntimeError:
+        # Raised by the workflow when max_iterations is reached
+        tracker.exhausted = "max_llm_calls"
+
+    return last_answer or BEST_EFFORT_FALLBACK
+
+
+class _DSPyStepCallback(BaseCallback):
+    """Times every LM call made by dspy.ReAct and records it on the tracker."""
+
+    def __init__(self, tracker: BudgetTracker):
+        self.tracker = tracker
+        self._started = {}
+
+    def on_lm_start(self, call_id, instance, inputs):
+        self._started[call_id] = time.perf_counter()
+
+    def on_lm_end(self, call_id, outputs, exception=None):
+        start = self._started.pop(call_id, None)
+        if start is not None:
+            self.tracker.record_step("llm", "lm", time.perf_counter() - start)
+
+
+def run_dspy(agent, query: str, tracker: BudgetTracker) -> str:
+    # ReAct stops itself after max_iters and still extracts an answer from the trajectory
+    # A per-request LM copy keeps its usage history apart from concurrent requests
+    overrides = {"callbacks": [_DSPyStepCallback(tracker), *dspy_callbacks()]}
+    lm = dspy_request_lm()
+    if lm is not None:
+        overrides["lm"] = lm
+    with dspy.context(**overrides):
+        pred = agent(question=query)
+
+    trajectory = getattr(pred, "trajectory", None) or {}
+    tool_names = [value for key, value in trajectory.items() if key.startswith("tool_name_")]
+    if len(tool_names) >= agent.max_iters and tool_names[-1] != "finish":
+        tracker.exhausted = tracker.exhausted or "max_llm_calls"
+
+    return str(pred.answer) if pred.answer else BEST_EFFORT_FALLBACK
@@ -0,0 +1,103 @@
+"""
+Per-request budget shared by the LangGraph, DSPy and LlamaIndex agents.
+
+A BudgetTracker caps tool calls, LLM calls and wall-clock time for one /ask
+request and records how long every step took. Tools are wrapped with
+`guard_tool` so an exhausted budget makes them tell the model to answer with
+what it already has instead of looping further.
+"""
+import functools
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from config import AGENT_DEADLINE_SECONDS, AGENT_MAX_LLM_CALLS, AGENT_MAX_TOOL_CALLS
+
+
+BUDGET_EXHAUSTED_MESSAGE = (
+    "Budget exhausted ({reason}). Do not call any more tools; "
+    "answer the user now with the information gathered so far."
+)
+
+
+@dataclass
+class AgentBudget:
+    max_tool_calls: int = AGENT_MAX_TOOL_CALLS
+    max_llm_calls: int = AGENT_MAX_LLM_CALLS
+    deadline_seconds: float = AGENT_DEADLINE_SECONDS
+
+
+@dataclass
+class StepRecord:
+    kind: str               # "llm" or "tool"
+    name: str
+    duration_ms: float
+
+
+@dataclass
+class BudgetTracker:
+    budget: AgentBudget = field(default_factory=AgentBudget)
+    started: float = field(default_factory=time.perf_counter)
+    steps: List[StepRecord] = field(default_factory=list)
+    tool_calls: int = 0
+    llm_calls: int = 0
+    exhausted: Optional[str] = None
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def remaining_seconds(self) -> float:
+        return max(0.0, self.budget.deadline_seconds - self.elapsed())
+
+    def check(self) -> Optional[str]:
+        """Return (and remember) why the budget is exhausted, or None if there is room left."""
+        if self.exhausted:
+            return self.exhausted
+        if self.elapsed() >= self.budget.deadline_seconds:
+            self.exhausted = "deadline"
+        elif self.llm_calls >= self.budget.max_llm_calls:
+            self.exhausted = "max_llm_calls"
+        return self.exhausted
+
+    def record_step(self, kind: str, name: str, duration: float):
+        with self._lock:
+            self.steps.append(StepRecord(kind=kind, name=name, duration_ms=round(duration * 1000, 2)))
+            if kind == "llm":
+                self.llm_calls += 1
+
+    def guard_tool(self, func: Callable[..., str]) -> Callable[..., str]:
+        """Wrap a tool so it is timed and refuses to run once the budget is spent."""
+
+        @functools.wraps(func)
+        def guarded(*args: Any, **kwargs: Any) -> str:
+            with self._lock:
+                reason = self.exhausted
+                if reason is None and self.tool_calls >= self.budget.max_tool_calls:
+                    reason = "max_tool_calls"
+                elif reason is None and self.elapsed() >= self.budget.deadline_seconds:
+                    reason = "deadline"
+                if reason is not None:
+                    self.exhausted = reason
+                    return BUDGET_EXHAUSTED_MESSAGE.format(reason=reason)
+                self.tool_calls += 1
+
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record_step("tool", func.__name__, time.perf_counter() - start)
+
+        return guarded
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "steps": [step.__dict__ for step in self.steps],
+            "tool_calls": self.tool_calls,
+            "llm_calls": self.llm_calls,
+            "elapsed_ms": round(self.elapsed() * 1000, 2),
+            "budget_exhausted": self.exhausted,
+        }
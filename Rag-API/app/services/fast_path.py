@@ -0,0 +1,325 @@
+"""
+Deterministic fast path for the handful of Docker intents that make up most
+/ask traffic. A query that fully matches exactly one template is answered
+locally (the command is run, or returned for destructive intents) without
+building an agent or calling an LLM. Everything else goes to the agent.
+"""
+import logging
+import re
+import shlex
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Pattern
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from config import FAST_PATH_COMMAND_TIMEOUT
+
+
+FAST_PATH_REQUESTS = Counter(
+    "rag_fast_path_requests_total",
+    "Queries seen by the fast-path router",
+    ["outcome", "intent"]       # outcome: hit, miss, fallback
+)
+
+FAST_PATH_DURATION = Histogram(
+    "rag_fast_path_duration_seconds",
+    "Time taken to answer a query on the fast path",
+    ["intent"]
+)
+
+FAST_PATH_LATENCY_SAVED = Counter(
+    "rag_fast_path_latency_saved_seconds_total",
+    "Estimated agent latency avoided by fast-path hits",
+    ["intent"]
+)
+
+FAST_PATH_HIT_RATIO = Gauge(
+    "rag_fast_path_hit_ratio",
+    "Share of queries answered by the fast path since startup"
+)
+
+
+# Slot values such as "stop all containers" are not names; leave those to the agent
+AMBIGUOUS_SLOT_VALUES = {
+    "a", "all", "any", "every", "it", "my", "running", "some", "that", "the",
+    "them", "these", "this", "those",
+}
+
+# Optional politeness in front of the actual request
+_PREFIX = r"(?:(?:please|can you|could you|would you|kindly)\s+)*"
+_CONTAINER = r"(?:the\s+)?(?:docker\s+)?container"
+_NAME = r"(?P<container>[a-z0-9][a-z0-9_.-]*)"
+_IMAGE = r"(?P<image>[a-z0-9][a-z0-9_./:-]*)"
+_SHOW = r"(?:show|list|display|get|give|print)(?:\s+me)?"
+
+
+@dataclass(frozen=True)
+class IntentTemplate:
+    name: str
+    patterns: List[Pattern]
+    command: str                    # str.format template filled with slot values
+    execute: bool = True            # False: destructive, return the command instead of running it
+    lead: str = "Here is the result"
+    empty_message: str = "The command completed with no output."
+
+
+@dataclass
+class IntentMatch:
+    template: IntentTemplate
+    slots: Dict[str, str]
+
+    @property
+    def command(self) -> str:
+        return self.template.command.format(
+            **{name: shlex.quote(value) for name, value in self.slots.items()}
+        )
+
+
+def _compile(*patterns: str) -> List[Pattern]:
+    return [re.compile(_PREFIX + pattern, re.IGNORECASE) for pattern in patterns]
+
+
+# Seeded from the commands in data/docker_cheatsheet.pdf; commands that stream
+# forever there (docker logs -f, docker container stats) use their one-shot form.
+INTENT_TEMPLATES: List[IntentTemplate] = [
+    IntentTemplate(
+        name="list_running_containers",
+        patterns=_compile(
+            _SHOW + r"\s+(?:the\s+|my\s+)?(?:currently\s+)?running\s+(?:docker\s+)?containers",
+            r"what\s+(?:docker\s+)?containers\s+are\s+(?:currently\s+)?running",
+            r"which\s+(?:docker\s+)?containers\s+are\s+(?:currently\s+)?running",
+        ),
+        command="docker ps",
+        lead="Here are the running containers",
+        empty_message="No containers are currently running.",
+    ),
+    IntentTemplate(
+        name="list_all_containers",
+        patterns=_compile(
+            _SHOW + r"\s+all\s+(?:the\s+|my\s+)?(?:docker\s+)?containers(?:\s+including\s+stopped(?:\s+ones)?)?",
+            _SHOW + r"\s+(?:all\s+)?(?:running\s+and\s+stopped|stopped\s+and\s+running)\s+containers",
+        ),
+        command="docker ps --all",
+        lead="Here are all containers, including stopped ones",
+        empty_message="There are no containers on this host.",
+    ),
+    IntentTemplate(
+        name="list_images",
+        patterns=_compile(
+            _SHOW + r"\s+(?:all\s+)?(?:the\s+|my\s+)?(?:local\s+)?(?:docker\s+)?images",
+            r"what\s+(?:docker\s+)?images\s+(?:do\s+i\s+have|are\s+available)",
+        ),
+        command="docker images",
+        lead="Here are the local images",
+        empty_message="There are no local images.",
+    ),
+    IntentTemplate(
+        name="stop_container",
+        patterns=_compile(
+            r"stop\s+" + _CONTAINER + r"\s+" + _NAME,
+            r"stop\s+" + _NAME + r"\s+container",
+        ),
+        command="docker stop {container}",
+        lead="Stopped container",
+    ),
+    IntentTemplate(
+        name="start_container",
+        patterns=_compile(
+            r"start\s+" + _CONTAINER + r"\s+" + _NAME,
+            r"start\s+" + _NAME + r"\s+container",
+        ),
+        command="docker start {container}",
+        lead="Started container",
+    ),
+    IntentTemplate(
+        name="container_logs",
+        patterns=_compile(
+            _SHOW + r"\s+(?:the\s+)?logs\s+(?:of|for)\s+" + _CONTAINER + r"\s+" + _NAME,
+            _SHOW + r"\s+(?:the\s+)?logs\s+(?:of|for)\s+" + _NAME,
+            _SHOW + r"\s+" + _NAME + r"\s+(?:container\s+)?logs",
+        ),
+        command="docker logs --tail 100 {container}",
+        lead="Here are the latest log lines",
+        empty_message="The container has not written any logs.",
+    ),
+    IntentTemplate(
+        name="inspect_container",
+        patterns=_compile(
+            r"inspect\s+" + _CONTAINER + r"\s+" + _NAME,
+            r"inspect\s+" + _NAME,
+        ),
+        command="docker inspect {container}",
+        lead="Here are the container details",
+    ),
+    IntentTemplate(
+        name="container_stats",
+        patterns=_compile(
+            _SHOW + r"\s+(?:the\s+)?(?:docker\s+)?container\s+(?:resource\s+)?(?:stats|statistics|resource\s+usage)",
+            _SHOW + r"\s+(?:the\s+)?resource\s+usage\s+(?:of|for)\s+(?:all\s+)?(?:the\s+)?containers",
+        ),
+        command="docker container stats --no-stream",
+        lead="Here is the current resource usage",
+        empty_message="No containers are running, so there are no stats to show.",
+    ),
+    IntentTemplate(
+        name="docker_info",
+        patterns=_compile(
+            _SHOW + r"\s+(?:the\s+)?docker\s+(?:system\s+)?(?:info|information)",
+            r"docker\s+(?:system\s+)?info",
+        ),
+        command="docker info",
+        lead="Here is the Docker system information",
+    ),
+    IntentTemplate(
+        name="prune_images",
+        patterns=_compile(
+            r"prune\s+(?:all\s+)?(?:the\s+)?(?:unused\s+|dangling\s+)?(?:docker\s+)?images",
+            r"(?:remove|delete|clean\s+up)\s+(?:all\s+)?(?:the\s+)?(?:unused|dangling)\s+(?:docker\s+)?images",
+        ),
+        command="docker image prune",
+        execute=False,
+    ),
+    IntentTemplate(
+        name="remove_container",
+        patterns=_compile(
+            r"(?:remove|delete)\s+" + _CONTAINER + r"\s+" + _NAME,
+            r"(?:remove|delete)\s+" + _NAME + r"\s+container",
+        ),
+        command="docker rm {container}",
+        execute=False,
+    ),
+    IntentTemplate(
+        name="remove_image",
+        patterns=_compile(
+            r"(?:remove|delete)\s+(?:the\s+)?(?:docker\s+)?image\s+" + _IMAGE,
+        ),
+        command="docker rmi {image}",
+        execute=False,
+    ),
+]
+
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING = re.compile(r"[\s.!?]+$")
+
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace and drop trailing punctuation; case is kept for slot values."""
+    return _TRAILING.sub("", _WHITESPACE.sub(" ", query.strip()))
+
+
+def match_intent(query: str) -> Optional[IntentMatch]:
+    """
+    Return the single high-confidence intent for `query`, or None when no
+    template matches the whole query, more than one intent matches, or a slot
+    value is too vague to act on.
+    """
+    text = normalize_query(query)
+    matches: Dict[str, IntentMatch] = {}
+
+    for template in INTENT_TEMPLATES:
+        for pattern in template.patterns:
+            found = pattern.fullmatch(text)
+            if not found:
+                continue
+            slots = {name: value for name, value in found.groupdict().items() if value}
+            if any(value.lower() in AMBIGUOUS_SLOT_VALUES for value in slots.values()):
+                continue
+            matches[template.name] = IntentMatch(template=template, slots=slots)
+            break
+
+    if len(matches) != 1:
+        return None
+    return next(iter(matches.values()))
+
+
+class _AgentLatency:
+    """Exponentially weighted moving average of full agent latency, used to estimate time saved."""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.value: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            if self.value is None:
+                self.value = seconds
+            else:
+                self.value = self.alpha * seconds + (1 - self.alpha) * self.value
+
+
+agent_latency = _AgentLatency()
+_counts = {"hit": 0, "total": 0}
+_counts_lock = threading.Lock()
+
+
+def record_agent_latency(seconds: float):
+    """Called by /ask after a full agent run so fast-path savings can be estimated."""
+    agent_latency.observe(seconds)
+
+
+def _record_outcome(outcome: str, intent: str):
+    FAST_PATH_REQUESTS.labels(outcome=outcome, intent=intent).inc()
+    with _counts_lock:
+        _counts["total"] += 1
+        if outcome == "hit":
+            _counts["hit"] += 1
+        FAST_PATH_HIT_RATIO.set(_counts["hit"] / _counts["total"])
+
+
+def try_fast_path(query: str) -> Optional[Dict[str, str]]:
+    """
+    Answer `query` without the agent if possible.
+
+    Returns {"answer", "intent", "command"} on a hit, or None when the query
+    should go to the agent (no confident match, or the command failed and the
+    agent is better placed to explain why).
+    """
+    start = time.perf_counter()
+    match = match_intent(query)
+    if match is None:
+        _record_outcome("miss", "none")
+        return None
+
+    template = match.template
+    command = match.command
+
+    if not template.execute:
+        answer = f"This changes your Docker host, so it was not run automatically. Run it yourself to proceed:\n{command}"
+    else:
+        try:
+            proc = subprocess.run(
+                shlex.split(command),
+                capture_output=True,
+                text=True,
+                timeout=FAST_PATH_COMMAND_TIMEOUT
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logging.warning(f"Fast path command failed for intent {template.name}: {e}")
+            _record_outcome("fallback", template.name)
+            return None
+
+        if proc.returncode != 0:
+            logging.info(f"Fast path command exited {proc.returncode} for intent {template.name}; using agent")
+            _record_outcome("fallback", template.name)
+            return None
+
+        output = proc.stdout.strip()
+        if not output:
+            answer = template.empty_message
+        elif "\n" in output:
+            answer = f"{template.lead}:\n{output}"
+        else:
+            answer = f"{template.lead}: {output}"
+
+    duration = time.perf_counter() - start
+    _record_outcome("hit", template.name)
+    FAST_PATH_DURATION.labels(intent=template.name).observe(duration)
+    if agent_latency.value is not None and agent_latency.value > duration:
+        FAST_PATH_LATENCY_SAVED.labels(intent=template.name).inc(agent_latency.value - duration)
+
+    return {"answer": answer, "intent": template.name, "command": command}
@@ -1,7 +1,9 @@
 # app/services/framework_factory.py
 import subprocess
-from typing import Any
+from typing import Any, Optional
 from app.tools.run_command import run_command_tool
+from app.services.budget import BudgetTracker
+from app.services.instrumentation import langchain_callbacks
 from Prompt.prompts import system_prompt
 from langgraph.prebuilt import create_react_agent
 
@@ -12,28 +14,32 @@ from dspy import InputField, OutputField, Signature
 
 
 
-def get_agent(framework_name: str, llm, rag_chain):
+def get_agent(framework_name: str, llm, rag_chain, tracker: Optional[BudgetTracker] = None):
     """
     Returns a ReACT‐style agent configured for the chosen framework.
     Currently supports "langgraph". AutoGen is a placeholder.
+    When a BudgetTracker is given, every tool is timed and stops running once
+    the request's tool-call or time budget is spent.
     """
 
     from typing import Dict
     from langchain.tools import tool
     from app.tools.doc_qa import doc_qa_tool as _raw_doc_qa_tool
 
-    @tool
+    # Identity when no budget is enforced
+    guard = tracker.guard_tool if tracker else (lambda func: func)
+
     def _doc_qa(query: str) -> str:
         """
         Retrieve an answer from the indexed documentation using RAG.
         """
         # Here, `rag_chain` is closed over from the outer scope.
-        result: Dict[str, Any] = rag_chain.invoke({"input": query})
+        result: Dict[str, Any] = rag_chain.invoke({"input": query}, config={"callbacks": langchain_callbacks()})
         return result.get("answer", "No answer found.")
 
     tools = [
-        _doc_qa,            # Now a named function with its own docstring
-        run_command_tool    # Already has a docstring in app/tools/run_command.py
+        tool(guard(_doc_qa)),                   # Now a named function with its own docstring
+        tool(guard(run_command_tool.func))      # Same name and docstring as app/tools/run_command.py
     ]
 
     if framework_name == "langgraph":
@@ -55,7 +61,7 @@ def get_agent(framework_name: str, llm, rag_chain):
             Retrieve an answer from the indexed documentation using RAG.
             """
             # Here, `rag_chain` is closed over from the outer scope.
-            result: Dict[str, Any] = rag_chain.invoke({"input": query})
+            result: Dict[str, Any] = rag_chain.invoke({"input": query}, config={"callbacks": langchain_callbacks()})
             return result.get("answer", "No answer found.")
             
             
@@ -70,7 +76,7 @@ def get_agent(framework_name: str, llm, rag_chain):
             return proc.stdout
         
 
-        tools = [dspy_doc_qa, dspy_run_command]
+        tools = [guard(dspy_doc_qa), guard(dspy_run_command)]
 
         # 3. Build the Signature with your system_prompt in instructions
         sig = Signature(
@@ -79,7 +85,12 @@ def get_agent(framework_name: str, llm, rag_chain):
         ).append("answer", OutputField(), type_=str)
 
         
-        dspy_react = dspy.ReAct(signature=sig, tools=tools)
+        if tracker is None:
+            return dspy.ReAct(signature=sig, tools=tools)
+
+        # One LM call per iteration plus the final extract call
+        max_iters = max(1, tracker.budget.max_llm_calls - 1)
+        dspy_react = dspy.ReAct(signature=sig, tools=tools, max_iters=max_iters)
         return dspy_react
     
     elif framework_name == "llamaindex":
@@ -91,7 +102,7 @@ def get_agent(framework_name: str, llm, rag_chain):
             Retrieve an answer from the indexed documentation using RAG.
             """
             # Here, `rag_chain` is closed over from the outer scope.
-            result: Dict[str, Any] = rag_chain.invoke({"input": query})
+            result: Dict[str, Any] = rag_chain.invoke({"input": query}, config={"callbacks": langchain_callbacks()})
             return result.get("answer", "No answer found.")
         
         def llamaindex_run_command_tool(cmd: str) -> str:
@@ -109,7 +120,7 @@ def get_agent(framework_name: str, llm, rag_chain):
         
         
         return  FunctionAgent(
-        tools=[llamaindex_doc_qa,llamaindex_run_command_tool],
+        tools=[guard(llamaindex_doc_qa), guard(llamaindex_run_command_tool)],
         llm=llm,
         system_prompt=system_prompt,
     )
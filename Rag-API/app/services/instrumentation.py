@@ -0,0 +1,444 @@
+"""
+Stage-level latency instrumentation for /ask.
+
+A StageRecorder is activated for each request and collects how long every
+stage took: agent construction, embedding, vector search, LLM calls and tool
+calls. Stages are reported through the hooks each framework already has
+(LangChain callbacks, DSPy callbacks, the LlamaIndex instrumentation
+dispatcher) and observed in a Prometheus histogram labelled by
+framework/model/store. The per-request breakdown can be returned to the
+caller as RAGResponse.debug.
+
+The same hooks read the provider's usage metadata at the end of every LLM
+call, so the response carries real prompt/completion/cached token counts
+for the whole agent loop instead of an estimate.
+
+For /ask/stream the recorder also has an event sink: stage boundaries are
+emitted as "step" events and answer tokens as "token" events while the
+agent is still running.
+
+Each request is also an OpenTelemetry "rag.ask" span, and every recorded
+stage a child span with the stage's own start and end time (see
+app/services/telemetry.py for the exporter). When the caller sent a
+traceparent header, "rag.ask" joins the caller's trace.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+from opentelemetry import trace
+from opentelemetry.trace import Status, StatusCode
+from prometheus_client import Histogram
+
+from app.services.telemetry import tracer
+
+
+STAGE_DURATION = Histogram(
+    "rag_stage_duration_seconds",
+    "Time spent in each stage of an /ask request",
+    ["stage", "framework", "model", "vector_store"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+
+@dataclass
+class StageTiming:
+    stage: str              # e.g. "embedding", "vector_search", "llm", "tool", "agent_build"
+    name: str               # what ran in the stage (model, tool or component name)
+    start_ms: float         # offset from the start of the request
+    duration_ms: float
+
+
+class StageRecorder:
+    """Collects stage timings for one request and exports them to Prometheus."""
+
+    def __init__(
+        self,
+        framework: str,
+        model: str,
+        vector_store: str,
+        sink: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        parent_context: Optional[Any] = None
+    ):
+        self.labels = {"framework": framework, "model": model, "vector_store": vector_store}
+        self.started = time.perf_counter()
+        self.started_ns = time.time_ns()
+        self.span = None  # the request's "rag.ask" span while activate() is running
+        self.parent_context = parent_context  # caller's trace context from the traceparent header
+        self.stages: List[StageTiming] = []
+        self.embedding_seconds = 0.0
+        self._open: Dict[Any, tuple] = {}
+        self._lock = threading.Lock()
+        self._callback_handler: Optional["StageCallbackHandler"] = None
+        self.llm_calls = 0
+        self.usage = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+        self.usage_reports = 0  # LLM calls whose provider reported usage
+        self.sink = sink
+
+    def emit(self, event: str, data: Dict[str, Any]):
+        """Forward a progress event to the streaming client, if there is one."""
+        if self.sink is not None:
+            self.sink(event, data)
+
+    def in_tool(self) -> bool:
+        """True while a tool call is open; LLM tokens produced inside tools are not part of the answer."""
+        with self._lock:
+            return any(opened[0] == "tool" for opened in self._open.values())
+
+    def record(self, stage: str, duration: float, name: str = "", started_at: Optional[float] = None):
+        started_at = started_at if started_at is not None else time.perf_counter() - duration
+        timing = StageTiming(
+            stage=stage,
+            name=name or stage,
+            start_ms=round((started_at - self.started) * 1000, 2),
+            duration_ms=round(duration * 1000, 2)
+        )
+        with self._lock:
+            self.stages.append(timing)
+            if stage == "embedding":
+                self.embedding_seconds += duration
+        STAGE_DURATION.labels(stage=stage, **self.labels).observe(duration)
+        self._export_span(timing, started_at, duration)
+        self.emit("step", {"phase": "end", **timing.__dict__})
+
+    def _export_span(self, timing: StageTiming, started_at: float, duration: float):
+        if self.span is None:
+            return
+        start_ns = self.started_ns + int((started_at - self.started) * 1e9)
+        span = tracer.start_span(
+            f"rag.{timing.stage}",
+            context=trace.set_span_in_context(self.span),
+            start_time=start_ns,
+            attributes={"rag.stage.name": timing.name, **self._span_labels()}
+        )
+        span.end(end_time=start_ns + int(duration * 1e9))
+
+    def _span_labels(self) -> Dict[str, str]:
+        return {f"rag.{key}": str(value) for key, value in self.labels.items()}
+
+    @contextmanager
+    def stage(self, stage: str, name: str = ""):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, name, start)
+
+    def start(self, key: Any, stage: str, name: str = ""):
+        """Open a stage whose end is reported by a separate callback."""
+        with self._lock:
+            self._open[key] = (stage, name, time.perf_counter(), self.embedding_seconds)
+        self.emit("step", {"phase": "start", "stage": stage, "name": name or stage})
+
+    def end(self, key: Any) -> Optional[float]:
+        with self._lock:
+            opened = self._open.pop(key, None)
+        if opened is None:
+            return None
+        stage, name, start, embedding_before = opened
+        duration = time.perf_counter() - start
+        if stage == "vector_search":
+            # The retriever embeds the query itself; that part is already its own stage
+            duration = max(0.0, duration - (self.embedding_seconds - embedding_before))
+        self.record(stage, duration, name, start)
+        return duration
+
+    def add_usage(self, usage: Optional[Dict[str, int]]):
+        """Count one finished LLM call and add its token usage, if the provider reported any."""
+        with self._lock:
+            self.llm_calls += 1
+            if usage:
+                self.usage_reports += 1
+                for key in self.usage:
+                    self.usage[key] += int(usage.get(key) or 0)
+
+    def usage_summary(self) -> Optional[Dict[str, int]]:
+        """Aggregated usage for the request, or None unless every LLM call reported usage.
+
+        Partial totals would pass for provider counts and undercount the cost.
+        """
+        if self.usage_reports < self.llm_calls:
+            return None
+        return {
+            **self.usage,
+            "total_tokens": self.usage["prompt_tokens"] + self.usage["completion_tokens"],
+            "llm_calls": self.llm_calls,
+        }
+
+    def timings(self) -> Dict[str, float]:
+        """Server-side stage totals in ms, plus the request total."""
+        return {**self.totals(), "total_ms": round((time.perf_counter() - self.started) * 1000, 2)}
+
+    @property
+    def callback_handler(self) -> "StageCallbackHandler":
+        # One instance per request so LangChain de-duplicates it when it is
+        # both inherited from the agent run and passed to the RAG chain explicitly
+        if self._callback_handler is None:
+            self._callback_handler = StageCallbackHandler(self)
+        return self._callback_handler
+
+    def totals(self) -> Dict[str, float]:
+        totals: Dict[str, float] = {}
+        for timing in self.stages:
+            totals[timing.stage] = round(totals.get(timing.stage, 0.0) + timing.duration_ms, 2)
+        return totals
+
+    def breakdown(self) -> Dict[str, Any]:
+        """Per-request view returned in RAGResponse.debug."""
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "totals_ms": self.totals(),
+            "stages": [timing.__dict__ for timing in sorted(self.stages, key=lambda t: t.start_ms)],
+        }
+
+
+_current_recorder: contextvars.ContextVar[Optional[StageRecorder]] = contextvars.ContextVar(
+    "rag_stage_recorder", default=None
+)
+
+
+@contextmanager
+def activate(recorder: StageRecorder):
+    """Make `recorder` the target of every hook for the duration of the request, inside its "rag.ask" span."""
+    token = _current_recorder.set(recorder)
+    span = recorder.span = tracer.start_span(
+        "rag.ask",
+        context=recorder.parent_context,
+        start_time=recorder.started_ns,
+        attributes=recorder._span_labels()
+    )
+    try:
+        yield recorder
+    except BaseException as e:
+        span.record_exception(e)
+        span.set_status(Status(StatusCode.ERROR, str(e)))
+        raise
+    finally:
+        usage = recorder.usage_summary() or {}
+        for key in ("prompt_tokens", "completion_tokens", "llm_calls"):
+            if key in usage:
+                span.set_attribute(f"rag.usage.{key}", usage[key])
+        recorder.span = None
+        span.end()
+        _current_recorder.reset(token)
+
+
+def current_recorder() -> Optional[StageRecorder]:
+    return _current_recorder.get()
+
+
+def langchain_callbacks() -> list:
+    """Callbacks to pass to LangChain runnables invoked during the current request."""
+    recorder = current_recorder()
+    return [recorder.callback_handler] if recorder else []
+
+
+class StageCallbackHandler(BaseCallbackHandler):
+    """LangChain hooks: retriever (vector search), chat model/LLM and tool runs."""
+
+    def __init__(self, recorder: StageRecorder):
+        self.recorder = recorder
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self.recorder.start(run_id, "vector_search", (serialized or {}).get("name", "retriever"))
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self.recorder.end(run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self.recorder.end(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.recorder.start(run_id, "llm", _model_name(serialized, kwargs))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self.recorder.start(run_id, "llm", _model_name(serialized, kwargs))
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        # Only fires for models built with streaming=True (the /ask/stream path)
+        if token and not self.recorder.in_tool():
+            self.recorder.emit("token", {"text": token})
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self.recorder.end(run_id)
+        self.recorder.add_usage(langchain_usage(response))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.recorder.end(run_id)
+        self.recorder.add_usage(None)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self.recorder.start(run_id, "tool", (serialized or {}).get("name", "tool"))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self.recorder.end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self.recorder.end(run_id)
+
+
+def _model_name(serialized: Optional[Dict[str, Any]], kwargs: Dict[str, Any]) -> str:
+    metadata = kwargs.get("metadata") or {}
+    return metadata.get("ls_model_name") or (serialized or {}).get("name", "llm")
+
+
+def langchain_usage(response) -> Optional[Dict[str, int]]:
+    """Usage from an LLMResult: message usage_metadata first, then the provider's llm_output."""
+    prompt = completion = cached = 0
+    found = False
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if not metadata:
+                continue
+            found = True
+            prompt += metadata.get("input_tokens", 0)
+            completion += metadata.get("output_tokens", 0)
+            cached += (metadata.get("input_token_details") or {}).get("cache_read", 0) or 0
+    if found:
+        return {"prompt_tokens": prompt, "completion_tokens": completion, "cached_tokens": cached}
+    return openai_usage((response.llm_output or {}).get("token_usage"))
+
+
+def openai_usage(usage: Any) -> Optional[Dict[str, int]]:
+    """Normalize an OpenAI-style usage object or dict (as returned by litellm and LlamaIndex raw responses)."""
+    if usage is None:
+        return None
+    if not isinstance(usage, dict):
+        usage = usage.model_dump() if hasattr(usage, "model_dump") else dict(getattr(usage, "__dict__", {}))
+    if not usage:
+        return None
+    details = usage.get("prompt_tokens_details") or {}
+    if not isinstance(details, dict):
+        details = details.model_dump() if hasattr(details, "model_dump") else dict(getattr(details, "__dict__", {}))
+    return {
+        "prompt_tokens": usage.get("prompt_tokens") or 0,
+        "completion_tokens": usage.get("completion_tokens") or 0,
+        "cached_tokens": details.get("cached_tokens") or 0,
+    }
+
+
+class TimedEmbeddings(Embeddings):
+    """Wraps the shared embeddings so query/document embedding shows up as its own stage."""
+
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._timed(self.embeddings.embed_documents, texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._timed(self.embeddings.embed_query, text)
+
+    def _timed(self, func, value):
+        recorder = current_recorder()
+        if recorder is None:
+            return func(value)
+        with recorder.stage("embedding", type(self.embeddings).__name__):
+            return func(value)
+
+
+def dspy_callbacks() -> list:
+    """DSPy callbacks for the current request (LM and tool calls)."""
+    recorder = current_recorder()
+    if recorder is None:
+        return []
+
+    from dspy.utils.callback import BaseCallback
+
+    class DSPyStageCallback(BaseCallback):
+        def __init__(self):
+            self._calls = {}
+            self._counted = set()
+
+        def on_lm_start(self, call_id, instance, inputs):
+            history = getattr(instance, "history", None) or []
+            self._calls[call_id] = (instance, history[-1] if history else None)
+            recorder.start(call_id, "llm", getattr(instance, "model", "lm"))
+
+        def on_lm_end(self, call_id, outputs, exception=None):
+            recorder.end(call_id)
+            instance, last = self._calls.pop(call_id, (None, None))
+            usage = None
+            if not exception and instance is not None:
+                # dspy.LM appends the litellm usage of every call to its history; only read
+                # the entries added since this call started, and count each entry once
+                for entry in _entries_after(getattr(instance, "history", None) or [], last):
+                    if id(entry) in self._counted:
+                        continue
+                    self._counted.add(id(entry))
+                    entry_usage = openai_usage(entry.get("usage"))
+                    if entry_usage:
+                        usage = {key: (usage or {}).get(key, 0) + value for key, value in entry_usage.items()}
+            recorder.add_usage(usage)
+
+        def on_tool_start(self, call_id, instance, inputs):
+            recorder.start(call_id, "tool", getattr(instance, "name", "tool"))
+
+        def on_tool_end(self, call_id, outputs, exception=None):
+            recorder.end(call_id)
+
+    return [DSPyStageCallback()]
+
+
+def _entries_after(history: list, last: Optional[Dict[str, Any]]) -> list:
+    """History entries appended after `last` (all of them if `last` is None)."""
+    entries = []
+    for entry in reversed(history):
+        if entry is last:
+            break
+        entries.append(entry)
+    return entries[::-1]
+
+
+def dspy_request_lm():
+    """A copy of the configured dspy LM with its own history, for one request.
+
+    The global LM is shared by concurrent requests, so its history cannot tell
+    which call a usage entry belongs to.
+    """
+    import dspy
+
+    lm = dspy.settings.lm
+    return lm.copy() if lm is not None else None
+
+
+_llamaindex_hooks_installed = False
+_llamaindex_hooks_lock = threading.Lock()
+
+
+def install_llamaindex_hooks():
+    """Register a LlamaIndex dispatcher handler that times LLM calls for the current request."""
+    global _llamaindex_hooks_installed
+    with _llamaindex_hooks_lock:
+        if _llamaindex_hooks_installed:
+            return
+
+        from llama_index.core.instrumentation import get_dispatcher
+        from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+        from llama_index.core.instrumentation.events.llm import LLMChatEndEvent, LLMChatStartEvent
+
+        class LlamaIndexStageHandler(BaseEventHandler):
+            @classmethod
+            def class_name(cls) -> str:
+                return "RagStageHandler"
+
+            def handle(self, event, **kwargs):
+                recorder = current_recorder()
+                if recorder is None:
+                    return
+                if isinstance(event, LLMChatStartEvent):
+                    recorder.start(("llamaindex", event.span_id), "llm", str(event.model_dict.get("model", "llm")))
+                elif isinstance(event, LLMChatEndEvent):
+                    recorder.end(("llamaindex", event.span_id))
+                    raw = getattr(event.response, "raw", None)
+                    usage = raw.get("usage") if isinstance(raw, dict) else getattr(raw, "usage", None)
+                    recorder.add_usage(openai_usage(usage))
+
+        get_dispatcher().add_event_handler(LlamaIndexStageHandler())
+        _llamaindex_hooks_installed = True
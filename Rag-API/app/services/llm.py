@@ -57,32 +57,36 @@ def get_llama_index_llm(model_name: str):
 
 
 
-def get_llm(model_name: str):
+def get_llm(model_name: str, streaming: bool = False):
     """
     Returns an initialized chat LLM. 
     Supported: "openai", "groq", "gemini", etc.
+    With streaming=True the model emits on_llm_new_token callbacks (/ask/stream).
     """
+    kwargs = {"streaming": True} if streaming else {}
 
     if "gpt" in model_name:
-        return init_chat_model(model_name, model_provider="openai")
+        # OpenAI only reports usage on a stream when asked to
+        openai_kwargs = {**kwargs, "stream_usage": True} if streaming else {}
+        return init_chat_model(model_name, model_provider="openai", **openai_kwargs)
 
     elif model_name == "llama3-8b-8192":
-        return init_chat_model("llama3-8b-8192", model_provider="groq")
+        return init_chat_model("llama3-8b-8192", model_provider="groq", **kwargs)
     
     elif model_name == "gemma2-9b-it":
-        return init_chat_model("gemma2-9b-it", model_provider="groq")
+        return init_chat_model("gemma2-9b-it", model_provider="groq", **kwargs)
     
     
     
     
     elif model_name == "llama-3.3-70b-versatile":
         # Replace "groq-llm-name" with actual Groq model identifier
-        return init_chat_model("llama-3.3-70b-versatile", model_provider="groq")
+        return init_chat_model("llama-3.3-70b-versatile", model_provider="groq", **kwargs)
 
 
     elif model_name == "gemini-2.0-flash":
         # Replace "gemini-llm-name" with actual Gemini identi
-        return init_chat_model("llama-3.3-70b-versatile", model_provider="groq")  ## 
+        return init_chat_model("llama-3.3-70b-versatile", model_provider="groq", **kwargs)  ## 
         #return ChatGoogleGenerativeAI(model="gemini-2.0-flash")
     else:
         raise ValueError(f"Unsupported LLM model: {model_name}")
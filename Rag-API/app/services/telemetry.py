@@ -0,0 +1,56 @@
+"""
+OpenTelemetry spans for /ask.
+
+Every request gets an "rag.ask" span, and every stage the StageRecorder
+times (agent build, embedding, vector search, LLM call, tool call) becomes a
+child span with the stage's real start and end time. Spans are exported over
+OTLP/HTTP to OTEL_EXPORTER_OTLP_ENDPOINT (the collector in
+telemetry/otel-collector-config.yaml) through a BatchSpanProcessor whose
+queue is bounded: when the collector is slow or down, spans are dropped
+instead of holding up requests.
+
+Every span is exported. The Flask app's tail sampling runs after this service
+has answered, so its drop decision never reaches here; traces it drops still
+show up as Rag-API spans alone.
+"""
+import logging
+from typing import Any, Optional
+
+from opentelemetry import trace
+
+from config import (
+    OTEL_ENABLED,
+    OTEL_SERVICE_NAME,
+    OTEL_EXPORTER_OTLP_ENDPOINT,
+    OTEL_BSP_MAX_QUEUE_SIZE,
+    OTEL_BSP_MAX_EXPORT_BATCH_SIZE,
+    OTEL_BSP_SCHEDULE_DELAY_MS,
+)
+
+
+def init_tracer_provider() -> Optional[Any]:
+    """Install the global TracerProvider; spans stay no-ops when disabled or the SDK is missing."""
+    if not OTEL_ENABLED:
+        return None
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    except ImportError:
+        logging.warning("OpenTelemetry SDK or OTLP exporter not installed; spans are not exported")
+        return None
+
+    provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(
+        OTLPSpanExporter(endpoint=f"{OTEL_EXPORTER_OTLP_ENDPOINT.rstrip('/')}/v1/traces"),
+        max_queue_size=OTEL_BSP_MAX_QUEUE_SIZE,
+        max_export_batch_size=OTEL_BSP_MAX_EXPORT_BATCH_SIZE,
+        schedule_delay_millis=OTEL_BSP_SCHEDULE_DELAY_MS,
+    ))
+    trace.set_tracer_provider(provider)
+    return provider
+
+
+tracer_provider = init_tracer_provider()
+tracer = trace.get_tracer("rag_api")
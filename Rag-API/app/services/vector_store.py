@@ -3,6 +3,7 @@ import logging
 from typing import Any
 
 from config import FAISS_INDEX_DIR, CHROMA_INDEX_DIR, embeddings
+from app.services.instrumentation import TimedEmbeddings
 
 # Import your index-builders here
 from vector_stores.faiss_index import build_faiss_index
@@ -20,7 +21,7 @@ def get_vector_store(store_name: str) -> Any:
         if os.path.exists(FAISS_INDEX_DIR):
             logging.info("Loading existing FAISS index…")
             return FAISS.load_local(
-                FAISS_INDEX_DIR, embeddings, allow_dangerous_deserialization=True
+                FAISS_INDEX_DIR, TimedEmbeddings(embeddings), allow_dangerous_deserialization=True
             )
         else:
             return build_faiss_index()
@@ -31,7 +32,7 @@ def get_vector_store(store_name: str) -> Any:
             logging.info("Loading existing Chroma index…")
             return Chroma(
                 persist_directory=CHROMA_INDEX_DIR,
-                embedding_function=embeddings
+                embedding_function=TimedEmbeddings(embeddings)
             )
         else:
             logging.info("Chroma index not found. Building a new one…")
@@ -25,6 +25,27 @@ DATA_DIR = 'Rag-API\data'
 FAISS_INDEX_DIR = "vector_data/faiss_index"
 CHROMA_INDEX_DIR = "vector_data/chroma_index"
 
+# Deterministic fast path in front of the agent (app/services/fast_path.py)
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+FAST_PATH_COMMAND_TIMEOUT = float(os.getenv("FAST_PATH_COMMAND_TIMEOUT", "15"))
+
+# Per-request agent budget (app/services/budget.py), kept under the Flask client's 30s timeout
+AGENT_MAX_TOOL_CALLS = int(os.getenv("AGENT_MAX_TOOL_CALLS", "6"))
+AGENT_MAX_LLM_CALLS = int(os.getenv("AGENT_MAX_LLM_CALLS", "8"))
+AGENT_DEADLINE_SECONDS = float(os.getenv("AGENT_DEADLINE_SECONDS", "25"))
+
+# /ask/stream sends an SSE comment this often while the agent is quiet, keeping proxies from timing out
+STREAM_KEEPALIVE_SECONDS = float(os.getenv("STREAM_KEEPALIVE_SECONDS", "10"))
+
+# OpenTelemetry spans per request and stage (app/services/telemetry.py), exported to the OTLP/HTTP collector
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "true").lower() == "true"
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "docker-agent-rag-api")
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318")
+# Finished spans waiting for export; beyond this they are dropped rather than blocking a request
+OTEL_BSP_MAX_QUEUE_SIZE = int(os.getenv("OTEL_BSP_MAX_QUEUE_SIZE", "2048"))
+OTEL_BSP_MAX_EXPORT_BATCH_SIZE = int(os.getenv("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", "512"))
+OTEL_BSP_SCHEDULE_DELAY_MS = int(os.getenv("OTEL_BSP_SCHEDULE_DELAY_MS", "1000"))
+
 # If you have specific embedding objects, import or configure them here:
 # e.g. embeddings = OpenAIEmbeddings(...)
 from langchain_openai import OpenAIEmbeddings
@@ -0,0 +1,5 @@
+import os
+
+# config is read when first imported; the telemetry test installs its own exporter
+os.environ.setdefault("OTEL_ENABLED", "false")
+os.environ.setdefault("FAST_PATH_ENABLED", "true")
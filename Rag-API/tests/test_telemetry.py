@@ -0,0 +1,89 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi.testclient import TestClient
+from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import ExportTraceServiceRequest
+
+from app.services import telemetry
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_SPAN_ID = "00f067aa0ba902b7"
+
+
+class OTLPReceiver:
+    """In-process OTLP/HTTP endpoint that keeps every exported span"""
+
+    def __init__(self):
+        self.spans = []
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = ExportTraceServiceRequest()
+                request.ParseFromString(self.rfile.read(int(self.headers["Content-Length"])))
+                for resource_spans in request.resource_spans:
+                    for scope_spans in resource_spans.scope_spans:
+                        receiver.spans.extend(scope_spans.spans)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-protobuf")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def trace(self, trace_id: str):
+        return [span for span in self.spans if span.trace_id.hex() == trace_id]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture(scope="module")
+def receiver():
+    receiver = OTLPReceiver()
+    telemetry.OTEL_ENABLED = True
+    telemetry.OTEL_EXPORTER_OTLP_ENDPOINT = receiver.url
+    telemetry.OTEL_BSP_SCHEDULE_DELAY_MS = 50
+    provider = telemetry.init_tracer_provider()
+    assert provider is not None
+    receiver.provider = provider
+    yield receiver
+    provider.shutdown()
+    receiver.close()
+
+
+@pytest.fixture(scope="module")
+def client(receiver):
+    from app.main import app
+
+    # Not entered as a context manager, so the startup hook does not preload indexes or the LLM
+    return TestClient(app)
+
+
+def test_ask_spans_join_the_callers_trace(receiver, client):
+    response = client.post(
+        "/ask",
+        json={
+            "framework": "langgraph",
+            "llm_model": "gpt-4o-mini",
+            "vector_store": "faiss",
+            "query": "prune unused images",
+        },
+        headers={"traceparent": f"00-{TRACE_ID}-{PARENT_SPAN_ID}-01"},
+    )
+    assert response.status_code == 200
+    assert response.json()["fast_path_intent"] == "prune_images"
+    assert receiver.provider.force_flush()
+
+    spans = {span.name: span for span in receiver.trace(TRACE_ID)}
+    assert set(spans) == {"rag.ask", "rag.fast_path"}
+    root, stage = spans["rag.ask"], spans["rag.fast_path"]
+    assert root.parent_span_id.hex() == PARENT_SPAN_ID
+    assert stage.parent_span_id == root.span_id
+    assert root.start_time_unix_nano <= stage.start_time_unix_nano <= stage.end_time_unix_nano <= root.end_time_unix_nano